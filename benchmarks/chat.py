@@ -0,0 +1,183 @@
+"""Load-test chat delivery across several Socket.IO worker processes.
+
+    python -m benchmarks.chat --workers 3 --clients 60 --messages 20
+
+Starts a Redis-compatible stand-in (fakeredis) unless ``--redis-url`` is given
+and launches eventlet workers that share it as their message queue and
+presence store. Clients log in with signed session cookies, are spread over
+the workers round-robin and message random peers, so most deliveries cross
+workers. Reports delivered messages per second and the latency measured at
+the receiving client.
+"""
+import argparse
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+def _config(database_uri, redis_url):
+    from starchaos.config import Config
+
+    class BenchmarkConfig(Config):
+        SECRET_KEY = 'benchmark'
+        SQLALCHEMY_DATABASE_URI = database_uri
+        SOCKETIO_MESSAGE_QUEUE = redis_url
+        SOCKETIO_ASYNC_MODE = 'eventlet'
+        PRESENCE_STORE_URL = redis_url
+
+    return BenchmarkConfig
+
+
+def serve(port, database_uri, redis_url):
+    import eventlet
+    eventlet.monkey_patch()
+    from starchaos import create_app, socketio
+
+    app = create_app(_config(database_uri, redis_url))
+    socketio.run(app, host='127.0.0.1', port=port, log_output=False)
+
+
+def serve_redis(port):
+    from fakeredis import TcpFakeServer
+
+    TcpFakeServer(('127.0.0.1', port), server_type='redis').serve_forever()
+
+
+def _wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'nothing is listening on port {port}')
+
+
+def _spawn(*args):
+    return subprocess.Popen([sys.executable, '-m', 'benchmarks.chat', *args])
+
+
+def seed(database_uri, redis_url, num_users):
+    """Create the users and return a signed session cookie for each of them."""
+    from starchaos import create_app, db
+    from starchaos.users.models import User
+
+    app = create_app(_config(database_uri, redis_url))
+    with app.app_context():
+        db.create_all()
+        db.session.execute(User.__table__.insert(), [
+            {'id': i, 'full_name': f'user{i}', 'email': f'user{i}@example.com', 'password': 'x'}
+            for i in range(1, num_users + 1)
+        ])
+        db.session.commit()
+    serializer = app.session_interface.get_signing_serializer(app)
+    cookie_name = app.config['SESSION_COOKIE_NAME']
+    return {i: f'{cookie_name}={serializer.dumps({"_user_id": str(i), "_fresh": True})}'
+            for i in range(1, num_users + 1)}
+
+
+class ChatClient:
+    def __init__(self, user_id, cookie, url, latencies, delivered):
+        import socketio
+
+        self.user_id = user_id
+        self.latencies = latencies
+        self.delivered = delivered
+        self.sio = socketio.Client(reconnection=False)
+        self.sio.on('response', self.on_response)
+        self.sio.connect(url, headers={'Cookie': cookie}, transports=['websocket'], wait_timeout=10)
+
+    def on_response(self, data):
+        if data['receiver_id'] == self.user_id:
+            self.latencies.append((time.time() - float(data['content'])) * 1000)
+            self.delivered.release()
+
+    def send(self, peers, count, interval, rng):
+        for _ in range(count):
+            self.sio.emit('private_message', {'receiver_id': rng.choice(peers), 'content': repr(time.time())})
+            time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--clients', type=int, default=60)
+    parser.add_argument('--messages', type=int, default=20, help='messages sent by each client')
+    parser.add_argument('--interval', type=float, default=0.05, help='seconds between one client\'s sends')
+    parser.add_argument('--port', type=int, default=5100, help='first worker port')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--redis-url')
+    parser.add_argument('--database-uri')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--serve-redis', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_redis:
+        return serve_redis(args.serve_redis)
+    if args.serve:
+        return serve(args.serve, args.database_uri, args.redis_url)
+
+    path = None
+    if args.database_uri is None:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+    database_uri = args.database_uri or f'sqlite:///{path}'
+    processes = []
+    try:
+        redis_url = args.redis_url
+        if redis_url is None:
+            redis_port = args.port - 1
+            processes.append(_spawn('--serve-redis', str(redis_port)))
+            _wait_for_port(redis_port)
+            redis_url = f'redis://127.0.0.1:{redis_port}/0'
+
+        cookies = seed(database_uri, redis_url, args.clients)
+        ports = [args.port + i for i in range(args.workers)]
+        for port in ports:
+            processes.append(_spawn('--serve', str(port), '--database-uri', database_uri, '--redis-url', redis_url))
+        for port in ports:
+            _wait_for_port(port)
+
+        latencies, delivered = [], threading.Semaphore(0)
+        clients = [ChatClient(user_id, cookie, f'http://127.0.0.1:{ports[user_id % len(ports)]}',
+                              latencies, delivered)
+                   for user_id, cookie in cookies.items()]
+        print(f'{len(clients)} clients connected to {len(ports)} workers')
+
+        expected = args.clients * args.messages
+        rng = random.Random(args.seed)
+        start = time.perf_counter()
+        for client in clients:
+            peers = [user_id for user_id in cookies if user_id != client.user_id]
+            threading.Thread(target=client.send, daemon=True,
+                             args=(peers, args.messages, args.interval, random.Random(rng.random()))).start()
+        received = 0
+        while received < expected and delivered.acquire(timeout=10):
+            received += 1
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        print(f'delivered {received}/{expected} messages in {elapsed:.2f} s: {received / elapsed:.0f} msg/s')
+        if latencies:
+            p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+            print(f'latency mean {statistics.mean(latencies):.1f} ms   '
+                  f'p50 {statistics.median(latencies):.1f} ms   p99 {p99:.1f} ms')
+        for client in clients:
+            client.sio.disconnect()
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+        if path:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Compare per-message commits with the batched chat message writer.
+
+    python -m benchmarks.chat_writes --messages 20000 --senders 8
+
+Each sender thread stands in for a socket handler and saves its share of the
+messages. The same load runs three times against a fresh database: the
+previous ORM add, conversation update and commit per message, ``MessageWriter`` with write-behind
+off (one idempotent insert and commit per message) and with write-behind on.
+Reports messages persisted per second and the p99 time a handler spends
+saving one message.
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from starchaos import create_app, db, message_writer
+from starchaos.config import Config
+from starchaos.users.models import User, Message, Conversation
+
+
+def legacy_save(row):
+    message = Message(**row)
+    db.session.add(message)
+    db.session.flush()
+    Conversation.record([message])
+    db.session.commit()
+
+
+def run(app, label, save, rows, senders):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(User.__table__.insert(), [
+            {'id': i, 'full_name': f'user{i}', 'email': f'user{i}@example.com', 'password': 'x'}
+            for i in range(1, 101)
+        ])
+        db.session.commit()
+
+    timings = []
+
+    def sender(share):
+        with app.app_context():
+            for row in share:
+                start = time.perf_counter()
+                save(row)
+                timings.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=sender, args=(rows[i::senders],)) for i in range(senders)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    message_writer.flush()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        stored = db.session.query(Message).count()
+    timings.sort()
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(f'{label:<28} {stored / elapsed:8.0f} msg/s   handler p99 {p99:7.2f} ms   ({stored} stored)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--senders', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-uri')
+    args = parser.parse_args()
+
+    path = None
+    if args.database_uri is None:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+
+    class BenchmarkConfig(Config):
+        SECRET_KEY = 'benchmark'
+        SQLALCHEMY_DATABASE_URI = args.database_uri or f'sqlite:///{path}'
+        SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}} if path else {}
+
+    rng = random.Random(args.seed)
+    rows = []
+    for i in range(args.messages):
+        sender_id, receiver_id = rng.sample(range(1, 101), 2)
+        rows.append({'sender_id': sender_id, 'receiver_id': receiver_id, 'content': f'message {i}',
+                     'date_posted': datetime.utcnow(), 'client_id': f'bench-{i}'})
+
+    app = create_app(BenchmarkConfig)
+    try:
+        run(app, 'per-message ORM commit', legacy_save, rows, args.senders)
+        message_writer.enabled = False
+        run(app, 'per-message upsert + commit', message_writer.save, rows, args.senders)
+        message_writer.enabled = True
+        run(app, 'write-behind batches', message_writer.save, rows, args.senders)
+        with app.app_context():
+            db.drop_all()
+    finally:
+        if path:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
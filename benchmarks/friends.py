@@ -0,0 +1,88 @@
+"""Show that a profile page costs the same number of queries whatever its friend count.
+
+    python -m benchmarks.friends --users 5000 --friends 60
+
+Seeds a throwaway SQLite file (or uses ``--database-uri``, which should hold
+``flask seed`` data), then, for users at several points of the friend-count
+distribution, requests their profile and its second page of friends as
+another user, and reports SQL statements and latency for each.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import event, select
+from starchaos import create_app, db
+from starchaos.config import Config
+from starchaos.seed import seed
+from starchaos.users.models import User
+
+from benchmarks.routes import Counter, _login
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--friends', type=int, default=60, help='average friends per user')
+    parser.add_argument('--requests', type=int, default=20, help='requests per profile')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-uri', help='an already seeded database')
+    args = parser.parse_args()
+
+    path = None
+    if args.database_uri is None:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+
+    class BenchmarkConfig(Config):
+        SECRET_KEY = 'benchmark'
+        SQLALCHEMY_DATABASE_URI = args.database_uri or f'sqlite:///{path}'
+        MAIL_QUEUE_WORKER = False
+        ACCOUNT_DELETION_WORKER = False
+
+    app = create_app(BenchmarkConfig)
+    try:
+        counter = Counter()
+        with app.app_context():
+            if path:
+                db.create_all()
+                seed(users=args.users, friends_per_user=args.friends, posts=args.users, threads=0, seed=args.seed)
+            people = db.session.execute(select(User.id, User.full_name, User.friend_count)
+                                        .order_by(User.friend_count.desc())).all()
+            event.listen(db.engine, 'before_cursor_execute', counter)
+        viewer_id = people[len(people) // 2][0]
+        client = app.test_client()
+        _login(client, viewer_id)
+        client.get('/')
+
+        print(f'{"friends":>8} {"page":>5} {"queries":>8} {"p50 ms":>8}')
+        for rank in (0, 10, len(people) // 10, len(people) // 2):
+            _, full_name, friend_count = people[rank]
+            cursor = None
+            for page in (1, 2):
+                url = f'/profile/{full_name}' + (f'?friends_after={cursor}' if cursor else '')
+                timings, queries = [], []
+                for _ in range(args.requests):
+                    counter.count = 0
+                    start = time.perf_counter()
+                    response = client.get(url)
+                    timings.append((time.perf_counter() - start) * 1000)
+                    queries.append(counter.count)
+                print(f'{friend_count:8d} {page:5d} {max(queries):8d} {statistics.median(timings):8.2f}')
+                marker = b'friends_after='
+                if marker not in response.data:
+                    break
+                start = response.data.index(marker) + len(marker)
+                cursor = response.data[start:response.data.index(b'"', start)].decode()
+        if path:
+            with app.app_context():
+                db.drop_all()
+    finally:
+        if path:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
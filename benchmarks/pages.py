@@ -0,0 +1,87 @@
+"""Compare profile and post views built from scratch, from cached fragments, and answered with 304.
+
+    python -m benchmarks.pages --users 2000 --posts 20000
+
+Seeds a throwaway SQLite file (or uses ``--database-uri``, which should hold
+``flask seed`` data), then requests the busiest profiles and posts as another
+user three ways: with the fragment store emptied before each request, as a
+repeat view that reuses the fragments, and as a conditional GET carrying the
+ETag of the previous response. Reports SQL statements and latency for each.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import event, select
+from starchaos import create_app, db, page_cache
+from starchaos.config import Config
+from starchaos.posts.models import Post
+from starchaos.seed import seed
+from starchaos.users.models import User
+
+from benchmarks.routes import Counter, _login
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=50, help='requests per route and mode')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-uri', help='an already seeded database')
+    args = parser.parse_args()
+
+    path = None
+    if args.database_uri is None:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+
+    class BenchmarkConfig(Config):
+        SECRET_KEY = 'benchmark'
+        SQLALCHEMY_DATABASE_URI = args.database_uri or f'sqlite:///{path}'
+        MAIL_QUEUE_WORKER = False
+        ACCOUNT_DELETION_WORKER = False
+
+    app = create_app(BenchmarkConfig)
+    try:
+        counter = Counter()
+        with app.app_context():
+            if path:
+                db.create_all()
+                seed(users=args.users, posts=args.posts, threads=0, seed=args.seed)
+            people = db.session.execute(select(User.id, User.full_name)
+                                        .order_by(User.friend_count.desc()).limit(2)).all()
+            post_id = db.session.execute(select(Post.id).order_by(Post.comment_count.desc()).limit(1)).scalar()
+            event.listen(db.engine, 'before_cursor_execute', counter)
+        client = app.test_client()
+        _login(client, people[1][0])
+        client.get('/')
+
+        print(f'{"route":<10} {"mode":<12} {"status":>6} {"queries":>8} {"p50 ms":>8}')
+        for route, url in (('profile', f'/profile/{people[0][1]}'), ('post', f'/post/{post_id}')):
+            etag = client.get(url).headers['ETag']
+            for mode in ('cold', 'fragments', 'conditional'):
+                timings, queries = [], []
+                for _ in range(args.requests):
+                    if mode == 'cold':
+                        page_cache.store.clear()
+                    headers = {'If-None-Match': etag} if mode == 'conditional' else {}
+                    counter.count = 0
+                    start = time.perf_counter()
+                    response = client.get(url, headers=headers)
+                    timings.append((time.perf_counter() - start) * 1000)
+                    queries.append(counter.count)
+                print(f'{route:<10} {mode:<12} {response.status_code:6d} {max(queries):8d} '
+                      f'{statistics.median(timings):8.2f}')
+        if path:
+            with app.app_context():
+                db.drop_all()
+    finally:
+        if path:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
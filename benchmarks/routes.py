@@ -0,0 +1,192 @@
+"""Drive the main routes against seeded data and compare with a stored baseline.
+
+    python -m benchmarks.routes --users 2000 --posts 20000 --save-baseline benchmarks/baseline.json
+    python -m benchmarks.routes --users 2000 --posts 20000 --baseline benchmarks/baseline.json
+
+Seeds a throwaway SQLite file with ``starchaos.seed`` (or uses
+``--database-uri``, which should hold ``flask seed`` data of the same scale),
+then sends each route ``--requests`` requests through the Flask test client
+as randomly chosen users, and ``private_message`` through the Socket.IO test
+client. For every route it reports p50/p95/p99 latency, SQL statements per
+request and the peak Python memory allocated while serving it (measured in a
+separate, shorter pass, since tracemalloc distorts timings). With
+``--baseline`` it exits non-zero if a route's p95 or query count regressed by
+more than ``--tolerance``.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import event, select
+from starchaos import create_app, db, socketio, message_writer
+from starchaos.config import Config
+from starchaos.posts.models import Post
+from starchaos.seed import seed
+from starchaos.users.models import User, Conversation
+
+
+class Counter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+def _sample(app, rng, samples):
+    """Pick who requests what: users with friends and posts, posts and conversation partners."""
+    with app.app_context():
+        user_ids = db.session.execute(select(User.id).order_by(User.friend_count.desc()).limit(200)).scalars().all()
+        names = dict(db.session.execute(select(User.id, User.full_name).where(User.id.in_(user_ids))).all())
+        post_ids = db.session.execute(select(Post.id).order_by(Post.like_count.desc()).limit(200)).scalars().all()
+        pairs = db.session.execute(select(Conversation.user_a_id, Conversation.user_b_id).limit(200)).all()
+    users = [rng.choice(user_ids) for _ in range(samples)]
+    conversations = [rng.choice(pairs) for _ in range(samples)]
+    return {
+        'main.index': [(user_id, '/') for user_id in users],
+        'users.profile': [(user_id, f'/profile/{names[rng.choice(user_ids)]}') for user_id in users],
+        'posts.post': [(user_id, f'/post/{rng.choice(post_ids)}') for user_id in users],
+        'users.chats': [(a, '/chats') for a, _ in conversations],
+        'users.chat': [(a, f'/chat/{b}') for a, b in conversations],
+        'likes.like_action': [(user_id, f'/like/{rng.choice(post_ids)}/{rng.choice(["like", "unlike"])}')
+                              for user_id in users],
+        'private_message': [(a, b) for a, b in conversations],
+    }
+
+
+def _login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+
+def _run(app, endpoint, requests, counter, traced=False):
+    client = app.test_client()
+    timings, queries, peaks = [], [], []
+    for user_id, target in requests:
+        _login(client, user_id)
+        if endpoint == 'private_message':
+            sio = socketio.test_client(app, flask_test_client=client)
+        if traced:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        counter.count = 0
+        start = time.perf_counter()
+        if endpoint == 'private_message':
+            sio.emit('private_message', {'receiver_id': target, 'content': 'benchmark'}, callback=True)
+        else:
+            response = client.get(target, headers={'Referer': '/'})
+            assert response.status_code < 400, (target, response.status_code)
+        timings.append((time.perf_counter() - start) * 1000)
+        queries.append(counter.count)
+        if traced:
+            peaks.append((tracemalloc.get_traced_memory()[1] - before) / 1024)
+        if endpoint == 'private_message':
+            sio.disconnect()
+    message_writer.flush()
+    return timings, queries, peaks
+
+
+def measure(app, endpoint, requests, counter):
+    """Time every request, then replay a few under tracemalloc, which is too slow to time with."""
+    _run(app, endpoint, requests[:5], counter)
+    timings, queries, _ = _run(app, endpoint, requests, counter)
+    tracemalloc.start()
+    _, _, peaks = _run(app, endpoint, requests[:20], counter, traced=True)
+    tracemalloc.stop()
+    timings.sort()
+    return {
+        'p50': timings[len(timings) // 2],
+        'p95': timings[int(len(timings) * 0.95) - 1],
+        'p99': timings[int(len(timings) * 0.99) - 1],
+        'mean': statistics.mean(timings),
+        'queries': statistics.mean(queries),
+        'max_queries': max(queries),
+        'peak_kib': max(peaks),
+    }
+
+
+# Differences smaller than these are noise whatever the relative change.
+NOISE = {'p95': 2.0, 'queries': 0.5}
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for endpoint, result in results.items():
+        old = baseline.get(endpoint)
+        if old is None:
+            continue
+        for key, noise in NOISE.items():
+            if result[key] > old[key] * (1 + tolerance) and result[key] - old[key] > noise:
+                regressions.append(f'{endpoint} {key}: {old[key]:.2f} -> {result[key]:.2f}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-uri', help='an already seeded database')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--save-baseline', help='write this run\'s results here')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression')
+    args = parser.parse_args()
+
+    path = None
+    if args.database_uri is None:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+
+    class BenchmarkConfig(Config):
+        SECRET_KEY = 'benchmark'
+        SQLALCHEMY_DATABASE_URI = args.database_uri or f'sqlite:///{path}'
+        MAIL_QUEUE_WORKER = False
+
+    app = create_app(BenchmarkConfig)
+    try:
+        if path:
+            with app.app_context():
+                db.create_all()
+                start = time.perf_counter()
+                counts = seed(users=args.users, posts=args.posts, threads=args.threads, seed=args.seed)
+                print(f'seeded {sum(counts.values())} rows in {time.perf_counter() - start:.1f} s')
+
+        counter = Counter()
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', counter)
+        results = {}
+        print(f'{"route":<20} {"p50":>8} {"p95":>8} {"p99":>8} {"queries":>8} {"max":>4} {"peak KiB":>9}')
+        for endpoint, requests in _sample(app, random.Random(args.seed), args.requests).items():
+            result = results[endpoint] = measure(app, endpoint, requests, counter)
+            print(f'{endpoint:<20} {result["p50"]:8.2f} {result["p95"]:8.2f} {result["p99"]:8.2f} '
+                  f'{result["queries"]:8.1f} {result["max_queries"]:4d} {result["peak_kib"]:9.0f}')
+
+        if args.save_baseline:
+            with open(args.save_baseline, 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare(results, json.load(f), args.tolerance)
+            for regression in regressions:
+                print(f'REGRESSION {regression}')
+            if regressions:
+                raise SystemExit(1)
+            print('no regressions against the baseline')
+        if path:
+            with app.app_context():
+                db.drop_all()
+    finally:
+        if path:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
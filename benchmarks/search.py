@@ -0,0 +1,106 @@
+"""Time post search and people typeahead on a synthetic corpus.
+
+    python -m benchmarks.search --posts 1000000 --users 100000
+
+Seeds a throwaway SQLite file (FTS5) unless ``--database-uri`` points at a
+Postgres database, then requests ``/api/search/typeahead`` and ``/search``
+through the test client as a logged-in user. Typeahead is timed with a cold
+cache, so every request reaches the database.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from starchaos import create_app, db
+from starchaos.config import Config
+from starchaos.posts.models import Post
+from starchaos.search.utils import typeahead_cache
+from starchaos.users.models import User
+
+FIRST = ['Ada', 'Alan', 'Grace', 'Linus', 'Barbara', 'Ken', 'Margaret', 'Dennis', 'Radia', 'Edsger',
+         'Frances', 'John', 'Katherine', 'Niklaus', 'Sophie', 'Tim', 'Whitfield', 'Hedy', 'Donald', 'Liana']
+LAST = ['Lovelace', 'Turing', 'Hopper', 'Torvalds', 'Liskov', 'Thompson', 'Hamilton', 'Ritchie', 'Perlman',
+        'Dijkstra', 'Allen', 'McCarthy', 'Johnson', 'Wirth', 'Wilson', 'Berners-Lee', 'Diffie', 'Lamarr',
+        'Knuth', 'Kalpakchyan']
+WORDS = ('star chaos galaxy orbit comet nebula planet rocket launch night sky moon sun light dark matter '
+         'photo today friends coffee music travel city ocean mountain river book movie game code python '
+         'weekend holiday birthday dinner morning happy tired great amazing beautiful new old first last').split()
+
+
+def seed(num_users, num_posts, rng):
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'full_name': f'{rng.choice(FIRST)} {rng.choice(LAST)} {i}',
+         'email': f'user{i}@example.com', 'password': 'x'}
+        for i in range(1, num_users + 1)
+    ])
+    for start in range(0, num_posts, 50000):
+        db.session.execute(Post.__table__.insert(), [
+            {'content': ' '.join(rng.choices(WORDS, k=rng.randint(4, 30))), 'user_id': rng.randint(1, num_users)}
+            for _ in range(start, min(start + 50000, num_posts))
+        ])
+    db.session.commit()
+
+
+def measure(label, client, urls):
+    timings = []
+    for url in urls:
+        typeahead_cache.clear()
+        start = time.perf_counter()
+        response = client.get(url)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, (url, response.status_code)
+    timings.sort()
+    p50 = timings[len(timings) // 2]
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f'{label:<20} mean {statistics.mean(timings):7.2f} ms   p50 {p50:7.2f} ms   p95 {p95:7.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-uri')
+    args = parser.parse_args()
+
+    path = None
+    if args.database_uri is None:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+
+    class BenchmarkConfig(Config):
+        SECRET_KEY = 'benchmark'
+        SQLALCHEMY_DATABASE_URI = args.database_uri or f'sqlite:///{path}'
+
+    rng = random.Random(args.seed)
+    app = create_app(BenchmarkConfig)
+    try:
+        with app.app_context():
+            db.create_all()
+            start = time.perf_counter()
+            seed(args.users, args.posts, rng)
+            print(f'seeded {args.users} users / {args.posts} posts in {time.perf_counter() - start:.1f} s')
+
+        names = [f'{rng.choice(FIRST)} {rng.choice(LAST)}' for _ in range(args.samples)]
+        prefixes = [name[:rng.randint(2, len(name))] for name in names]
+        queries = [' '.join(rng.sample(WORDS, rng.randint(1, 3))) for _ in range(args.samples)]
+        with app.test_client() as client:
+            with client.session_transaction() as session:
+                session['_user_id'] = '1'
+                session['_fresh'] = True
+            measure('typeahead', client, [f'/api/search/typeahead?q={q}' for q in prefixes])
+            measure('post search', client, [f'/search?q={q}' for q in queries])
+            measure('people search', client, [f'/search?kind=people&q={q}' for q in names])
+        with app.app_context():
+            db.drop_all()
+    finally:
+        if path:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
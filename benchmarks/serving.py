@@ -0,0 +1,146 @@
+"""Compare requests per second under the development server and gunicorn.
+
+    python -m benchmarks.serving --clients 50 --duration 20
+
+Seeds a throwaway SQLite file (or uses ``--database-uri``, which should hold
+``flask seed`` data), then runs the same load against ``flask run`` and
+against ``gunicorn -c gunicorn.conf.py run:app``: ``--clients`` logged-in
+users on keep-alive connections, each requesting the home feed, a post and a
+profile in turn for ``--duration`` seconds. Reports requests per second,
+p50/p99 latency and errors for each server.
+"""
+import argparse
+import http.client
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.chat import _wait_for_port
+
+
+def _config(database_uri):
+    from starchaos.config import Config
+
+    class BenchmarkConfig(Config):
+        SECRET_KEY = 'benchmark'
+        SQLALCHEMY_DATABASE_URI = database_uri
+        MAIL_QUEUE_WORKER = False
+
+    return BenchmarkConfig
+
+
+def prepare(database_uri, seeded, users, posts):
+    """Seed the database if needed; return session cookies and the paths to request."""
+    from sqlalchemy import select
+    from starchaos import create_app, db
+    from starchaos.posts.models import Post
+    from starchaos.seed import seed
+    from starchaos.users.models import User
+
+    app = create_app(_config(database_uri))
+    with app.app_context():
+        if not seeded:
+            db.create_all()
+            seed(users=users, posts=posts, threads=users // 4)
+        people = db.session.execute(select(User.id, User.full_name).limit(500)).all()
+        post_ids = db.session.execute(select(Post.id).limit(500)).scalars().all()
+    serializer = app.session_interface.get_signing_serializer(app)
+    cookie_name = app.config['SESSION_COOKIE_NAME']
+    cookies = [f'{cookie_name}={serializer.dumps({"_user_id": str(user_id), "_fresh": True})}'
+               for user_id, _ in people]
+    paths = [['/'], [f'/post/{post_id}' for post_id in post_ids],
+             [f'/profile/{name.replace(" ", "%20")}' for _, name in people]]
+    return cookies, paths
+
+
+def load(port, cookies, paths, clients, duration, seed):
+    timings, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(cookie, rng):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local = []
+        turn = 0
+        while time.monotonic() < deadline:
+            path = rng.choice(paths[turn % len(paths)])
+            turn += 1
+            start = time.perf_counter()
+            try:
+                connection.request('GET', path, headers={'Cookie': cookie})
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 400:
+                    raise http.client.HTTPException(response.status)
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                with lock:
+                    errors[0] += 1
+                continue
+            local.append((time.perf_counter() - start) * 1000)
+        connection.close()
+        with lock:
+            timings.extend(local)
+
+    threads = [threading.Thread(target=client, args=(cookies[i % len(cookies)], random.Random(seed + i)))
+               for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if not timings:
+        raise RuntimeError(f'all {errors[0]} requests failed')
+    timings.sort()
+    return len(timings) / elapsed, timings[len(timings) // 2], timings[int(len(timings) * 0.99) - 1], errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=20, help='seconds of load per server')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--port', type=int, default=5200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-uri', help='an already seeded database')
+    args = parser.parse_args()
+
+    path = None
+    if args.database_uri is None:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+    database_uri = args.database_uri or f'sqlite:///{path}'
+    try:
+        cookies, paths = prepare(database_uri, args.database_uri is not None, args.users, args.posts)
+        environment = dict(os.environ, SECRET_KEY='benchmark', SQLALCHEMY_DATABASE_URI=database_uri,
+                           MAIL_QUEUE_WORKER='0', PORT=str(args.port), FLASK_APP='run.py')
+        servers = {
+            'flask run (Werkzeug)': ([sys.executable, '-m', 'flask', 'run', '--port', str(args.port)],
+                                     {'SOCKETIO_ASYNC_MODE': 'threading'}),
+            'gunicorn + eventlet': ([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'run:app'],
+                                    {'SOCKETIO_ASYNC_MODE': 'eventlet'}),
+        }
+        for label, (command, extra) in servers.items():
+            server = subprocess.Popen(command, env=dict(environment, **extra),
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                _wait_for_port(args.port)
+                rps, p50, p99, errors = load(args.port, cookies, paths, args.clients, args.duration, args.seed)
+                print(f'{label:<22} {rps:8.1f} req/s   p50 {p50:7.1f} ms   p99 {p99:7.1f} ms   {errors} errors')
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        if path:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Compare friend-suggestion strategies on a synthetic social graph.
+
+    python -m benchmarks.suggestions --users 100000
+
+Builds the graph in a throwaway SQLite file unless ``--database-uri`` is given,
+then times the previous whole-table ``random.sample`` approach against
+``suggest_friends`` with a cold and a warm cache.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from starchaos import create_app, db
+from starchaos.config import Config
+from starchaos.friends.models import friend_ids_select, friendships
+from starchaos.users.models import User
+from starchaos.users.utils import suggest_friends, suggestion_cache
+
+
+def legacy_suggestions(user, num_users=10):
+    friends_ids = db.session.execute(friend_ids_select(user.id)).scalars().all()
+    users_not_friends_ids = db.session.query(User.id).filter(~User.id.in_(friends_ids)).filter(
+        User.id != user.id)
+    total_users_not_friends = users_not_friends_ids.count()
+    num_users = min(num_users, total_users_not_friends)
+    random_user_ids = random.sample([id for (id,) in users_not_friends_ids.all()], num_users)
+    return User.query.filter(User.id.in_(random_user_ids)).all()
+
+
+def build_graph(num_users, seed):
+    rng = random.Random(seed)
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'full_name': f'user{i}', 'email': f'user{i}@example.com', 'password': 'x'}
+        for i in range(1, num_users + 1)
+    ])
+    edges = set()
+    for user_id in range(1, num_users + 1):
+        degree = min(int(rng.paretovariate(1.5) * 3), 1000)
+        for friend_id in rng.sample(range(1, num_users + 1), degree):
+            if friend_id != user_id:
+                edges.add((min(user_id, friend_id), max(user_id, friend_id)))
+    db.session.execute(friendships.insert(), [{'user_a_id': a, 'user_b_id': b} for a, b in edges])
+    db.session.execute(User.__table__.update().values(
+        friend_count=db.select(db.func.count()).where((friendships.c.user_a_id == User.id)
+                                                      | (friendships.c.user_b_id == User.id)).scalar_subquery()))
+    db.session.commit()
+    return len(edges)
+
+
+def measure(label, fn, user_ids):
+    timings = []
+    for user_id in user_ids:
+        user = db.session.get(User, user_id)
+        start = time.perf_counter()
+        fn(user)
+        timings.append((time.perf_counter() - start) * 1000)
+        db.session.expunge_all()
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f'{label:<28} mean {statistics.mean(timings):8.2f} ms   p95 {p95:8.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--samples', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-uri')
+    args = parser.parse_args()
+
+    path = None
+    if args.database_uri is None:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+
+    class BenchmarkConfig(Config):
+        SECRET_KEY = 'benchmark'
+        SQLALCHEMY_DATABASE_URI = args.database_uri or f'sqlite:///{path}'
+
+    app = create_app(BenchmarkConfig)
+    try:
+        with app.app_context():
+            db.create_all()
+            start = time.perf_counter()
+            edges = build_graph(args.users, args.seed)
+            print(f'built {args.users} users / {edges} friendships in {time.perf_counter() - start:.1f} s')
+
+            user_ids = random.Random(args.seed).sample(range(1, args.users + 1), args.samples)
+            measure('legacy random.sample', legacy_suggestions, user_ids)
+            suggestion_cache.clear()
+            measure('suggest_friends (cold)', suggest_friends, user_ids)
+            measure('suggest_friends (warm)', suggest_friends, user_ids)
+            db.drop_all()
+    finally:
+        if path:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
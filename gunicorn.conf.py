@@ -0,0 +1,27 @@
+"""Production server settings: ``gunicorn -c gunicorn.conf.py run:app``.
+
+Flask-SocketIO needs every request of a long-polling session to reach the
+process that owns it, and gunicorn does not balance by session, so each
+server runs exactly one eventlet worker. Scale out with more containers
+(``deploy.replicas``) behind nginx's ``ip_hash`` instead. One worker serves
+up to ``GUNICORN_WORKER_CONNECTIONS`` clients at once, all sharing a
+database pool of ``DATABASE_POOL_SIZE`` + ``DATABASE_MAX_OVERFLOW``
+connections.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+worker_class = 'eventlet'
+workers = 1
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+accesslog = os.getenv('GUNICORN_ACCESS_LOG')
+errorlog = '-'
+
+
+def worker_exit(server, worker):
+    # Store chat messages still waiting in the write-behind queue.
+    from starchaos import message_writer
+    message_writer.flush()
@@ -0,0 +1,55 @@
+"""search
+
+Revision ID: 5b0e3f9c1a27
+Revises: 2a9339883d75
+Create Date: 2026-10-18 11:24:08.412913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b0e3f9c1a27'
+down_revision = '2a9339883d75'
+branch_labels = None
+depends_on = None
+
+# Written by hand: autogenerate ignores the search schema (see
+# starchaos.search.models.include_object), which differs per dialect.
+SQLITE_FTS = {
+    'posts_fts': ('posts', 'content', "tokenize='porter unicode61'"),
+    'users_fts': ('users', 'full_name', "tokenize='trigram'"),
+}
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.create_index('ix_posts_content_tsv', 'posts', [sa.text("to_tsvector('english'::regconfig, content)")],
+                        postgresql_using='gin')
+        op.create_index('ix_users_full_name_trgm', 'users', ['full_name'], postgresql_using='gin',
+                        postgresql_ops={'full_name': 'gin_trgm_ops'})
+    elif dialect == 'sqlite':
+        for name, (table, column, options) in SQLITE_FTS.items():
+            op.execute(f'CREATE VIRTUAL TABLE {name} USING fts5({column}, {options})')
+            op.execute(f'INSERT INTO {name}(rowid, {column}) SELECT id, {column} FROM {table}')
+            op.execute(f'CREATE TRIGGER {name}_insert AFTER INSERT ON {table} BEGIN '
+                       f'INSERT INTO {name}(rowid, {column}) VALUES (new.id, new.{column}); END')
+            op.execute(f'CREATE TRIGGER {name}_update AFTER UPDATE OF {column} ON {table} BEGIN '
+                       f'UPDATE {name} SET {column} = new.{column} WHERE rowid = new.id; END')
+            op.execute(f'CREATE TRIGGER {name}_delete AFTER DELETE ON {table} BEGIN '
+                       f'DELETE FROM {name} WHERE rowid = old.id; END')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.drop_index('ix_users_full_name_trgm', table_name='users')
+        op.drop_index('ix_posts_content_tsv', table_name='posts')
+    elif dialect == 'sqlite':
+        for name in SQLITE_FTS:
+            for trigger in ('insert', 'update', 'delete'):
+                op.execute(f'DROP TRIGGER IF EXISTS {name}_{trigger}')
+            op.execute(f'DROP TABLE {name}')
@@ -0,0 +1,63 @@
+"""cascading deletes
+
+Revision ID: 727dd27247b4
+Revises: 5b0e3f9c1a27
+Create Date: 2026-10-18 11:18:14.767843
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '727dd27247b4'
+down_revision = '5b0e3f9c1a27'
+branch_labels = None
+depends_on = None
+
+# Foreign keys to users.id that now cascade, named as Postgres names them.
+CASCADES = {
+    'comments': ['user_id'],
+    'conversations': ['user_a_id', 'user_b_id'],
+    'friends': ['user_id', 'friend_id'],
+    'likes': ['user_id'],
+    'messages': ['sender_id', 'receiver_id'],
+    'posts': ['user_id'],
+}
+NAMING = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+
+def _replace_foreign_keys(ondelete):
+    for table, columns in CASCADES.items():
+        with op.batch_alter_table(table, naming_convention=NAMING) as batch_op:
+            for column in columns:
+                batch_op.drop_constraint(f'{table}_{column}_fkey', type_='foreignkey')
+                batch_op.create_foreign_key(f'{table}_{column}_fkey', 'users', [column], ['id'], ondelete=ondelete)
+    if op.get_bind().dialect.name == 'sqlite':
+        # Rebuilding posts, and users on downgrade, dropped their full-text triggers (see the search revision).
+        for name, table, column in (('posts_fts', 'posts', 'content'), ('users_fts', 'users', 'full_name')):
+            op.execute(f'CREATE TRIGGER IF NOT EXISTS {name}_insert AFTER INSERT ON {table} BEGIN '
+                       f'INSERT INTO {name}(rowid, {column}) VALUES (new.id, new.{column}); END')
+            op.execute(f'CREATE TRIGGER IF NOT EXISTS {name}_update AFTER UPDATE OF {column} ON {table} BEGIN '
+                       f'UPDATE {name} SET {column} = new.{column} WHERE rowid = new.id; END')
+            op.execute(f'CREATE TRIGGER IF NOT EXISTS {name}_delete AFTER DELETE ON {table} BEGIN '
+                       f'DELETE FROM {name} WHERE rowid = old.id; END')
+
+def upgrade():
+    with op.batch_alter_table('comments', schema=None) as batch_op:
+        batch_op.create_index('ix_comments_user_id', ['user_id'], unique=False)
+
+    _replace_foreign_keys('CASCADE')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('deleted_at')
+
+    _replace_foreign_keys(None)
+
+    with op.batch_alter_table('comments', schema=None) as batch_op:
+        batch_op.drop_index('ix_comments_user_id')
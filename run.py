@@ -1,4 +1,17 @@
-from starchaos import create_app, db
+import os
+import signal
+import sys
+
+production = os.getenv('SOCKETIO_ASYNC_MODE') == 'eventlet'
+if production:
+    import eventlet
+    eventlet.monkey_patch()
+    if os.getenv('SQLALCHEMY_DATABASE_URI', '').startswith('postgres'):
+        # psycopg2 waits for Postgres in C; this makes it yield to other greenlets.
+        from psycogreen.eventlet import patch_psycopg
+        patch_psycopg()
+
+from starchaos import create_app, db, socketio
 
 app = create_app()
 
@@ -6,4 +19,7 @@ with app.app_context():
     db.create_all()
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Exit through SystemExit on SIGTERM so atexit hooks, such as the chat
+    # message writer's final flush, run when the container is stopped.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    socketio.run(app, host='0.0.0.0', port=int(os.getenv('PORT', 5000)), debug=not production)
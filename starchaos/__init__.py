@@ -1,14 +1,38 @@
+import sqlite3
+
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
 from flask_mail import Mail
-from starchaos.config import Config
+from starchaos.config import Config, engine_options
 from flask_socketio import SocketIO
 from flask_migrate import Migrate
+from starchaos.timeline.stores import Timeline
+from starchaos.images.storage import ImageStorage
+from starchaos.presence import Presence
+from starchaos.users.writer import MessageWriter
+from starchaos.users.passwords import PasswordHasher
+from starchaos.throttle import Throttle
+from starchaos.outbox.worker import MailWorker
+from starchaos.users.deleter import AccountDeleter
+from starchaos.metrics import Metrics
+from starchaos.assets import Assets
+from starchaos.pagecache import PageCache
+from starchaos.replicas import Replicas, RoutingSession, replica_binds
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+@event.listens_for(Engine, 'connect')
+def _sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores foreign keys, and with them ON DELETE CASCADE, unless each connection asks.
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.execute('PRAGMA foreign_keys=ON')
+
 
-db = SQLAlchemy()
-bcrypt = Bcrypt()
 socketio = SocketIO()
 login_manager = LoginManager()
 login_manager.login_view = 'users.login'
@@ -16,31 +40,78 @@ login_manager.login_message_category = 'info'
 
 mail = Mail()
 migrate = Migrate()
+replicas = Replicas()
+timeline = Timeline()
+image_storage = ImageStorage()
+presence = Presence()
+message_writer = MessageWriter()
+passwords = PasswordHasher()
+throttle = Throttle()
+mail_worker = MailWorker()
+account_deleter = AccountDeleter()
+metrics = Metrics()
+assets = Assets()
+page_cache = PageCache()
 
 
 def create_app(config_class=Config):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
+    if app.config['PROXY_FIX_X_FOR']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
 
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+    app.config['SQLALCHEMY_BINDS'] = {**app.config['SQLALCHEMY_BINDS'], **replica_binds(app.config)}
     db.init_app(app)
-    bcrypt.init_app(app)
+    replicas.init_app(app)
     login_manager.init_app(app)
     mail.init_app(app)
-    socketio.init_app(app, cors_allowed_origins="*")
-    migrate.init_app(app, db)
+    socketio.init_app(app, message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'],
+                      async_mode=app.config['SOCKETIO_ASYNC_MODE'],
+                      cors_allowed_origins=app.config['SOCKETIO_CORS_ALLOWED_ORIGINS'])
+    from starchaos.search.models import include_object
+    migrate.init_app(app, db, include_object=include_object)
+    timeline.init_app(app)
+    image_storage.init_app(app)
+    presence.init_app(app)
+    message_writer.init_app(app)
+    passwords.init_app(app)
+    throttle.init_app(app)
+    mail_worker.init_app(app)
+    account_deleter.init_app(app)
+    metrics.init_app(app)
+    assets.init_app(app)
+    page_cache.init_app(app)
 
     from starchaos.users.routes import users
     from starchaos.posts.routes import posts
     from starchaos.comments.routes import comments
     from starchaos.likes.routes import likes
     from starchaos.main.routes import main
+    from starchaos.search.routes import search
     from starchaos.errors.hadlers import errors
+    from starchaos.commands import (recount_command, check_indexes_command, gc_uploads_command,
+                                    send_mail_command, smtp_sink_command, search_reindex_command,
+                                    seed_command, delete_user_command, delete_accounts_command,
+                                    build_assets_command)
 
     app.register_blueprint(users)
     app.register_blueprint(posts)
     app.register_blueprint(comments)
     app.register_blueprint(likes)
     app.register_blueprint(main)
+    app.register_blueprint(search)
     app.register_blueprint(errors)
 
+    app.cli.add_command(recount_command)
+    app.cli.add_command(check_indexes_command)
+    app.cli.add_command(gc_uploads_command)
+    app.cli.add_command(send_mail_command)
+    app.cli.add_command(smtp_sink_command)
+    app.cli.add_command(search_reindex_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(delete_user_command)
+    app.cli.add_command(delete_accounts_command)
+    app.cli.add_command(build_assets_command)
+
     return app
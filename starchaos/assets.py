@@ -0,0 +1,180 @@
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+OUTPUT = 'dist'
+MANIFEST = 'manifest.json'
+# Uploads are named after their content already and change at runtime.
+EXCLUDE = ('dist', 'images/post_images', 'images/profile_images')
+COMPRESSIBLE = {'.css', '.js', '.json', '.map', '.svg', '.txt', '.html', '.xml', '.ico', '.ttf', '.eot', '.otf'}
+_CSS_REFERENCE = re.compile(r'''url\(\s*(['"]?)([^'")]+?)\1\s*\)|@import\s+(['"])([^'"]+)\3''')
+
+
+def _sources(static_folder):
+    for directory, subdirectories, files in os.walk(static_folder):
+        relative = posixpath.relpath(directory.replace(os.sep, '/'), static_folder.replace(os.sep, '/'))
+        subdirectories[:] = sorted(name for name in subdirectories if not name.startswith('.')
+                                   and posixpath.normpath(posixpath.join(relative, name)) not in EXCLUDE)
+        for name in sorted(files):
+            yield posixpath.normpath(posixpath.join(relative, name))
+
+
+def _hashed_name(path, content):
+    stem, ext = posixpath.splitext(path)
+    return f'{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+
+
+def _compress(destination):
+    """Write the ``.gz`` and, if the ``brotli`` package is installed, ``.br`` variants that are smaller."""
+    with open(destination, 'rb') as f:
+        content = f.read()
+    variants = [('.gz', lambda: gzip.compress(content, compresslevel=9, mtime=0))]
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        variants.append(('.br', lambda: brotli.compress(content, quality=11)))
+    for suffix, compress in variants:
+        compressed = compress()
+        if len(compressed) < len(content):
+            with open(destination + suffix, 'wb') as f:
+                f.write(compressed)
+
+
+class _Build:
+    """Copies each asset under a content-hashed name, CSS after the files it refers to.
+
+    A file whose hashed name is already in ``previous`` is the same bytes, so
+    its compressed variants are copied from there instead of being redone.
+    """
+
+    def __init__(self, static_folder, output, previous):
+        self.static_folder = static_folder
+        self.output = output
+        self.previous = previous
+        self.sources = set(_sources(static_folder))
+        self.manifest = {}
+        self.to_compress = []
+
+    def _read(self, path):
+        with open(os.path.join(self.static_folder, path), 'rb') as f:
+            return f.read()
+
+    def _rewrite_css(self, path, content):
+        directory = posixpath.dirname(path)
+
+        def replace(match):
+            reference = match.group(2) or match.group(4)
+            if reference.startswith(('data:', '#', '/')) or '//' in reference:
+                return match.group(0)
+            target, suffix = re.match(r'([^?#]*)(.*)', reference).groups()
+            target = posixpath.normpath(posixpath.join(directory, target))
+            if target not in self.sources or target == path:
+                return match.group(0)
+            hashed = posixpath.relpath(self.fingerprint(target), directory or '.')
+            return match.group(0).replace(reference, hashed + suffix, 1)
+
+        text = content.decode('utf-8', errors='surrogateescape')
+        return _CSS_REFERENCE.sub(replace, text).encode('utf-8', errors='surrogateescape')
+
+    def fingerprint(self, path):
+        """Write ``path`` under its hashed name, once, and return that name."""
+        hashed = self.manifest.get(path)
+        if hashed is None:
+            content = self._read(path)
+            if path.endswith('.css'):
+                # Claim a name first so stylesheets that import each other do not recurse forever.
+                self.manifest[path] = path
+                content = self._rewrite_css(path, content)
+            hashed = self.manifest[path] = _hashed_name(path, content)
+            destination = os.path.join(self.output, hashed)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            with open(destination, 'wb') as f:
+                f.write(content)
+            if posixpath.splitext(path)[1] in COMPRESSIBLE and not self._reuse(hashed, destination):
+                self.to_compress.append(destination)
+        return hashed
+
+    def _reuse(self, hashed, destination):
+        earlier = os.path.join(self.previous, hashed)
+        if not os.path.exists(earlier):
+            return False
+        for suffix in ('.gz', '.br'):
+            if os.path.exists(earlier + suffix):
+                shutil.copyfile(earlier + suffix, destination + suffix)
+        return True
+
+
+def build_assets(static_folder, workers=None):
+    """Fingerprint every static file into ``static/dist`` and return the manifest.
+
+    Each file is copied as ``name.<content hash>.ext``, so its URL changes
+    whenever its bytes do and it can be cached forever. Stylesheets are
+    rewritten to point at the hashed names of the fonts and images they use
+    before they are hashed themselves. Text formats also get ``.gz`` and,
+    with the ``brotli`` package installed, ``.br`` variants for nginx's
+    ``gzip_static``/``brotli_static``, compressed by ``workers`` processes
+    and reused from the previous build when unchanged. The new tree is
+    written beside the old one and swapped in at the end, so a failed build
+    leaves the old one.
+    """
+    current = os.path.join(static_folder, OUTPUT)
+    output = tempfile.mkdtemp(prefix='.dist-', dir=static_folder)
+    try:
+        build = _Build(static_folder, output, current)
+        for path in sorted(build.sources):
+            build.fingerprint(path)
+        with ProcessPoolExecutor(workers) as pool:
+            # Biggest first, so one large file does not finish the build alone.
+            list(pool.map(_compress, sorted(build.to_compress, key=os.path.getsize, reverse=True)))
+        with open(os.path.join(output, MANIFEST), 'w') as f:
+            json.dump(build.manifest, f, indent=2, sort_keys=True)
+        os.chmod(output, 0o755)
+        stale = None
+        if os.path.exists(current):
+            stale = tempfile.mkdtemp(prefix='.dist-old-', dir=static_folder)
+            os.rename(current, os.path.join(stale, OUTPUT))
+        os.rename(output, current)
+    except BaseException:
+        shutil.rmtree(output, ignore_errors=True)
+        raise
+    if stale:
+        shutil.rmtree(stale, ignore_errors=True)
+    return build.manifest
+
+
+class Assets:
+    """Point ``url_for('static', ...)`` at the fingerprinted copies from ``flask build-assets``.
+
+    With ``ASSETS_FINGERPRINT`` on and a manifest present, every static URL
+    whose file was built resolves to ``dist/<hashed name>``; anything else,
+    uploads included, keeps its plain URL. Without a manifest nothing changes,
+    so development needs no build step.
+    """
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['assets'] = self
+        path = os.path.join(app.static_folder, OUTPUT, MANIFEST)
+        if not app.config['ASSETS_FINGERPRINT'] or not os.path.exists(path):
+            return
+        with open(path) as f:
+            self.manifest = json.load(f)
+        app.url_defaults(self._url_defaults)
+
+    def _url_defaults(self, endpoint, values):
+        if endpoint == 'static':
+            hashed = self.manifest.get(values.get('filename'))
+            if hashed is not None:
+                values['filename'] = f'{OUTPUT}/{hashed}'
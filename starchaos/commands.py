@@ -0,0 +1,246 @@
+import time
+
+import click
+from flask.cli import with_appcontext
+from flask import current_app
+from sqlalchemy import select, text, tuple_, update
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import func
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from starchaos import db
+from starchaos.assets import build_assets
+from starchaos.comments.models import Comment
+from starchaos.friends.models import friendships
+from starchaos.friends.utils import friends_statement, mutual_counts_statement
+from starchaos.images.models import Upload
+from starchaos.images.utils import collect_uploads
+from starchaos.likes.models import Like
+from starchaos.outbox.sink import DebuggingSMTPServer
+from starchaos.outbox.utils import purge_outbox, send_due
+from starchaos.outbox.worker import MailWorker
+from starchaos.posts.models import Post
+from starchaos.seed import PASSWORD, seed
+from starchaos.users.deletion import delete_account, pending_deletions, request_account_deletion
+from starchaos.search.utils import people_statement, posts_statement, reindex
+from starchaos.users.models import User, Message, Conversation
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain)
+def _compile_explain(element, compiler, **kw):
+    prefix = 'EXPLAIN QUERY PLAN ' if compiler.dialect.name == 'sqlite' else 'EXPLAIN '
+    return prefix + compiler.process(element.statement, **kw)
+
+
+def _repair(column, actual):
+    actual = actual.scalar_subquery()
+    table = column.class_
+    result = db.session.execute(
+        update(table).where(column != actual).values({column: actual})
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def _references(column, folder):
+    return select(func.count()).where(column == Upload.name, Upload.folder == folder) \
+        .correlate(Upload).scalar_subquery()
+
+
+@click.command('recount')
+@with_appcontext
+def recount_command():
+    """Recompute the denormalized counters and repair any drift."""
+    counters = [
+        (Post.like_count,
+         select(func.count(Like.id)).where(Like.post_id == Post.id)),
+        (Post.comment_count,
+         select(func.count(Comment.id)).where(Comment.post_id == Post.id)),
+        (User.post_count,
+         select(func.count(Post.id)).where(Post.user_id == User.id)),
+        (User.friend_count,
+         select(select(func.count()).where(friendships.c.user_a_id == User.id).correlate(User).scalar_subquery()
+                + select(func.count()).where(friendships.c.user_b_id == User.id).correlate(User).scalar_subquery())),
+        (Upload.ref_count,
+         select(_references(Post.image, 'post_images')
+                + _references(User.profile_image, 'profile_images')
+                + _references(User.bg_image, 'profile_images'))),
+    ]
+    for column, actual in counters:
+        fixed = _repair(column, actual)
+        click.echo(f'{column.class_.__tablename__}.{column.key}: {fixed} rows repaired')
+    db.session.commit()
+
+
+@click.command('gc-uploads')
+@click.option('--grace', type=int, help='Keep anything younger than this many seconds.')
+@with_appcontext
+def gc_uploads_command(grace):
+    """Delete uploads no post or profile refers to any more, with their renditions."""
+    if grace is None:
+        grace = current_app.config['IMAGE_GC_GRACE']
+    uploads, strays = collect_uploads(grace)
+    click.echo(f'{uploads} unreferenced uploads and {strays} stray files removed')
+
+
+@click.command('send-mail')
+@click.option('--loop', is_flag=True, help='Keep polling for due mail instead of exiting.')
+@with_appcontext
+def send_mail_command(loop):
+    """Send every queued email that is due and purge old ones, for cron or a dedicated mail worker."""
+    batch_size = current_app.config['MAIL_QUEUE_BATCH_SIZE']
+    purged_at = float('-inf')
+    while True:
+        sent = 0
+        while True:
+            claimed = send_due(batch_size)
+            sent += claimed
+            if claimed < batch_size:
+                break
+        click.echo(f'{sent} emails processed')
+        if time.monotonic() - purged_at >= MailWorker.PURGE_INTERVAL:
+            purged_at = time.monotonic()
+            click.echo(f'{purge_outbox(current_app.config["MAIL_QUEUE_RETENTION_DAYS"])} old emails purged')
+        if not loop:
+            return
+        time.sleep(current_app.config['MAIL_QUEUE_POLL_INTERVAL'])
+
+
+@click.command('smtp-sink')
+@click.option('--host', default='127.0.0.1')
+@click.option('--port', type=int, default=1025)
+@click.option('--directory', type=click.Path(file_okay=False), help='Also save each message as an .eml file here.')
+def smtp_sink_command(host, port, directory):
+    """Run a local SMTP server that prints mail instead of delivering it."""
+    server = DebuggingSMTPServer((host, port), directory=directory, echo=click.echo)
+    click.echo(f'SMTP sink listening on {host}:{port}; set MAIL_SERVER={host} MAIL_PORT={port} MAIL_USE_TLS=0')
+    server.serve_forever()
+
+
+@click.command('seed')
+@click.option('--users', type=int, default=1000, show_default=True)
+@click.option('--friends', 'friends_per_user', type=int, default=20, show_default=True,
+              help='Average friends per user.')
+@click.option('--posts', type=int, default=20000, show_default=True)
+@click.option('--likes', 'likes_per_post', type=int, default=5, show_default=True, help='Average likes per post.')
+@click.option('--comments', 'comments_per_post', type=int, default=2, show_default=True,
+              help='Average comments per post.')
+@click.option('--threads', type=int, default=2000, show_default=True, help='Private conversations.')
+@click.option('--messages', 'messages_per_thread', type=int, default=20, show_default=True,
+              help='Average messages per conversation.')
+@click.option('--seed', 'random_seed', type=int, default=42, show_default=True)
+@with_appcontext
+def seed_command(random_seed, **scale):
+    """Bulk-load synthetic users, friendships, posts, likes, comments and chats for load testing."""
+    counts = seed(seed=random_seed, echo=click.echo, **scale)
+    click.echo(f'{sum(counts.values())} rows written; every password is {PASSWORD!r}')
+
+
+@click.command('delete-user')
+@click.argument('email')
+@click.option('--batch-size', type=int, help='Rows removed per transaction.')
+@with_appcontext
+def delete_user_command(email, batch_size):
+    """Delete an account and everything it owns, in batches."""
+    user = User.query.filter_by(email=email).first()
+    if user is None:
+        raise click.ClickException(f'no user with email {email}')
+    request_account_deletion(user, background=False)
+    db.session.commit()
+    user_id = user.id
+    batches = delete_account(user_id, batch_size or current_app.config['ACCOUNT_DELETION_BATCH_SIZE'])
+    if db.session.get(User, user_id) is not None:
+        click.echo(f'{email} is being deleted by another worker')
+        return
+    click.echo(f'{email} deleted in {batches + 1} transactions')
+
+
+@click.command('delete-accounts')
+@with_appcontext
+def delete_accounts_command():
+    """Finish every requested account deletion, for cron when ACCOUNT_DELETION_WORKER=0."""
+    user_ids = pending_deletions()
+    for user_id in user_ids:
+        delete_account(user_id, current_app.config['ACCOUNT_DELETION_BATCH_SIZE'])
+    click.echo(f'{len(user_ids)} accounts deleted')
+
+
+@click.command('build-assets')
+@click.option('--workers', type=int, help='Compression processes (default: one per CPU).')
+@with_appcontext
+def build_assets_command(workers):
+    """Fingerprint and precompress the static files for nginx; restart the app to pick them up."""
+    start = time.perf_counter()
+    manifest = build_assets(current_app.static_folder, workers)
+    click.echo(f'{len(manifest)} assets built in {time.perf_counter() - start:.1f} s')
+
+
+@click.command('search-reindex')
+@with_appcontext
+def search_reindex_command():
+    """Rebuild the SQLite full-text tables, e.g. after restoring a database dump."""
+    click.echo(f'{reindex()} rows indexed')
+
+
+def _hot_queries(user_id, other_id, post_id):
+    feed = (Post.date_posted.desc(), Post.id.desc())
+    cursor = tuple_(Post.date_posted, Post.id) < tuple_(func.now(), post_id)
+    return {
+        'main.index': select(Post).where(cursor).order_by(*feed).limit(6),
+        'users.profile': select(Post).where(Post.user_id == user_id, cursor).order_by(*feed).limit(6),
+        'posts.post': select(Comment).where(Comment.post_id == post_id)
+        .order_by(Comment.date_posted.desc(), Comment.id.desc()).limit(Comment.PER_PAGE + 1),
+        'likes.like_action': select(Like.id).where(Like.user_id == user_id, Like.post_id == post_id),
+        'users.chat': Message.conversation(user_id, other_id)
+        .order_by(Message.date_posted.desc(), Message.id.desc()).limit(51).statement,
+        'users.chats': Conversation.inbox(user_id).statement,
+        'users.profile (friends)': friends_statement(user_id),
+        'users.profile (mutual)': mutual_counts_statement(user_id, [other_id]),
+        'search.results': posts_statement('star'),
+        'search.typeahead_api': people_statement('star', per_page=6),
+    }
+
+
+def _sequential_scans(plan, dialect):
+    if dialect == 'sqlite':
+        details = [row[-1] for row in plan]
+        # Reading back a subquery's own rows shows up as a SCAN of its name.
+        subqueries = {d.split()[-1] for d in details if d.startswith(('CO-ROUTINE', 'MATERIALIZE'))}
+        return [d for d in details if d.startswith('SCAN') and 'USING' not in d and 'VIRTUAL TABLE' not in d
+                and d.split()[1] not in subqueries]
+    return [row[0].strip() for row in plan if 'Seq Scan' in row[0]]
+
+
+@click.command('check-indexes')
+@with_appcontext
+def check_indexes_command():
+    """EXPLAIN each route's main query and fail on a sequential scan.
+
+    Run it against a seeded database. On Postgres the planner is told to avoid
+    sequential scans, so one only shows up when no usable index exists.
+    """
+    user_id = db.session.query(func.min(User.id)).scalar() or 1
+    other_id = db.session.query(func.max(User.id)).scalar() or 2
+    post_id = db.session.query(func.max(Post.id)).scalar() or 1
+    dialect = db.engine.dialect.name
+
+    failures = 0
+    for endpoint, statement in _hot_queries(user_id, other_id, post_id).items():
+        if dialect == 'postgresql':
+            db.session.execute(text('SET LOCAL enable_seqscan = off'))
+        plan = db.session.execute(Explain(statement)).all()
+        scans = _sequential_scans(plan, dialect)
+        if scans:
+            failures += 1
+            click.echo(f'{endpoint}: sequential scan -> {"; ".join(scans)}')
+        else:
+            click.echo(f'{endpoint}: ok')
+        db.session.rollback()
+    if failures:
+        raise click.ClickException(f'{failures} queries fall back to a sequential scan')
@@ -1,17 +1,31 @@
 from datetime import datetime
+from sqlalchemy.orm import joinedload
 from starchaos import db
+from starchaos.pagination import paginate_keyset
 
 
 class Comment(db.Model):
     __tablename__ = 'comments'
+    __table_args__ = (
+        db.Index('ix_comments_post_id_date_posted', 'post_id', 'date_posted', 'id'),
+        db.Index('ix_comments_user_id', 'user_id'),
+    )
 
     id = db.Column(db.Integer(), primary_key=True)
     content = db.Column(db.Text, nullable=False)
     date_posted = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), nullable=False)
 
-    user = db.relationship('User', backref='comments')
+    user = db.relationship('User', backref=db.backref('comments', passive_deletes=True))
+
+    PER_PAGE = 10
+
+    @staticmethod
+    def page(post_id, before=None, per_page=PER_PAGE):
+        """One keyset page of a post's comments, newest first, authors joined in."""
+        query = Comment.query.filter_by(post_id=post_id).options(joinedload(Comment.user))
+        return paginate_keyset(query, Comment, before=before, per_page=per_page)
 
     def __repr__(self):
         return f"Comment(content='{self.content}', date_posted='{self.date_posted}')"
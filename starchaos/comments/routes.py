@@ -1,5 +1,6 @@
-from flask import flash, redirect, request, abort, Blueprint
+from flask import flash, redirect, render_template, request, abort, Blueprint, jsonify, url_for
 from starchaos.comments.models import Comment
+from starchaos.posts.models import Post
 from starchaos import db
 from flask_login import current_user, login_required
 
@@ -12,7 +13,35 @@ def delete_comment(comment_id):
     comment = Comment.query.get_or_404(comment_id)
     if comment.user != current_user:
         abort(403)
+    comment.post.comment_count = Post.comment_count - 1
     db.session.delete(comment)
     db.session.commit()
     flash('Your comment has been deleted!', 'success')
     return redirect(request.referrer)
+
+
+@comments.route('/post/<int:post_id>/comments')
+@login_required
+def post_comments(post_id):
+    """The next page of a post's comments as an HTML fragment for "Load More"."""
+    post = Post.query.get_or_404(post_id)
+    comments = Comment.page(post.id, before=request.args.get('before'))
+    return render_template('includes/comments.html', post=post, comments=comments)
+
+
+@comments.route('/api/post/<int:post_id>/comments')
+@login_required
+def comments_api(post_id):
+    if db.session.get(Post, post_id) is None:
+        return jsonify(error='Post not found.'), 404
+    comments = Comment.page(post_id, before=request.args.get('before'))
+    return jsonify(
+        comments=[{
+            'id': comment.id,
+            'content': comment.content,
+            'date_posted': comment.date_posted.isoformat(),
+            'user': {'id': comment.user.id, 'full_name': comment.user.full_name,
+                     'url': url_for('users.profile', full_name=comment.user.full_name)},
+        } for comment in comments.items],
+        next_cursor=comments.next_cursor,
+    )
@@ -6,10 +6,93 @@ load_dotenv()
 
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY')
+    PROXY_FIX_X_FOR = int(os.getenv('PROXY_FIX_X_FOR', 0))
     SQLALCHEMY_DATABASE_URI = os.getenv('SQLALCHEMY_DATABASE_URI')
-    MAIL_SERVER = 'smtp.googlemail.com'
-    MAIL_PORT = 587
-    MAIL_USE_TLS = True
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    DATABASE_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', 10))
+    DATABASE_MAX_OVERFLOW = int(os.getenv('DATABASE_MAX_OVERFLOW', 10))
+    DATABASE_POOL_TIMEOUT = 10
+    DATABASE_POOL_RECYCLE = 1800
+    DATABASE_STATEMENT_TIMEOUT = int(os.getenv('DATABASE_STATEMENT_TIMEOUT', 30000))
+    SQLALCHEMY_BINDS = {}
+    SQLALCHEMY_REPLICA_URIS = [uri for uri in os.getenv('SQLALCHEMY_REPLICA_URIS', '').split(',') if uri]
+    REPLICA_MAX_LAG = 2
+    REPLICA_LAG_CHECK_INTERVAL = 1
+    REPLICA_STICKY_SECONDS = 5
+    MAIL_SERVER = os.getenv('MAIL_SERVER', 'smtp.googlemail.com')
+    MAIL_PORT = int(os.getenv('MAIL_PORT', 587))
+    MAIL_USE_TLS = os.getenv('MAIL_USE_TLS', '1') == '1'
+    MAIL_USE_SSL = False
+    MAIL_TIMEOUT = 30
     MAIL_USERNAME = os.getenv('MAIL_USERNAME')
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
     MAIL_SENDER = os.getenv('MAIL_SENDER')
+    MAIL_QUEUE_WORKER = os.getenv('MAIL_QUEUE_WORKER', '1') == '1'
+    MAIL_QUEUE_BATCH_SIZE = 50
+    MAIL_QUEUE_POLL_INTERVAL = 30
+    MAIL_QUEUE_MAX_ATTEMPTS = 8
+    MAIL_QUEUE_RETRY_DELAY = 30
+    MAIL_QUEUE_RETENTION_DAYS = 30
+    ACCOUNT_DELETION_WORKER = os.getenv('ACCOUNT_DELETION_WORKER', '1') == '1'
+    ACCOUNT_DELETION_BATCH_SIZE = 1000
+    ACCOUNT_DELETION_POLL_INTERVAL = 300
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+    THROTTLE_STORE_URL = os.getenv('THROTTLE_STORE_URL', 'memory://')
+    THROTTLE_LIMITS = {
+        'login': {'ip': (20, 10), 'account': (5, 5)},
+        'reset_request': {'ip': (5, 2), 'account': (3, 1)},
+    }
+    TIMELINE_STORE_URL = os.getenv('TIMELINE_STORE_URL', 'memory://')
+    TIMELINE_LENGTH = 800
+    TIMELINE_CACHE_USERS = 10000
+    TIMELINE_CELEBRITY_THRESHOLD = 1000
+    SUGGESTIONS_TTL = 300
+    USER_CACHE_TTL = 30
+    FRIENDS_CACHE_TTL = 60
+    SEARCH_TYPEAHEAD_TTL = 60
+    PAGE_CACHE_ENABLED = os.getenv('PAGE_CACHE_ENABLED', '1') == '1'
+    PAGE_CACHE_STORE_URL = os.getenv('PAGE_CACHE_STORE_URL', 'memory://')
+    PAGE_CACHE_SIZE = 20000
+    PAGE_CACHE_TTL = 300
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+    METRICS_DEBUG_HEADER = os.getenv('METRICS_DEBUG_HEADER', '0') == '1'
+    METRICS_REPEATED_QUERY_THRESHOLD = 5
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+    SOCKETIO_ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', 'threading')
+    SOCKETIO_CORS_ALLOWED_ORIGINS = os.getenv('SOCKETIO_CORS_ALLOWED_ORIGINS')
+    PRESENCE_STORE_URL = os.getenv('PRESENCE_STORE_URL', 'memory://')
+    PRESENCE_TTL = 90
+    CHAT_WRITE_BEHIND = os.getenv('CHAT_WRITE_BEHIND', '1') == '1'
+    CHAT_BATCH_SIZE = 200
+    CHAT_FLUSH_INTERVAL = 0.05
+    CHAT_QUEUE_SIZE = 10000
+    CHAT_QUEUE_TIMEOUT = 5
+    IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+    IMAGE_RENDITIONS = {
+        'profile_images': [64, 150, 600, 1500],
+        'post_images': [600, 1500],
+    }
+    IMAGE_STORAGE_URL = os.getenv('IMAGE_STORAGE_URL', 'file://')
+    IMAGE_S3_ENDPOINT_URL = os.getenv('IMAGE_S3_ENDPOINT_URL')
+    IMAGE_BASE_URL = os.getenv('IMAGE_BASE_URL', '')
+    IMAGE_GC_GRACE = 3600
+    ASSETS_FINGERPRINT = os.getenv('ASSETS_FINGERPRINT', '1') == '1'
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024
+
+
+def engine_options(config):
+    """Pool and connection settings for the configured database, overridden by ``SQLALCHEMY_ENGINE_OPTIONS``.
+
+    Connections are checked before use and replaced every
+    ``DATABASE_POOL_RECYCLE`` seconds, so a restarted Postgres costs a
+    reconnect rather than an error. Postgres statements are cancelled by the
+    server after ``DATABASE_STATEMENT_TIMEOUT`` milliseconds (0 disables it).
+    """
+    options = {'pool_pre_ping': True, 'pool_recycle': config['DATABASE_POOL_RECYCLE']}
+    if (config['SQLALCHEMY_DATABASE_URI'] or '').startswith('postgres'):
+        options.update(pool_size=config['DATABASE_POOL_SIZE'], max_overflow=config['DATABASE_MAX_OVERFLOW'],
+                       pool_timeout=config['DATABASE_POOL_TIMEOUT'],
+                       connect_args={'options': f"-c statement_timeout={config['DATABASE_STATEMENT_TIMEOUT']}"})
+    return {**options, **config['SQLALCHEMY_ENGINE_OPTIONS']}
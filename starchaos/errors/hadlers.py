@@ -18,6 +18,11 @@ def error_405(error):
     return render_template('errors/405.html'), 405
 
 
+@errors.app_errorhandler(429)
+def error_429(error):
+    return render_template('errors/429.html'), 429, {'Retry-After': str(error.retry_after or 60)}
+
+
 @errors.app_errorhandler(500)
 def error_500(error):
     return render_template('errors/500.html'), 500
@@ -0,0 +1,40 @@
+from sqlalchemy import select, union_all
+from starchaos import db
+
+friendships = db.Table(
+    'friendships',
+    db.Column('user_a_id', db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('user_b_id', db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+    db.CheckConstraint('user_a_id < user_b_id', name='ck_friendships_user_a_id_user_b_id'),
+    db.Index('ix_friendships_user_b_id_user_a_id', 'user_b_id', 'user_a_id'),
+)
+
+
+def pair(user_id, other_id):
+    """The two ids in stored order, smaller first."""
+    return (user_id, other_id) if user_id < other_id else (other_id, user_id)
+
+
+def edges(owners, among=None):
+    """A subquery of ``(user_id, friend_id)`` rows: every friend of each id in ``owners``.
+
+    Each friendship is stored once, so this reads it from both sides: the
+    primary key serves the ``user_a_id`` side and the ``(user_b_id,
+    user_a_id)`` index the other, and the filters sit inside each branch so
+    both stay index range reads. ``owners`` and ``among`` are lists or
+    selects of ids; ``among`` keeps only friends that are in it.
+    """
+    forward = select(friendships.c.user_a_id.label('user_id'), friendships.c.user_b_id.label('friend_id')) \
+        .where(friendships.c.user_a_id.in_(owners))
+    backward = select(friendships.c.user_b_id, friendships.c.user_a_id) \
+        .where(friendships.c.user_b_id.in_(owners))
+    if among is not None:
+        forward = forward.where(friendships.c.user_b_id.in_(among))
+        backward = backward.where(friendships.c.user_a_id.in_(among))
+    return union_all(forward, backward).subquery()
+
+
+def friend_ids_select(user_id):
+    """A select of ``user_id``'s friends' ids, for use in ``in_()`` and joins."""
+    rows = edges([user_id])
+    return select(rows.c.friend_id)
@@ -0,0 +1,119 @@
+from flask import current_app
+from sqlalchemy import delete, event, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.sql import func
+from starchaos import db, metrics
+from starchaos.cache import TTLCache
+from starchaos.friends.models import edges, friend_ids_select, friendships, pair
+from starchaos.pagination import KeysetPage
+from starchaos.users.models import User
+
+_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+friend_cache = TTLCache(maxsize=10000)
+metrics.watch_cache('friends', friend_cache)
+
+
+def friend_ids(user_id):
+    """``user_id``'s friends as a frozenset, from ``friend_cache`` when possible.
+
+    Entries live ``FRIENDS_CACHE_TTL`` seconds and are dropped as soon as a
+    friendship of the user changes and commits.
+    """
+    ids = friend_cache.get(user_id)
+    if ids is None:
+        ids = frozenset(db.session.execute(friend_ids_select(user_id)).scalars())
+        friend_cache.set(user_id, ids, ttl=current_app.config['FRIENDS_CACHE_TTL'])
+    return ids
+
+
+def forget_friends(*user_ids):
+    """Drop the cached friend sets of ``user_ids`` once the current transaction commits."""
+    db.session.info.setdefault('changed_friend_ids', set()).update(user_ids)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _forget_changed_friends(session):
+    friend_cache.delete(*session.info.pop('changed_friend_ids', ()))
+
+
+def are_friends(viewer, user_ids):
+    """The ids in ``user_ids`` that are friends of ``viewer``, as a set."""
+    mine = friend_ids(viewer.id)
+    return {user_id for user_id in user_ids if user_id in mine}
+
+
+def mutual_counts_statement(viewer_id, user_ids):
+    shared = edges(user_ids, among=friend_ids_select(viewer_id))
+    return select(shared.c.user_id, func.count()).group_by(shared.c.user_id)
+
+
+def mutual_friend_counts(viewer, user_ids):
+    """Map each of ``user_ids`` to the number of friends it shares with ``viewer``, in one query."""
+    counts = dict.fromkeys(user_ids, 0)
+    if counts and friend_ids(viewer.id):
+        counts.update(db.session.execute(mutual_counts_statement(viewer.id, list(counts))).all())
+    return counts
+
+
+def friends_statement(user_id, after=0, per_page=24):
+    """Up to ``per_page + 1`` of ``user_id``'s friends with ids above ``after``, in id order.
+
+    Both sides of the stored pairs are read from their index starting at the
+    cursor, at most ``per_page + 1`` rows each, so a deep page costs the same
+    as the first one whatever the number of friends.
+    """
+    a, b = friendships.c.user_a_id, friendships.c.user_b_id
+    forward = select(b.label('friend_id')).where(a == user_id, b > after).order_by(b).limit(per_page + 1)
+    backward = select(a.label('friend_id')).where(b == user_id, a > after).order_by(a).limit(per_page + 1)
+    ids = union_all(select(forward.subquery()), select(backward.subquery()))
+    return select(User).where(User.id.in_(ids)).order_by(User.id).limit(per_page + 1)
+
+
+def friends_page(user, after=None, per_page=24):
+    """Return the keyset page of ``user``'s friends after the ``after`` cursor; an invalid one yields the first."""
+    try:
+        after = int(after) if after else 0
+    except ValueError:
+        after = 0
+    items = db.session.execute(friends_statement(user.id, after, per_page)).scalars().all()
+    next_cursor = str(items[per_page - 1].id) if len(items) > per_page else None
+    return KeysetPage(items[:per_page], next_cursor)
+
+
+def _bump_friend_counts(amount, *users):
+    for user in users:
+        user.friend_count = User.friend_count + amount
+    forget_friends(*(user.id for user in users))
+
+
+def befriend(user, other):
+    """Store the friendship once and count it for both; return True only if it is new.
+
+    The caller commits.
+    """
+    if user.id == other.id:
+        return False
+    user_a_id, user_b_id = pair(user.id, other.id)
+    insert = _INSERTS[db.session.get_bind().dialect.name]
+    statement = insert(friendships).values(user_a_id=user_a_id, user_b_id=user_b_id) \
+        .on_conflict_do_nothing().returning(friendships.c.user_a_id)
+    if db.session.execute(statement).first() is None:
+        return False
+    _bump_friend_counts(1, user, other)
+    return True
+
+
+def unfriend(user, other):
+    """Delete the friendship and uncount it for both; return True only if there was one.
+
+    The caller commits.
+    """
+    user_a_id, user_b_id = pair(user.id, other.id)
+    statement = delete(friendships) \
+        .where(friendships.c.user_a_id == user_a_id, friendships.c.user_b_id == user_b_id) \
+        .returning(friendships.c.user_a_id)
+    if db.session.execute(statement).first() is None:
+        return False
+    _bump_friend_counts(-1, user, other)
+    return True
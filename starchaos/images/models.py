@@ -0,0 +1,54 @@
+import os
+from datetime import datetime
+from starchaos import db, image_storage
+
+
+class Upload(db.Model):
+    """A stored image, named by the SHA-256 of its bytes.
+
+    Identical uploads to the same folder share one row and one file;
+    ``ref_count`` tracks how many posts and profiles point at it, and
+    ``flask gc-uploads`` removes rows and files once it drops to zero.
+    """
+    __tablename__ = 'uploads'
+    __table_args__ = (
+        db.UniqueConstraint('folder', 'name', name='uq_uploads_folder_name'),
+        db.Index('ix_uploads_ref_count', 'ref_count'),
+    )
+
+    id = db.Column(db.Integer(), primary_key=True)
+    name = db.Column(db.String(80), nullable=False)
+    folder = db.Column(db.String(32), nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    renditions = db.Column(db.JSON, nullable=True)
+    ref_count = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    date_posted = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @property
+    def ready(self):
+        return self.status == 'ready'
+
+    def rendition_name(self, target, fmt):
+        stem, _ = os.path.splitext(self.name)
+        return f'{stem}-{target}.{fmt}'
+
+    def file_names(self):
+        """The original and every rendition written for it."""
+        return [self.name] + [self.rendition_name(target, fmt)
+                              for target, _ in self.renditions or [] for fmt in ('webp', 'jpg')]
+
+    def original_url(self):
+        return image_storage.backend.url(self.folder, self.name)
+
+    def srcset(self, fmt):
+        return ', '.join(
+            f'{image_storage.backend.url(self.folder, self.rendition_name(target, fmt))} {width}w'
+            for target, width in self.renditions
+        )
+
+    def url(self, fmt='jpg'):
+        target, _ = self.renditions[-1]
+        return image_storage.backend.url(self.folder, self.rendition_name(target, fmt))
+
+    def __repr__(self):
+        return f"Upload('{self.name}', '{self.status}')"
@@ -0,0 +1,132 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from flask import url_for
+
+CHUNK_SIZE = 64 * 1024
+
+
+def spool_upload(stream, directory=None):
+    """Copy ``stream`` to a temporary file in chunks, hashing it on the way.
+
+    Returns the hex SHA-256 digest and the temporary path; the caller moves or
+    removes the file.
+    """
+    digest = hashlib.sha256()
+    fd, path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, 'wb') as spooled:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            spooled.write(chunk)
+    return digest.hexdigest(), path
+
+
+class FileSystemStorage:
+    """Uploads under ``static/images/<folder>``, served by the static route or nginx.
+
+    ``put`` moves the source file into place, so renditions can be rendered
+    next to the original.
+    """
+
+    local = True
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, folder, name):
+        return os.path.join(self.root, folder, name)
+
+    def exists(self, folder, name):
+        return os.path.exists(self.path(folder, name))
+
+    def put(self, folder, name, source):
+        os.makedirs(os.path.join(self.root, folder), exist_ok=True)
+        shutil.move(source, self.path(folder, name))
+
+    def delete(self, folder, names):
+        for name in names:
+            try:
+                os.remove(self.path(folder, name))
+            except FileNotFoundError:
+                pass
+
+    def list(self, folder):
+        directory = os.path.join(self.root, folder)
+        if not os.path.isdir(directory):
+            return
+        for entry in os.scandir(directory):
+            if entry.is_file():
+                yield entry.name, datetime.utcfromtimestamp(entry.stat().st_mtime)
+
+    def url(self, folder, name):
+        return url_for('static', filename=f'images/{folder}/{name}')
+
+
+class S3Storage:
+    """Uploads in an S3-compatible bucket through a boto3-style client.
+
+    Any endpoint speaking the S3 API works, so MinIO or moto can stand in for
+    AWS locally. Objects are immutable, so they are written with a far-future
+    cache header. ``put`` copies the source file and leaves it for the caller
+    to remove.
+    """
+
+    local = False
+
+    def __init__(self, client, bucket, base_url, prefix='images/'):
+        self.client = client
+        self.bucket = bucket
+        self.base_url = base_url.rstrip('/')
+        self.prefix = prefix
+
+    def _key(self, folder, name):
+        return f'{self.prefix}{folder}/{name}'
+
+    def exists(self, folder, name):
+        key = self._key(folder, name)
+        found = self.client.list_objects_v2(Bucket=self.bucket, Prefix=key, MaxKeys=1)
+        return any(item['Key'] == key for item in found.get('Contents', []))
+
+    def put(self, folder, name, source):
+        content_type = {'.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png',
+                        '.webp': 'image/webp'}.get(os.path.splitext(name)[1], 'application/octet-stream')
+        self.client.upload_file(source, self.bucket, self._key(folder, name), ExtraArgs={
+            'ContentType': content_type,
+            'CacheControl': 'public, max-age=31536000, immutable',
+        })
+
+    def delete(self, folder, names):
+        keys = [{'Key': self._key(folder, name)} for name in names]
+        for start in range(0, len(keys), 1000):
+            self.client.delete_objects(Bucket=self.bucket, Delete={'Objects': keys[start:start + 1000]})
+
+    def list(self, folder):
+        prefix = self._key(folder, '')
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get('Contents', []):
+                yield item['Key'][len(prefix):], item['LastModified'].replace(tzinfo=None)
+
+    def url(self, folder, name):
+        return f'{self.base_url}/{self._key(folder, name)}'
+
+
+class ImageStorage:
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        url = app.config['IMAGE_STORAGE_URL']
+        if url.startswith('s3://'):
+            import boto3
+            bucket, _, prefix = url[len('s3://'):].partition('/')
+            client = boto3.client('s3', endpoint_url=app.config['IMAGE_S3_ENDPOINT_URL'])
+            self.backend = S3Storage(client, bucket, app.config['IMAGE_BASE_URL'],
+                                     prefix=f'{prefix.strip("/")}/' if prefix else '')
+        else:
+            self.backend = FileSystemStorage(os.path.join(app.root_path, 'static', 'images'))
+        app.extensions['image_storage'] = self
@@ -0,0 +1,187 @@
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from PIL import Image, ImageOps
+from flask import after_this_request, current_app
+from sqlalchemy.exc import IntegrityError
+from starchaos import db, image_storage
+from starchaos.images.models import Upload
+from starchaos.images.storage import spool_upload
+from starchaos.pagecache import touch
+from starchaos.posts.models import Post
+from starchaos.users.models import User
+
+_executor = None
+
+HASHED_NAME = re.compile(r'^[0-9a-f]{64}(-\d+)?\.\w+$')
+
+
+def render_renditions(source, directory, stem, widths):
+    """Write WebP and JPEG renditions of ``source`` bounded by each width.
+
+    Runs in a worker process. EXIF orientation is applied first, images are
+    never upscaled, and ``[target, actual_width]`` pairs are returned for the
+    renditions that were written.
+    """
+    produced = []
+    with Image.open(source) as original:
+        img = ImageOps.exif_transpose(original)
+        for target in sorted(widths):
+            rendition = img.copy()
+            rendition.thumbnail((target, target))
+            if produced and rendition.width == produced[-1][1]:
+                break
+            rendition.save(os.path.join(directory, f'{stem}-{target}.webp'), 'WEBP', quality=80, method=4)
+            if rendition.mode != 'RGB':
+                rendition = rendition.convert('RGBA')
+                background = Image.new('RGB', rendition.size, (255, 255, 255))
+                background.paste(rendition, mask=rendition.split()[-1])
+                rendition = background
+            rendition.save(os.path.join(directory, f'{stem}-{target}.jpg'), 'JPEG',
+                           quality=85, optimize=True, progressive=True)
+            produced.append([target, rendition.width])
+    return produced
+
+
+def _touch_owners(upload):
+    """New renditions change how the posts and profiles using ``upload`` render."""
+    if upload.folder == 'post_images':
+        owners = Post.query.filter_by(image=upload.name)
+    else:
+        owners = User.query.filter((User.profile_image == upload.name) | (User.bg_image == upload.name))
+    touch(*owners)
+
+
+def _mark_processed(app, upload_id, source, work_dir, future):
+    with app.app_context():
+        backend = image_storage.backend
+        upload = db.session.get(Upload, upload_id)
+        try:
+            if upload is None:
+                return
+            try:
+                upload.renditions = future.result()
+                if not backend.local:
+                    for name in upload.file_names()[1:]:
+                        backend.put(upload.folder, name, os.path.join(work_dir, name))
+                upload.status = 'ready'
+            except Exception:
+                app.logger.exception('Processing upload %s failed', upload.name)
+                upload.status = 'failed'
+            _touch_owners(upload)
+            db.session.commit()
+        finally:
+            if not backend.local:
+                shutil.rmtree(work_dir, ignore_errors=True)
+                os.remove(source)
+
+
+def _get_executor(workers):
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=workers)
+    return _executor
+
+
+def _completed(job):
+    future = Future()
+    try:
+        future.set_result(job())
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _add_reference(folder_name, name):
+    """Take a reference on an existing upload; return False if there is none."""
+    return Upload.query.filter_by(folder=folder_name, name=name) \
+        .update({Upload.ref_count: Upload.ref_count + 1}, synchronize_session=False) > 0
+
+
+def save_image(form_picture, folder_name):
+    """Store an upload under the hash of its bytes and return the file name.
+
+    The request body is streamed to disk in chunks while it is hashed, so a
+    large image is never held in memory. If the same bytes were uploaded to
+    this folder before, the existing file and renditions are reused and only
+    the reference count changes. Otherwise the file is handed to the storage
+    backend and its renditions are queued for the process pool once the
+    request has finished.
+    """
+    backend = image_storage.backend
+    _, f_ext = os.path.splitext(form_picture.filename)
+    digest, spooled = spool_upload(form_picture.stream)
+    picture_fn = digest + f_ext.lower()
+    if _add_reference(folder_name, picture_fn):
+        os.remove(spooled)
+        return picture_fn
+
+    upload = Upload(name=picture_fn, folder=folder_name)
+    try:
+        with db.session.begin_nested():
+            db.session.add(upload)
+    except IntegrityError:
+        # Another request stored the same bytes between the two statements.
+        _add_reference(folder_name, picture_fn)
+        os.remove(spooled)
+        return picture_fn
+
+    backend.put(folder_name, picture_fn, spooled)
+    if backend.local:
+        source = backend.path(folder_name, picture_fn)
+        work_dir = os.path.dirname(source)
+    else:
+        source, work_dir = spooled, tempfile.mkdtemp()
+
+    app = current_app._get_current_object()
+    job = partial(render_renditions, source, work_dir, digest, app.config['IMAGE_RENDITIONS'][folder_name])
+
+    @after_this_request
+    def process(response):
+        workers = app.config['IMAGE_WORKERS']
+        if workers:
+            future = _get_executor(workers).submit(job)
+        else:
+            future = _completed(job)
+        future.add_done_callback(partial(_mark_processed, app, upload.id, source, work_dir))
+        return response
+
+    return picture_fn
+
+
+def release_image(folder_name, name):
+    """Drop one reference to a stored image; ``flask gc-uploads`` deletes it at zero."""
+    if name:
+        Upload.query.filter_by(folder=folder_name, name=name) \
+            .update({Upload.ref_count: Upload.ref_count - 1}, synchronize_session=False)
+
+
+def collect_uploads(grace):
+    """Delete unreferenced uploads and stray stored files older than ``grace`` seconds.
+
+    Rows are locked while their files are removed so a concurrent upload of
+    the same bytes either takes a reference first or stores a fresh copy
+    afterwards. Stray files are hashed names with no row at all, left behind
+    by requests that stored an image and then rolled back. Returns the number
+    of rows and stray files removed.
+    """
+    backend = image_storage.backend
+    cutoff = datetime.utcnow() - timedelta(seconds=grace)
+    orphans = Upload.query.filter(Upload.ref_count <= 0, Upload.date_posted < cutoff).with_for_update().all()
+    for upload in orphans:
+        backend.delete(upload.folder, upload.file_names())
+        db.session.delete(upload)
+    db.session.commit()
+
+    strays = 0
+    for folder_name in current_app.config['IMAGE_RENDITIONS']:
+        known = {name[:64] for (name,) in db.session.query(Upload.name).filter_by(folder=folder_name)}
+        names = [name for name, modified in backend.list(folder_name)
+                 if HASHED_NAME.match(name) and name[:64] not in known and modified < cutoff]
+        backend.delete(folder_name, names)
+        strays += len(names)
+    return len(orphans), strays
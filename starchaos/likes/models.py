@@ -1,12 +1,36 @@
+from sqlalchemy import delete
+from sqlalchemy.dialects import postgresql, sqlite
 from starchaos import db
 
+_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
 
 class Like(db.Model):
     __tablename__ = 'likes'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'post_id', name='uq_likes_user_id_post_id'),
+        db.Index('ix_likes_post_id', 'post_id'),
+    )
 
     id = db.Column(db.Integer(), primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), nullable=False)
 
+    @staticmethod
+    def add(user_id, post_id):
+        """Insert the like in one statement; return True only if a row was added."""
+        insert = _INSERTS[db.session.get_bind().dialect.name]
+        statement = insert(Like.__table__).values(user_id=user_id, post_id=post_id) \
+            .on_conflict_do_nothing().returning(Like.__table__.c.id)
+        return db.session.execute(statement).first() is not None
+
+    @staticmethod
+    def remove(user_id, post_id):
+        """Delete the like in one statement; return True only if a row was removed."""
+        table = Like.__table__
+        statement = delete(table).where(table.c.user_id == user_id, table.c.post_id == post_id) \
+            .returning(table.c.id)
+        return db.session.execute(statement).first() is not None
+
     def __repr__(self):
         return f"Like(user_id={self.user_id}, post_id={self.post_id})"
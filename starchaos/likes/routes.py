@@ -1,4 +1,4 @@
-from flask import redirect, request, Blueprint
+from flask import redirect, request, Blueprint, jsonify
 from starchaos.posts.models import Post
 from starchaos import db
 from flask_login import current_user, login_required
@@ -17,3 +17,20 @@ def like_action(post_id, action):
         current_user.unlike_post(post)
         db.session.commit()
     return redirect(request.referrer)
+
+
+@likes.route('/api/like/<int:post_id>', methods=['POST'])
+@login_required
+def like_api(post_id):
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('liked'), bool):
+        return jsonify(error='Expected a JSON body like {"liked": true}.'), 400
+    post = db.session.get(Post, post_id)
+    if post is None:
+        return jsonify(error='Post not found.'), 404
+    if data['liked']:
+        current_user.like_post(post)
+    else:
+        current_user.unlike_post(post)
+    db.session.commit()
+    return jsonify(post_id=post.id, liked=data['liked'], like_count=post.like_count)
@@ -1,7 +1,8 @@
 from flask import render_template, request, Blueprint, redirect, url_for
-from starchaos.posts.models import Post
 from flask_login import login_required, current_user
 from starchaos import db
+from starchaos.posts.utils import load_feed
+from starchaos.timeline.utils import home_feed
 
 main = Blueprint('main', __name__)
 
@@ -10,8 +11,9 @@ main = Blueprint('main', __name__)
 @main.route("/index", methods=['POST', 'GET'])
 @login_required
 def index():
-    page = request.args.get('page', 1, type=int)
-    posts = Post.query.order_by(Post.date_posted.desc()).paginate(page=page, per_page=5)
+    before = request.args.get('before')
+    posts = home_feed(current_user, before=before, per_page=5)
+    load_feed(posts.items, current_user)
     return render_template('index.html', posts=posts)
 
 
@@ -0,0 +1,249 @@
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally
+from functools import wraps
+from threading import Lock
+
+from flask import Response, abort, g, has_request_context, request
+from flask.signals import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES = (1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f'{self.name}{_labels(self.labels, labels)} {value}'
+
+
+class Histogram:
+    """A Prometheus histogram: fixed buckets, one count per bucket, plus sum and count."""
+
+    def __init__(self, name, help, labels=(), buckets=SECONDS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}
+        self._lock = Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            values = [(labels, list(counts)) for labels, counts in self._values.items()]
+        names = self.labels + ('le',)
+        for labels, counts in values:
+            total = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                total += count
+                yield f'{self.name}_bucket{_labels(names, labels + (bound,))} {total}'
+            yield f'{self.name}_sum{_labels(self.labels, labels)} {counts[-1]}'
+            yield f'{self.name}_count{_labels(self.labels, labels)} {total}'
+
+
+class _RequestStats:
+    __slots__ = ('start', 'queries', 'sql_time', 'statements', 'template_time', 'template_starts', 'recorded')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.statements = _Tally()
+        self.template_time = 0.0
+        self.template_starts = []
+        self.recorded = False
+
+
+def _stats():
+    stats = g.get('_request_stats')
+    if stats is None:
+        stats = g._request_stats = _RequestStats()
+    return stats
+
+
+class Metrics:
+    """Per-request SQL, template and latency measurements, served on ``/metrics``.
+
+    Every request and Socket.IO event counts its SQL statements and their
+    time, its template rendering time and its total time, all per endpoint.
+    A statement run ``METRICS_REPEATED_QUERY_THRESHOLD`` times or more in one
+    request is counted and logged once as a likely N+1. With
+    ``METRICS_DEBUG_HEADER`` on, each response carries the breakdown in a
+    ``Server-Timing`` header. Numbers are per process.
+    """
+
+    def __init__(self, app=None):
+        self.caches = {}
+        self.request_seconds = Histogram('starchaos_request_duration_seconds', 'Time to handle a request.',
+                                         ('blueprint', 'endpoint'))
+        self.requests = Counter('starchaos_requests_total', 'Requests handled.', ('endpoint', 'status'))
+        self.request_queries = Histogram('starchaos_request_queries', 'SQL statements run by one request.',
+                                         ('endpoint',), buckets=QUERIES)
+        self.sql_seconds = Histogram('starchaos_request_sql_duration_seconds',
+                                     'Time a request spent in SQL statements.', ('endpoint',))
+        self.repeated = Counter('starchaos_repeated_queries_total',
+                                'Requests that ran one statement many times (likely N+1).', ('endpoint',))
+        self.template_seconds = Histogram('starchaos_template_render_duration_seconds',
+                                          'Time to render a template.', ('template',))
+        self.event_seconds = Histogram('starchaos_socketio_event_duration_seconds',
+                                       'Time to handle a Socket.IO event.', ('event',))
+        self._reported = set()
+        self.enabled = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config['METRICS_ENABLED']
+        self.debug_header = app.config['METRICS_DEBUG_HEADER']
+        self.threshold = app.config['METRICS_REPEATED_QUERY_THRESHOLD']
+        self.token = app.config['METRICS_TOKEN']
+        app.extensions['metrics'] = self
+        app.add_url_rule('/metrics', 'metrics', self.view)
+        if not self.enabled:
+            return
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        before_render_template.connect(_before_render, app)
+        template_rendered.connect(self._rendered, app)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def watch_cache(self, name, cache):
+        """Report a ``TTLCache``'s hits, misses and size on ``/metrics`` as ``name``."""
+        self.caches[name] = cache
+
+    def _rendered(self, sender, template, context, **extra):
+        stats = _stats()
+        if stats.template_starts:
+            elapsed = time.perf_counter() - stats.template_starts.pop()
+            stats.template_time += elapsed
+            self.template_seconds.observe(elapsed, template.name or 'string')
+
+    def _before_request(self):
+        g._request_stats = _RequestStats()
+
+    def _record(self, stats, endpoint, status, label=None):
+        stats.recorded = True
+        elapsed = time.perf_counter() - stats.start
+        if label is None:
+            self.request_seconds.observe(elapsed, request.blueprint or '', endpoint)
+            self.requests.inc(endpoint, status)
+        else:
+            self.event_seconds.observe(elapsed, label)
+        self.request_queries.observe(stats.queries, endpoint)
+        self.sql_seconds.observe(stats.sql_time, endpoint)
+        repeated = [(statement, count) for statement, count in stats.statements.items() if count >= self.threshold]
+        if repeated:
+            self.repeated.inc(endpoint)
+            for statement, count in repeated:
+                if (endpoint, statement) not in self._reported and len(self._reported) < 1000:
+                    self._reported.add((endpoint, statement))
+                    self.app.logger.warning('%s ran the same statement %d times (N+1?): %s',
+                                            endpoint, count, ' '.join(statement.split())[:300])
+        return elapsed
+
+    def _after_request(self, response):
+        stats = g.get('_request_stats')
+        if stats is None or stats.recorded:
+            return response
+        elapsed = self._record(stats, request.endpoint or 'none', response.status_code)
+        if self.debug_header:
+            response.headers['Server-Timing'] = (
+                f'db;dur={stats.sql_time * 1000:.1f};desc="{stats.queries} queries", '
+                f'tpl;dur={stats.template_time * 1000:.1f}, total;dur={elapsed * 1000:.1f}')
+        return response
+
+    def _teardown_request(self, error):
+        stats = g.get('_request_stats')
+        if stats is not None and not stats.recorded and error is not None:
+            self._record(stats, request.endpoint or 'none', 500)
+
+    def timed_event(self, handler):
+        """Decorate a Socket.IO handler to record its time and queries under ``socketio.<event>``."""
+        @wraps(handler)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return handler(*args, **kwargs)
+            stats = g._request_stats = _RequestStats()
+            name = request.event['message']
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                self._record(stats, f'socketio.{name}', None, label=name)
+        return wrapper
+
+    def render(self):
+        lines = []
+        for metric in (self.request_seconds, self.requests, self.request_queries, self.sql_seconds,
+                       self.repeated, self.template_seconds, self.event_seconds):
+            lines.extend(metric.render())
+        for kind in ('hits', 'misses'):
+            lines.append(f'# TYPE starchaos_cache_{kind}_total counter')
+            lines.extend(f'starchaos_cache_{kind}_total{_labels(("cache",), (name,))} {getattr(cache, kind)}'
+                         for name, cache in self.caches.items())
+        lines.append('# TYPE starchaos_cache_size gauge')
+        lines.extend(f'starchaos_cache_size{_labels(("cache",), (name,))} {len(cache)}'
+                     for name, cache in self.caches.items())
+        return '\n'.join(lines) + '\n'
+
+    def view(self):
+        if self.token and request.headers.get('Authorization') != f'Bearer {self.token}':
+            abort(403)
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and has_request_context():
+        context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_metrics_start', None)
+    if start is not None and has_request_context():
+        stats = _stats()
+        stats.queries += 1
+        stats.sql_time += time.perf_counter() - start
+        stats.statements[statement] += 1
+
+
+def _before_render(sender, template, context, **extra):
+    _stats().template_starts.append(time.perf_counter())
@@ -0,0 +1,24 @@
+from datetime import datetime
+from starchaos import db
+
+
+class OutboundEmail(db.Model):
+    """A queued email, kept until it is sent or has run out of attempts."""
+    __tablename__ = 'outbound_emails'
+    __table_args__ = (
+        db.Index('ix_outbound_emails_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.Integer(), primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_error = db.Column(db.Text, nullable=True)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    date_created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    date_sent = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"OutboundEmail('{self.recipient}', '{self.status}')"
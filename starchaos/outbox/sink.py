@@ -0,0 +1,74 @@
+import os
+import socketserver
+import time
+from email import message_from_bytes
+from threading import Lock
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 starchaos debugging SMTP sink')
+        sender, recipients = None, []
+        for raw in self.rfile:
+            command = raw.decode('utf-8', 'replace').rstrip('\r\n')
+            verb = command[:4].upper()
+            if verb in ('HELO', 'EHLO'):
+                self.reply('250 sink')
+            elif verb == 'MAIL':
+                sender, recipients = command.partition(':')[2].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.partition(':')[2].strip())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                for line in self.rfile:
+                    if line in (b'.\r\n', b'.\n'):
+                        break
+                    lines.append(line[1:] if line.startswith(b'.') else line)
+                self.server.deliver(sender, recipients, b''.join(lines))
+                self.reply('250 OK')
+            elif verb in ('RSET', 'NOOP'):
+                if verb == 'RSET':
+                    sender, recipients = None, []
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class DebuggingSMTPServer(socketserver.ThreadingTCPServer):
+    """An SMTP server that accepts everything and delivers nowhere.
+
+    Messages are kept in ``messages`` as parsed ``email.message.Message``
+    objects and, if ``directory`` is given, written there as ``.eml`` files.
+    Point ``MAIL_SERVER``/``MAIL_PORT`` at it with ``MAIL_USE_TLS=0`` to
+    watch outgoing mail locally or to assert on it in tests.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, directory=None, echo=None):
+        super().__init__(address, _SinkHandler)
+        self.directory = directory
+        self.echo = echo
+        self.messages = []
+        self._lock = Lock()
+
+    def deliver(self, sender, recipients, data):
+        message = message_from_bytes(data)
+        with self._lock:
+            self.messages.append(message)
+            count = len(self.messages)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, f'{time.time_ns()}-{count}.eml'), 'wb') as f:
+                f.write(data)
+        if self.echo:
+            self.echo(f'{sender} -> {", ".join(recipients)}: {message["Subject"]}')
@@ -0,0 +1,108 @@
+import smtplib
+from datetime import datetime, timedelta
+
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import delete, select
+from starchaos import db
+from starchaos.outbox.models import OutboundEmail
+
+
+def queue_email(recipient, subject, body, status='pending'):
+    """Add an email to the outbox in the caller's transaction.
+
+    Nothing is sent until the transaction commits; the mail worker is woken
+    then, so a rolled-back request never sends anything. A ``'discarded'``
+    email is recorded but never sent.
+    """
+    email = OutboundEmail(recipient=recipient, subject=subject, body=body, status=status)
+    db.session.add(email)
+    if status == 'pending':
+        db.session.info['mail_queued'] = True
+    return email
+
+
+def _connect(config):
+    smtp = smtplib.SMTP_SSL if config['MAIL_USE_SSL'] else smtplib.SMTP
+    host = smtp(config['MAIL_SERVER'], config['MAIL_PORT'], timeout=config['MAIL_TIMEOUT'])
+    if config['MAIL_USE_TLS']:
+        host.starttls()
+    if config['MAIL_USERNAME'] and config['MAIL_PASSWORD']:
+        host.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'])
+    return host
+
+
+def _failed(email, error, now, config):
+    email.attempts += 1
+    email.last_error = str(error) or error.__class__.__name__
+    if email.attempts >= config['MAIL_QUEUE_MAX_ATTEMPTS']:
+        email.status = 'failed'
+    else:
+        delay = min(config['MAIL_QUEUE_RETRY_DELAY'] * 2 ** (email.attempts - 1), 3600)
+        email.next_attempt_at = now + timedelta(seconds=delay)
+
+
+def send_due(batch_size):
+    """Send up to ``batch_size`` due emails over one SMTP connection; return how many were claimed.
+
+    Rows are claimed with ``FOR UPDATE SKIP LOCKED`` so several workers can
+    drain the outbox side by side. A failed email is retried with exponential
+    backoff until ``MAIL_QUEUE_MAX_ATTEMPTS``, then marked failed. A crash
+    before the commit leaves the batch pending, so delivery is at-least-once.
+    """
+    config = current_app.config
+    now = datetime.utcnow()
+    emails = OutboundEmail.query \
+        .filter(OutboundEmail.status == 'pending', OutboundEmail.next_attempt_at <= now) \
+        .order_by(OutboundEmail.next_attempt_at, OutboundEmail.id) \
+        .limit(batch_size).with_for_update(skip_locked=True).all()
+    if not emails:
+        db.session.commit()
+        return 0
+
+    pending = list(emails)
+    try:
+        host = _connect(config)
+        try:
+            while pending:
+                email = pending[0]
+                message = Message(email.subject, sender=config['MAIL_SENDER'],
+                                  recipients=[email.recipient], body=email.body)
+                try:
+                    host.sendmail(config['MAIL_SENDER'], [email.recipient], message.as_bytes())
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError, smtplib.SMTPSenderRefused) as error:
+                    _failed(email, error, now, config)
+                else:
+                    email.status = 'sent'
+                    email.date_sent = datetime.utcnow()
+                pending.pop(0)
+        finally:
+            try:
+                host.quit()
+            except (OSError, smtplib.SMTPException):
+                pass
+    except (OSError, smtplib.SMTPException) as error:
+        current_app.logger.warning('Sending %d emails failed: %s', len(pending), error)
+        for email in pending:
+            _failed(email, error, now, config)
+    db.session.commit()
+    return len(emails)
+
+
+def purge_outbox(days, batch_size=1000):
+    """Delete sent, discarded and failed emails created more than ``days`` ago; return how many.
+
+    Rows go ``batch_size`` per transaction, so a long backlog never holds a
+    big lock. Pending emails are kept however old they are.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    table = OutboundEmail.__table__
+    purged = 0
+    while True:
+        chosen = select(table.c.id).where(table.c.status.in_(('sent', 'discarded', 'failed')),
+                                          table.c.date_created < cutoff).limit(batch_size)
+        removed = db.session.execute(delete(table).where(table.c.id.in_(chosen.scalar_subquery()))).rowcount
+        db.session.commit()
+        purged += removed
+        if removed < batch_size:
+            return purged
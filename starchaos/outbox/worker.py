@@ -0,0 +1,77 @@
+import time
+from threading import Event, Lock, Thread
+
+from sqlalchemy import event
+
+
+class MailWorker:
+    """Background sender for the outbox.
+
+    A thread, started by the app's first request, sends due emails in
+    batches of ``MAIL_QUEUE_BATCH_SIZE``. It runs once on start, sending mail
+    left behind by a stopped worker, then wakes when a transaction that
+    queued mail commits and every ``MAIL_QUEUE_POLL_INTERVAL`` seconds for
+    retries. About once an hour it also purges emails older than
+    ``MAIL_QUEUE_RETENTION_DAYS``. CLI commands never start it. Set
+    ``MAIL_QUEUE_WORKER`` off to send only through ``flask send-mail``.
+    """
+
+    PURGE_INTERVAL = 3600
+
+    def __init__(self, app=None):
+        self.app = None
+        self._thread = None
+        self._wake = Event()
+        self._lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from starchaos import db
+
+        self.app = app
+        self.enabled = app.config['MAIL_QUEUE_WORKER']
+        self.batch_size = app.config['MAIL_QUEUE_BATCH_SIZE']
+        self.interval = app.config['MAIL_QUEUE_POLL_INTERVAL']
+        if not event.contains(db.session, 'after_commit', self._committed):
+            event.listen(db.session, 'after_commit', self._committed)
+        app.extensions['mail_worker'] = self
+        if self.enabled:
+            app.before_request(self._start)
+
+    def _start(self):
+        if self._thread is None:
+            self.notify()
+
+    def _committed(self, session):
+        if session.info.pop('mail_queued', False):
+            self.notify()
+
+    def notify(self):
+        if not self.enabled:
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = Thread(target=self._run, daemon=True)
+                    self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        from starchaos import db
+        from starchaos.outbox.utils import purge_outbox, send_due
+
+        purged = float('-inf')
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            with self.app.app_context():
+                try:
+                    while send_due(self.batch_size) == self.batch_size:
+                        pass
+                    if time.monotonic() - purged >= self.PURGE_INTERVAL:
+                        purged = time.monotonic()
+                        purge_outbox(self.app.config['MAIL_QUEUE_RETENTION_DAYS'])
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception('Sending queued mail failed')
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+from flask import current_app, g, request, session
+from markupsafe import Markup
+from starchaos.cache import TTLCache
+
+
+class RedisFragments:
+    """Rendered fragments shared by every worker through Redis.
+
+    Works with any client exposing the redis-py API. Entries expire ``ttl``
+    seconds after they are set; beyond that, Redis's ``maxmemory`` policy
+    bounds the space they take. ``hits`` and ``misses`` are counted per process.
+    """
+
+    def __init__(self, client, ttl=300, prefix='fragment:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        value = self.client.get(f'{self.prefix}{key}')
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value.decode('utf-8')
+
+    def set(self, key, value, ttl=None):
+        self.client.set(f'{self.prefix}{key}', value.encode('utf-8'), ex=self.ttl if ttl is None else ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(f'{self.prefix}{key}' for key in keys))
+
+
+def create_fragment_store(url, maxsize, ttl):
+    if url.startswith('memory://'):
+        return TTLCache(maxsize=maxsize, ttl=ttl)
+    import redis
+    return RedisFragments(redis.Redis.from_url(url), ttl=ttl)
+
+
+def _digest(*parts):
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def _release(app):
+    """A stamp of the templates and built assets, so a deploy never reads the previous one's fragments."""
+    digest = hashlib.sha1(json.dumps(app.extensions['assets'].manifest, sort_keys=True).encode('utf-8'))
+    for directory, subdirectories, files in os.walk(os.path.join(app.root_path, app.template_folder)):
+        subdirectories.sort()
+        for name in sorted(files):
+            with open(os.path.join(directory, name), 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def touch(*rows):
+    """Give ``rows`` a new ``updated_at``, for changes that do not otherwise write them.
+
+    Pages and fragments are keyed by their rows' ``updated_at``, so this is
+    how a write that only affects how a row is shown - say, its image's
+    renditions becoming ready - reaches them. The caller commits.
+    """
+    now = datetime.utcnow()
+    for row in rows:
+        row.updated_at = now
+
+
+class PageCache:
+    """Conditional GETs and cached template fragments, keyed by row versions.
+
+    A page calls ``validate`` with the ``updated_at`` stamps of the rows it
+    shows; a client that sends the resulting ETag back in ``If-None-Match``
+    gets a 304 without the page being built. Expensive parts of a page are
+    rendered once per version and viewer with ``cached`` or, in templates,
+    ``{% call fragment(name, *key) %}...{% endcall %}``, into an in-process
+    LRU or, with ``PAGE_CACHE_STORE_URL`` set to a Redis URL, a store shared
+    by every worker. A write invalidates both simply by changing the stamps.
+    What a page shows of other users' rows is not in its stamps, so ETags and
+    fragments also lapse after ``PAGE_CACHE_TTL`` seconds.
+    """
+
+    def __init__(self, app=None):
+        self.store = None
+        self.enabled = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config['PAGE_CACHE_ENABLED']
+        self.ttl = app.config['PAGE_CACHE_TTL']
+        self.store = create_fragment_store(app.config['PAGE_CACHE_STORE_URL'],
+                                           app.config['PAGE_CACHE_SIZE'], self.ttl)
+        self.release = _release(app)
+        app.extensions['page_cache'] = self
+        if isinstance(self.store, TTLCache):
+            app.extensions['metrics'].watch_cache('fragments', self.store)
+        app.jinja_env.globals['fragment'] = self.fragment
+        app.after_request(self._tag)
+
+    def cached(self, name, key, render):
+        """Return the markup ``render()`` produces for ``key``, calling it only when the store has none."""
+        if not self.enabled:
+            return Markup(render())
+        store_key = f'{self.release}:{name}:{_digest(*key)}'
+        value = self.store.get(store_key)
+        if value is None:
+            value = str(render())
+            self.store.set(store_key, value)
+        return Markup(value)
+
+    def fragment(self, name, *key, caller):
+        return self.cached(name, key, caller)
+
+    def forget(self, name, *key):
+        """Drop one fragment now rather than waiting for its key to change."""
+        self.store.delete(f'{self.release}:{name}:{_digest(*key)}')
+
+    def validate(self, *versions):
+        """Return a 304 response if the client's copy of this page is current, else None.
+
+        ``versions`` must cover everything the page shows for this viewer,
+        including the viewer. When None is returned the page rendered by the
+        view is sent with the ETag. Pages with pending flashed messages are
+        neither tagged nor answered with 304, since those show only once.
+        """
+        if not self.enabled or request.method != 'GET' or '_flashes' in session:
+            return None
+        g.page_etag = _digest(self.release, int(time.time() // self.ttl), *versions)
+        if request.if_none_match.contains_weak(g.page_etag):
+            return current_app.response_class(status=304)
+        return None
+
+    def _tag(self, response):
+        etag = g.pop('page_etag', None)
+        if etag is not None and response.status_code in (200, 304):
+            response.set_etag(etag, weak=True)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            response.vary.add('Cookie')
+        return response
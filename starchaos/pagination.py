@@ -0,0 +1,43 @@
+import base64
+from datetime import datetime
+from sqlalchemy import tuple_
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(item):
+    raw = f'{item.date_posted.isoformat()}|{item.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date_posted, item_id = raw.split('|')
+        return datetime.fromisoformat(date_posted), int(item_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def paginate_keyset(query, model, before=None, per_page=5):
+    """Return the page of ``query`` that comes right after the ``before`` cursor.
+
+    Rows are ordered newest first by ``(date_posted, id)`` and the page is cut
+    with a row comparison instead of OFFSET, so deep pages cost the same as the
+    first one and no COUNT(*) is needed. An invalid cursor yields the first page.
+    """
+    key = tuple_(model.date_posted, model.id)
+    position = decode_cursor(before) if before else None
+    if position:
+        query = query.filter(key < tuple_(*position))
+    items = query.order_by(model.date_posted.desc(), model.id.desc()).limit(per_page + 1).all()
+    next_cursor = encode_cursor(items[per_page - 1]) if len(items) > per_page else None
+    return KeysetPage(items[:per_page], next_cursor)
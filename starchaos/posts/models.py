@@ -1,17 +1,38 @@
 from datetime import datetime
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
 from starchaos import db
 
 
 class Post(db.Model):
     __tablename__ = 'posts'
+    __table_args__ = (
+        db.Index('ix_posts_date_posted', 'date_posted', 'id'),
+        db.Index('ix_posts_user_id_date_posted', 'user_id', 'date_posted', 'id'),
+    )
 
     id = db.Column(db.Integer(), primary_key=True)
     content = db.Column(db.Text, nullable=False)
     date_posted = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    image = db.Column(db.String(20), nullable=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    likes = db.relationship('Like', backref='post', lazy=True, cascade='all, delete-orphan')
-    comments = db.relationship('Comment', backref='post', lazy=True, cascade='all, delete-orphan')
+    image = db.Column(db.String(80), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.func.now())
+    # Likes and comments are removed by their ON DELETE CASCADE foreign keys,
+    # so deleting a post never loads them.
+    likes = db.relationship('Like', backref='post', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    comments = db.relationship('Comment', backref='post', lazy='dynamic', cascade='all, delete-orphan',
+                               passive_deletes=True)
+    upload = db.relationship('Upload', viewonly=True, lazy='joined',
+                             primaryjoin="and_(foreign(Post.image) == Upload.name, Upload.folder == 'post_images')")
+
+    def bump_like_count(self, delta):
+        statement = update(Post).where(Post.id == self.id) \
+            .values(like_count=Post.like_count + delta).returning(Post.like_count) \
+            .execution_options(synchronize_session=False)
+        set_committed_value(self, 'like_count', db.session.execute(statement).scalar_one())
 
     def __repr__(self):
         return f"Post('{self.date_posted}')"
@@ -1,12 +1,16 @@
 from flask import render_template, url_for, flash, redirect, request, abort, Blueprint
 from flask_login import current_user, login_required
-from starchaos import db
+from sqlalchemy.orm import joinedload
+from starchaos import db, page_cache
 from starchaos.comments.models import Comment
 from starchaos.posts.forms import (
     PostForm
 )
 from starchaos.posts.models import Post
-from starchaos.users.utils import save_image
+from starchaos.posts.utils import load_feed
+from starchaos.timeline.utils import remove_post
+from starchaos.users.models import User
+from starchaos.images.utils import release_image, save_image
 
 posts = Blueprint('posts', __name__)
 
@@ -14,18 +18,24 @@ posts = Blueprint('posts', __name__)
 @posts.route('/post/<int:post_id>', methods=['POST', 'GET'])
 @login_required
 def post(post_id):
-    post = Post.query.get_or_404(post_id)
-    comments = Comment.query.filter_by(post_id=post.id).order_by(Comment.date_posted.desc())
+    post = Post.query.options(joinedload(Post.author)).filter_by(id=post_id).first_or_404()
 
     if request.method == 'POST':
         content = request.form.get('comment_content')
         if content:
             new_comment = Comment(content=content, user_id=current_user.id, post_id=post_id)
             db.session.add(new_comment)
+            post.comment_count = Post.comment_count + 1
             db.session.commit()
             flash('Your comment is added!', 'success')
         return redirect(url_for('posts.post', post_id=post_id))
 
+    not_modified = page_cache.validate(post.id, post.updated_at, post.author.updated_at,
+                                       current_user.id, current_user.updated_at)
+    if not_modified:
+        return not_modified
+    load_feed([post], current_user)
+    comments = Comment.page(post.id)
     return render_template('post.html', title='Post', post=post, comments=comments)
 
 
@@ -39,7 +49,8 @@ def update_post(post_id):
     if form.validate_on_submit():
         post.content = form.content.data
         if form.picture.data:
-            post_image = save_image(form.picture.data, (1500, 1500), 'post_images')
+            post_image = save_image(form.picture.data, 'post_images')
+            release_image('post_images', post.image)
             post.image = post_image
         db.session.commit()
         flash('Your post has been updated!', 'success')
@@ -55,7 +66,10 @@ def delete_post(post_id):
     post = Post.query.get_or_404(post_id)
     if post.author != current_user:
         abort(403)
+    release_image('post_images', post.image)
     db.session.delete(post)
+    current_user.post_count = User.post_count - 1
     db.session.commit()
+    remove_post(current_user, post_id)
     flash('Your post has been deleted!', 'success')
     return redirect(url_for('main.index'))
@@ -0,0 +1,21 @@
+from starchaos import db
+from starchaos.likes.models import Like
+
+
+def load_feed(posts, viewer):
+    """Precompute the viewer's liked-state for a page of posts.
+
+    Like and comment totals come from the counter columns on ``Post``, so a
+    page costs one extra query however many posts it holds; the templates
+    read ``liked_by_viewer`` instead of calling ``has_liked_post`` per post.
+    """
+    post_ids = [post.id for post in posts]
+    if not post_ids:
+        return posts
+
+    liked_ids = {post_id for (post_id,) in db.session.query(Like.post_id)
+                 .filter(Like.user_id == viewer.id, Like.post_id.in_(post_ids))}
+
+    for post in posts:
+        post.liked_by_viewer = post.id in liked_ids
+    return posts
@@ -0,0 +1,118 @@
+import time
+from threading import Lock
+
+
+class MemoryPresence:
+    """Online status for a single worker process.
+
+    A user is online while at least one of their Socket.IO connections has
+    been seen within ``ttl`` seconds; clients refresh it with a heartbeat.
+    """
+
+    def __init__(self, ttl=90, clock=time.time):
+        self.ttl = ttl
+        self.clock = clock
+        self._sessions = {}
+        self._lock = Lock()
+
+    def _live(self, user_id, now):
+        sessions = self._sessions.get(user_id, {})
+        for sid, seen in list(sessions.items()):
+            if seen <= now - self.ttl:
+                del sessions[sid]
+        if not sessions:
+            self._sessions.pop(user_id, None)
+        return len(sessions)
+
+    def connect(self, user_id, sid):
+        """Record a connection; return True if the user just came online."""
+        now = self.clock()
+        with self._lock:
+            was_online = self._live(user_id, now) > 0
+            self._sessions.setdefault(user_id, {})[sid] = now
+            return not was_online
+
+    def touch(self, user_id, sid):
+        with self._lock:
+            sessions = self._sessions.get(user_id)
+            if sessions is not None and sid in sessions:
+                sessions[sid] = self.clock()
+
+    def disconnect(self, user_id, sid):
+        """Forget a connection; return True if it was the user's last one."""
+        with self._lock:
+            self._sessions.get(user_id, {}).pop(sid, None)
+            return self._live(user_id, self.clock()) == 0
+
+    def online(self, user_ids):
+        now = self.clock()
+        with self._lock:
+            return {user_id for user_id in user_ids if self._live(user_id, now)}
+
+
+class RedisPresence:
+    """Online status shared by every worker through Redis.
+
+    Each user has a sorted set of connection ids scored by when they were last
+    seen, so connections left behind by a crashed worker age out after
+    ``ttl`` seconds instead of keeping the user online forever.
+    """
+
+    def __init__(self, client, ttl=90, prefix='presence:', clock=time.time):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.clock = clock
+
+    def _key(self, user_id):
+        return f'{self.prefix}{user_id}'
+
+    def connect(self, user_id, sid):
+        key, now = self._key(user_id), self.clock()
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(key, '-inf', now - self.ttl)
+        pipe.zcard(key)
+        pipe.zadd(key, {sid: now})
+        pipe.expire(key, self.ttl)
+        return pipe.execute()[1] == 0
+
+    def touch(self, user_id, sid):
+        key = self._key(user_id)
+        pipe = self.client.pipeline()
+        pipe.zadd(key, {sid: self.clock()}, xx=True)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def disconnect(self, user_id, sid):
+        key = self._key(user_id)
+        pipe = self.client.pipeline()
+        pipe.zrem(key, sid)
+        pipe.zremrangebyscore(key, '-inf', self.clock() - self.ttl)
+        pipe.zcard(key)
+        return pipe.execute()[2] == 0
+
+    def online(self, user_ids):
+        user_ids = list(user_ids)
+        pipe = self.client.pipeline()
+        since = self.clock() - self.ttl
+        for user_id in user_ids:
+            pipe.zcount(self._key(user_id), f'({since}', '+inf')
+        return {user_id for user_id, count in zip(user_ids, pipe.execute()) if count}
+
+
+def create_presence(url, ttl):
+    if url.startswith('memory://'):
+        return MemoryPresence(ttl=ttl)
+    import redis
+    return RedisPresence(redis.Redis.from_url(url), ttl=ttl)
+
+
+class Presence:
+    def __init__(self, app=None):
+        self.store = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.store = create_presence(app.config['PRESENCE_STORE_URL'], app.config['PRESENCE_TTL'])
+        app.extensions['presence'] = self
@@ -0,0 +1,126 @@
+import random
+import time
+from threading import Lock
+
+from flask import has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+STICKY_KEY = '_primary_until'
+
+# Seconds the replica is behind; 0 once it has replayed everything it received,
+# so an idle primary does not look like lag.
+LAG_QUERIES = {
+    'postgresql': 'SELECT CASE WHEN NOT pg_is_in_recovery() '
+                  'OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                  'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END',
+}
+
+
+def replica_binds(config):
+    """``SQLALCHEMY_BINDS`` entries for the URIs in ``SQLALCHEMY_REPLICA_URIS``."""
+    return {f'replica_{i}': uri for i, uri in enumerate(config['SQLALCHEMY_REPLICA_URIS'])}
+
+
+class RoutingSession(Session):
+    """``db.session``, sending plain SELECTs to the replica bind chosen for the request.
+
+    ``Replicas`` puts the bind key in ``info['replica']`` for GET requests.
+    Flushes and every other statement go to the primary, and the first of
+    them switches the rest of the request to the primary too, so a request
+    always reads its own writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get('replica')
+        if replica and bind is None and not self._flushing and getattr(clause, 'is_select', False) \
+                and getattr(clause, '_for_update_arg', None) is None:
+            return self._db.engines[replica]
+        if clause is not None or self._flushing:
+            self.info['replica'] = None
+            self.info['wrote'] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class Replicas:
+    """Route the reads of GET requests to read replicas that are caught up.
+
+    Replicas are the binds named in ``SQLALCHEMY_REPLICA_URIS``. Each GET or
+    HEAD request reads from one of them, picked at random among those less
+    than ``REPLICA_MAX_LAG`` seconds behind, or from the primary when none
+    is. Lag is measured at most every ``REPLICA_LAG_CHECK_INTERVAL`` seconds
+    per process (on Postgres from the replay position; other databases count
+    as caught up while they answer), and a replica whose connection drops is
+    left out until the next check. After a request commits a write, the
+    session cookie keeps that browser on the primary for
+    ``REPLICA_STICKY_SECONDS``, so the page it is redirected to shows the
+    write. Everything outside requests uses the primary.
+    """
+
+    def __init__(self, app=None):
+        self.keys = []
+        self._lag = {}
+        self._checked = {}
+        self._lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from starchaos import db
+
+        self.keys = list(replica_binds(app.config))
+        self.max_lag = app.config['REPLICA_MAX_LAG']
+        self.interval = app.config['REPLICA_LAG_CHECK_INTERVAL']
+        self.sticky = app.config['REPLICA_STICKY_SECONDS']
+        app.extensions['replicas'] = self
+        if not self.keys:
+            return
+        with app.app_context():
+            for key in self.keys:
+                event.listen(db.engines[key], 'handle_error', self._disconnected(key))
+        if not event.contains(db.session, 'after_commit', self._committed):
+            event.listen(db.session, 'after_commit', self._committed)
+        app.before_request(self._route)
+
+    def _disconnected(self, key):
+        def handle_error(context):
+            if context.is_disconnect:
+                self._lag[key] = float('inf')
+        return handle_error
+
+    def _measure(self, key):
+        from starchaos import db
+
+        engine = db.engines[key]
+        try:
+            with engine.connect() as connection:
+                lag = connection.execute(text(LAG_QUERIES.get(engine.dialect.name, 'SELECT 0'))).scalar()
+        except Exception:
+            lag = None
+        return float('inf') if lag is None else float(lag)
+
+    def lag(self, key):
+        """Seconds ``key`` is behind the primary, remeasured once the last check is old enough."""
+        now = time.monotonic()
+        if now - self._checked.get(key, float('-inf')) >= self.interval and self._lock.acquire(blocking=False):
+            try:
+                self._checked[key] = now
+                self._lag[key] = self._measure(key)
+            finally:
+                self._lock.release()
+        return self._lag.get(key, float('inf'))
+
+    def choose(self):
+        """The bind key of a replica fit to read from, or None for the primary."""
+        usable = [key for key in self.keys if self.lag(key) < self.max_lag]
+        return random.choice(usable) if usable else None
+
+    def _route(self):
+        from starchaos import db
+
+        if request.method in ('GET', 'HEAD') and session.get(STICKY_KEY, 0) < time.time():
+            db.session.info['replica'] = self.choose()
+
+    def _committed(self, db_session):
+        if db_session.info.pop('wrote', False) and has_request_context():
+            session[STICKY_KEY] = time.time() + self.sticky
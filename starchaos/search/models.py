@@ -0,0 +1,49 @@
+from sqlalchemy import DDL, event, func, literal_column
+from starchaos import db
+from starchaos.posts.models import Post
+from starchaos.users.models import User
+
+# Postgres: the indexes live on the tables themselves, so the database keeps
+# them current on every insert, update and delete.
+POST_VECTOR = func.to_tsvector(literal_column("'english'::regconfig"), Post.__table__.c.content)
+
+db.Index('ix_posts_content_tsv', POST_VECTOR, postgresql_using='gin').ddl_if(dialect='postgresql')
+db.Index('ix_users_full_name_trgm', User.__table__.c.full_name, postgresql_using='gin',
+         postgresql_ops={'full_name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql')
+
+event.listen(db.metadata, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
+# SQLite: FTS5 tables kept in step by triggers, which also catch bulk inserts
+# and cascaded deletes that never pass through the ORM.
+SQLITE_FTS = {
+    'posts_fts': ('posts', 'content', "tokenize='porter unicode61'"),
+    'users_fts': ('users', 'full_name', "tokenize='trigram'"),
+}
+
+
+def _sqlite_ddl(name, table, column, options):
+    return [
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5({column}, {options})',
+        f'CREATE TRIGGER IF NOT EXISTS {name}_insert AFTER INSERT ON {table} BEGIN '
+        f'INSERT INTO {name}(rowid, {column}) VALUES (new.id, new.{column}); END',
+        f'CREATE TRIGGER IF NOT EXISTS {name}_update AFTER UPDATE OF {column} ON {table} BEGIN '
+        f'UPDATE {name} SET {column} = new.{column} WHERE rowid = new.id; END',
+        f'CREATE TRIGGER IF NOT EXISTS {name}_delete AFTER DELETE ON {table} BEGIN '
+        f'DELETE FROM {name} WHERE rowid = old.id; END',
+    ]
+
+
+for _name, (_table, _column, _options) in SQLITE_FTS.items():
+    for _statement in _sqlite_ddl(_name, _table, _column, _options):
+        event.listen(db.metadata, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+    event.listen(db.metadata, 'before_drop', DDL(f'DROP TABLE IF EXISTS {_name}').execute_if(dialect='sqlite'))
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Keep autogenerate away from the search schema, which differs per dialect and has its own migration."""
+    if type_ == 'table':
+        return not name.startswith(tuple(SQLITE_FTS))
+    if type_ == 'index':
+        return name not in ('ix_posts_content_tsv', 'ix_users_full_name_trgm')
+    return True
@@ -0,0 +1,26 @@
+from flask import Blueprint, jsonify, render_template, request
+from flask_login import login_required
+from starchaos.search.utils import search_people, search_posts, typeahead
+
+search = Blueprint('search', __name__)
+
+
+@search.route('/search')
+@login_required
+def results():
+    q = request.args.get('q', '').strip()[:200]
+    kind = 'people' if request.args.get('kind') == 'people' else 'posts'
+    before = request.args.get('before')
+    page = None
+    if q:
+        page = search_people(q, before=before) if kind == 'people' else search_posts(q, before=before)
+    return render_template('search.html', title='Search', q=q, kind=kind, page=page)
+
+
+@search.route('/api/search/typeahead')
+@login_required
+def typeahead_api():
+    q = request.args.get('q', '').strip()[:100]
+    if len(q) < 2:
+        return jsonify(users=[])
+    return jsonify(users=typeahead(q))
@@ -0,0 +1,146 @@
+import base64
+import re
+
+from flask import current_app, url_for
+from sqlalchemy import case, func, literal_column, or_, select, table, column, text, tuple_
+from sqlalchemy.orm import joinedload
+from starchaos import db, metrics
+from starchaos.cache import TTLCache
+from starchaos.pagination import KeysetPage
+from starchaos.posts.models import Post
+from starchaos.search.models import POST_VECTOR, SQLITE_FTS
+from starchaos.users.models import User
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+typeahead_cache = TTLCache(maxsize=10000)
+metrics.watch_cache('typeahead', typeahead_cache)
+
+_posts_fts = table('posts_fts', column('rowid'))
+_users_fts = table('users_fts', column('rowid'))
+
+
+def _encode(rank, item_id):
+    return base64.urlsafe_b64encode(f'{rank!r}|{item_id}'.encode()).decode().rstrip('=')
+
+
+def _decode(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        rank, item_id = raw.split('|')
+        return float(rank), int(item_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _fts_query(words, prefix=False):
+    """An FTS5 query that ANDs the words as quoted strings, so user input is never syntax."""
+    terms = [f'"{word}"' for word in words]
+    if prefix and terms:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _like_prefix(q):
+    return q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def _post_match(q):
+    """The filter and rank (higher is better) for posts matching ``q``, or None."""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        query = func.websearch_to_tsquery(literal_column("'english'::regconfig"), q)
+        return POST_VECTOR.op('@@')(query), func.ts_rank_cd(POST_VECTOR, query), None
+    words = WORD.findall(q)
+    if not words:
+        return None
+    match = text('posts_fts MATCH :posts_query').bindparams(posts_query=_fts_query(words))
+    return match, -func.bm25(literal_column('posts_fts')), (_posts_fts, _posts_fts.c.rowid == Post.id)
+
+
+def _people_match(q):
+    """The filter and rank for users whose name matches ``q``, prefixes ranked first."""
+    prefix = User.full_name.ilike(_like_prefix(q), escape='\\')
+    boost = case((prefix, 1.0), else_=0.0)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return or_(User.full_name.op('%')(q), prefix), func.similarity(User.full_name, q) + boost, None
+    if len(q) < 3:
+        # Trigram MATCH needs three characters; short prefixes scan, which is fine in development.
+        return prefix, boost, None
+    match = text('users_fts MATCH :users_query').bindparams(users_query=_fts_query([q.replace('"', '')]))
+    return match, boost - func.bm25(literal_column('users_fts')), (_users_fts, _users_fts.c.rowid == User.id)
+
+
+def _ranked(model, match, before, per_page):
+    condition, rank, join = match
+    rank = rank.label('rank')
+    statement = select(model, rank)
+    if join is not None:
+        statement = statement.join(*join)
+    statement = statement.where(condition)
+    position = _decode(before) if before else None
+    if position:
+        statement = statement.where(tuple_(rank.element, model.id) < tuple_(*position))
+    return statement.order_by(rank.desc(), model.id.desc()).limit(per_page + 1)
+
+
+def posts_statement(q, before=None, per_page=10):
+    """The ``(Post, rank)`` query behind :func:`search_posts`, or None if ``q`` has no words."""
+    match = _post_match(q)
+    if match is None:
+        return None
+    return _ranked(Post, match, before, per_page).options(joinedload(Post.author))
+
+
+def people_statement(q, before=None, per_page=10):
+    """The ``(User, rank)`` query behind :func:`search_people`."""
+    return _ranked(User, _people_match(q), before, per_page)
+
+
+def _page(statement, per_page):
+    if statement is None:
+        return KeysetPage([], None)
+    rows = db.session.execute(statement).all()
+    next_cursor = _encode(rows[per_page - 1].rank, rows[per_page - 1][0].id) if len(rows) > per_page else None
+    return KeysetPage([row[0] for row in rows[:per_page]], next_cursor)
+
+
+def search_posts(q, before=None, per_page=10):
+    """Posts matching ``q`` by relevance, keyset-paginated on ``(rank, id)``."""
+    return _page(posts_statement(q, before, per_page), per_page)
+
+
+def search_people(q, before=None, per_page=10):
+    """Users whose name matches ``q``, closest and prefix matches first."""
+    return _page(people_statement(q, before, per_page), per_page)
+
+
+def _avatar(user):
+    upload = user.profile_upload
+    if upload is None:
+        return url_for('static', filename=f'images/profile_images/{user.profile_image}')
+    return upload.url() if upload.ready else upload.original_url()
+
+
+def typeahead(q, limit=6):
+    """The top people for a partial name, as JSON-ready dicts, cached per query for a short while."""
+    key = q.lower()
+    results = typeahead_cache.get(key)
+    if results is None:
+        users = search_people(q, per_page=limit).items
+        results = [{'id': user.id, 'full_name': user.full_name, 'image': _avatar(user),
+                    'url': url_for('users.profile', full_name=user.full_name)} for user in users]
+        typeahead_cache.set(key, results, ttl=current_app.config['SEARCH_TYPEAHEAD_TTL'])
+    return results
+
+
+def reindex():
+    """Rebuild the SQLite FTS tables from scratch; Postgres indexes need no help."""
+    if db.session.get_bind().dialect.name != 'sqlite':
+        return 0
+    count = 0
+    for name, (source, column_name, _) in SQLITE_FTS.items():
+        db.session.execute(text(f'DELETE FROM {name}'))
+        count += db.session.execute(text(
+            f'INSERT INTO {name}(rowid, {column_name}) SELECT id, {column_name} FROM {source}')).rowcount
+    db.session.commit()
+    return count
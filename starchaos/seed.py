@@ -0,0 +1,189 @@
+import csv
+import io
+import random
+from bisect import bisect
+from datetime import datetime, timedelta
+from itertools import accumulate, count
+
+from sqlalchemy import func, select, text
+from starchaos import db, passwords
+from starchaos.comments.models import Comment
+from starchaos.friends.models import friendships
+from starchaos.likes.models import Like
+from starchaos.posts.models import Post
+from starchaos.users.models import User, Message, Conversation
+
+FIRST = ['Ada', 'Alan', 'Grace', 'Linus', 'Barbara', 'Ken', 'Margaret', 'Dennis', 'Radia', 'Edsger',
+         'Frances', 'John', 'Katherine', 'Niklaus', 'Sophie', 'Tim', 'Whitfield', 'Hedy', 'Donald', 'Anita']
+LAST = ['Lovelace', 'Turing', 'Hopper', 'Torvalds', 'Liskov', 'Thompson', 'Hamilton', 'Ritchie', 'Perlman',
+        'Dijkstra', 'Allen', 'McCarthy', 'Johnson', 'Wirth', 'Wilson', 'Lee', 'Diffie', 'Lamarr', 'Knuth', 'Borg']
+WORDS = ('star chaos galaxy orbit comet nebula planet rocket launch night sky moon sun light dark matter '
+         'photo today friends coffee music travel city ocean mountain river book movie game code python '
+         'weekend holiday birthday dinner morning happy tired great amazing beautiful new old first last '
+         'the a and of to in is it for on with at this that my your we love see go get make').split()
+
+PASSWORD = 'password'
+CHUNK = 50000
+
+
+def _heavy_tail(rng, mean):
+    """A Pareto(1.5) draw shifted to start at 0 and scaled to ``mean`` on average."""
+    return int((rng.paretovariate(1.5) - 1) * mean / 2)
+
+
+def _text(rng, low, high):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high)))
+
+
+def _next_id(model):
+    return (db.session.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+class _Writer:
+    """Buffers rows for one table and writes them with ``COPY`` on Postgres, executemany elsewhere.
+
+    A writer flushes ``parent`` first, so foreign keys never point at rows
+    still sitting in another buffer.
+    """
+
+    def __init__(self, table, columns, parent=None):
+        self.table = table
+        self.columns = columns
+        self.parent = parent
+        self.rows = []
+        self.count = 0
+
+    def add(self, *row):
+        self.rows.append(row)
+        if len(self.rows) >= CHUNK:
+            self.flush()
+
+    def flush(self):
+        if self.parent is not None:
+            self.parent.flush()
+        if not self.rows:
+            return
+        connection = db.session.connection()
+        if connection.dialect.name == 'postgresql':
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(self.rows)
+            buffer.seek(0)
+            with connection.connection.cursor() as cursor:
+                cursor.copy_expert(f'COPY {self.table.name} ({", ".join(self.columns)}) '
+                                   f'FROM STDIN WITH (FORMAT csv)', buffer)
+        else:
+            connection.execute(self.table.insert(), [dict(zip(self.columns, row)) for row in self.rows])
+        self.count += len(self.rows)
+        self.rows = []
+
+
+def seed(users=1000, friends_per_user=20, posts=20000, likes_per_post=5, comments_per_post=2,
+         threads=2000, messages_per_thread=20, seed=42, echo=None):
+    """Bulk-insert a synthetic social network and return the row count per table.
+
+    Activity follows a power law: a few users have most of the friends, posts
+    and conversations, and a few posts get most of the likes and comments.
+    Posts are dated in id order, as the app writes them. Rows are appended after any existing ones, the denormalized counters are
+    filled in as they are generated, and every user's password is
+    ``PASSWORD``. The same ``seed`` always produces the same data.
+    """
+    echo = echo or (lambda message: None)
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    first_user = _next_id(User)
+    user_ids = range(first_user, first_user + users)
+    weights = list(accumulate(rng.paretovariate(1.2) for _ in user_ids))
+
+    def someone():
+        return user_ids[bisect(weights, rng.random() * weights[-1])]
+
+    adjacency = {user_id: set() for user_id in user_ids}
+    for user_id in user_ids:
+        for _ in range(min(_heavy_tail(rng, friends_per_user / 2), users - 1)):
+            friend_id = someone()
+            if friend_id != user_id:
+                adjacency[user_id].add(friend_id)
+                adjacency[friend_id].add(user_id)
+
+    authors = [someone() for _ in range(posts)]
+    post_counts = dict.fromkeys(user_ids, 0)
+    for author_id in authors:
+        post_counts[author_id] += 1
+
+    hashed = passwords.hash(PASSWORD)
+    writer = _Writer(User.__table__, ['id', 'full_name', 'email', 'password', 'profile_image', 'bg_image',
+                                      'theme', 'post_count', 'friend_count'])
+    for user_id in user_ids:
+        writer.add(user_id, f'{rng.choice(FIRST)} {rng.choice(LAST)} {user_id}', f'seed{user_id}@example.com',
+                   hashed, 'default_profile.png', 'default_bg_profile.jpg', 'light',
+                   post_counts[user_id], len(adjacency[user_id]))
+    writer.flush()
+    counts = {'users': writer.count}
+    echo(f'users: {writer.count}')
+
+    writer = _Writer(friendships, ['user_a_id', 'user_b_id'])
+    for user_id, friend_ids in adjacency.items():
+        for friend_id in friend_ids:
+            if user_id < friend_id:
+                writer.add(user_id, friend_id)
+    writer.flush()
+    counts['friendships'] = writer.count
+    echo(f'friendships: {writer.count}')
+    del adjacency
+
+    first_post = _next_id(Post)
+    post_writer = _Writer(Post.__table__, ['id', 'content', 'date_posted', 'user_id', 'like_count',
+                                           'comment_count'])
+    like_writer = _Writer(Like.__table__, ['user_id', 'post_id'], parent=post_writer)
+    comment_writer = _Writer(Comment.__table__, ['content', 'date_posted', 'user_id', 'post_id'],
+                             parent=post_writer)
+    ages = sorted((rng.randint(0, 365 * 24 * 3600) for _ in authors), reverse=True)
+    for post_id, author_id, age in zip(count(first_post), authors, ages):
+        date_posted = now - timedelta(seconds=age)
+        likers = rng.sample(user_ids, min(_heavy_tail(rng, likes_per_post), users))
+        comments = _heavy_tail(rng, comments_per_post)
+        post_writer.add(post_id, _text(rng, 3, 40), date_posted, author_id, len(likers), comments)
+        for user_id in likers:
+            like_writer.add(user_id, post_id)
+        for _ in range(comments):
+            comment_writer.add(_text(rng, 1, 15), date_posted + timedelta(seconds=rng.randint(1, 7 * 24 * 3600)),
+                               someone(), post_id)
+    for name, writer in (('posts', post_writer), ('likes', like_writer), ('comments', comment_writer)):
+        writer.flush()
+        counts[name] = writer.count
+        echo(f'{name}: {writer.count}')
+    del authors
+
+    first_message = _next_id(Message)
+    message_rows = _Writer(Message.__table__, ['id', 'sender_id', 'receiver_id', 'content', 'date_posted'])
+    conversation_writer = _Writer(Conversation.__table__, ['user_a_id', 'user_b_id', 'last_message_id',
+                                                           'last_date', 'preview', 'unread_a', 'unread_b'])
+    pairs = set(map(tuple, db.session.execute(select(Conversation.user_a_id, Conversation.user_b_id))))
+    message_id = first_message
+    for _ in range(threads * 10):
+        if conversation_writer.count + len(conversation_writer.rows) >= threads:
+            break
+        pair = tuple(sorted((someone(), someone())))
+        if pair[0] == pair[1] or pair in pairs:
+            continue
+        pairs.add(pair)
+        date_posted = now - timedelta(seconds=rng.randint(0, 90 * 24 * 3600))
+        for _ in range(max(_heavy_tail(rng, messages_per_thread), 1)):
+            sender_id, receiver_id = pair if rng.random() < 0.5 else pair[::-1]
+            date_posted += timedelta(seconds=rng.randint(1, 3600))
+            content = _text(rng, 1, 20)
+            message_rows.add(message_id, sender_id, receiver_id, content, date_posted)
+            message_id += 1
+        conversation_writer.add(*pair, message_id - 1, date_posted, content[:Conversation.PREVIEW_LENGTH], 0, 0)
+    for name, writer in (('messages', message_rows), ('conversations', conversation_writer)):
+        writer.flush()
+        counts[name] = writer.count
+        echo(f'{name}: {writer.count}')
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # Ids were written explicitly, so move the sequences past them.
+        for model in (User, Post, Like, Comment, Message, Conversation):
+            db.session.execute(text(f"SELECT setval(pg_get_serial_sequence('{model.__tablename__}', 'id'), "
+                                    f"(SELECT max(id) FROM {model.__tablename__}))"))
+    db.session.commit()
+    return counts
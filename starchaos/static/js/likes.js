@@ -0,0 +1,35 @@
+document.addEventListener('click', function (event) {
+    var link = event.target.closest('.like-toggle');
+    if (!link) {
+        return;
+    }
+    event.preventDefault();
+    if (link.dataset.pending) {
+        return;
+    }
+    link.dataset.pending = 'true';
+    fetch(link.dataset.api, {
+        method: 'POST',
+        credentials: 'same-origin',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({liked: link.dataset.liked !== 'true'})
+    }).then(function (response) {
+        if (!response.ok) {
+            throw new Error(response.status);
+        }
+        return response.json();
+    }).then(function (data) {
+        var area = link.parentElement;
+        var image = link.querySelector('img');
+        link.dataset.liked = data.liked ? 'true' : 'false';
+        link.href = link.href.replace(/\/(un)?like$/, data.liked ? '/unlike' : '/like');
+        image.classList.toggle('like-pic', data.liked);
+        image.classList.toggle('grayscale-image', !data.liked);
+        area.querySelector('.like-count').textContent = data.like_count;
+        area.querySelector('.like-label').textContent = data.like_count < 2 ? 'Like' : 'Likes';
+    }).catch(function () {
+        window.location = link.href;
+    }).finally(function () {
+        delete link.dataset.pending;
+    });
+});
@@ -0,0 +1,118 @@
+import math
+import time
+from functools import wraps
+from threading import Lock
+
+from flask import request
+from werkzeug.exceptions import TooManyRequests
+
+
+class MemoryBuckets:
+    """Token buckets for a single worker process.
+
+    A bucket holds up to ``capacity`` tokens and refills at ``rate`` tokens a
+    second; every hit takes one. Once more than ``max_keys`` buckets exist,
+    the ones that have refilled completely are dropped, so a flood of
+    distinct keys cannot grow the table without bound.
+    """
+
+    def __init__(self, max_keys=100000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = {}
+        self._lock = Lock()
+
+    def take(self, key, capacity, rate):
+        """Take a token; return 0 if there was one, else the seconds until there is."""
+        now = self.clock()
+        with self._lock:
+            tokens, stamp, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - stamp) * rate)
+            wait = (1 - tokens) / rate if tokens < 1 else 0
+            if not wait:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            if len(self._buckets) > self.max_keys:
+                self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] > now}
+            return wait
+
+
+class RedisBuckets:
+    """Token buckets shared by every worker through Redis.
+
+    Each bucket is a hash updated by one Lua script, so concurrent hits from
+    different workers cannot both spend the last token. Keys expire once the
+    bucket would be full again.
+    """
+
+    SCRIPT = """
+    local capacity, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+    local tokens = math.min(capacity, (tonumber(state[1]) or capacity) + (now - (tonumber(state[2]) or now)) * rate)
+    local wait = 0
+    if tokens < 1 then wait = (1 - tokens) / rate else tokens = tokens - 1 end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'stamp', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, client, prefix='throttle:', clock=time.time):
+        self.client = client
+        self.prefix = prefix
+        self.clock = clock
+        self._take = client.register_script(self.SCRIPT)
+
+    def take(self, key, capacity, rate):
+        return float(self._take(keys=[f'{self.prefix}{key}'], args=[capacity, rate, self.clock()]))
+
+
+def create_buckets(url):
+    if url.startswith('memory://'):
+        return MemoryBuckets()
+    import redis
+    return RedisBuckets(redis.Redis.from_url(url))
+
+
+class Throttle:
+    """Per-address and per-account rate limits from ``THROTTLE_LIMITS``.
+
+    Limits are ``(burst, per_minute)`` pairs keyed by scope and by what is
+    counted, e.g. ``{'login': {'ip': (20, 10), 'account': (5, 5)}}``.
+    """
+
+    def __init__(self, app=None):
+        self.store = None
+        self.limits = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.store = create_buckets(app.config['THROTTLE_STORE_URL'])
+        self.limits = app.config['THROTTLE_LIMITS']
+        app.extensions['throttle'] = self
+
+    def hit(self, scope, **keys):
+        """Take a token from each of ``scope``'s buckets; return the longest wait, 0 if none."""
+        wait = 0
+        for name, value in keys.items():
+            limit = self.limits.get(scope, {}).get(name)
+            if limit is None or not value:
+                continue
+            burst, per_minute = limit
+            wait = max(wait, self.store.take(f'{scope}:{name}:{value}', burst, per_minute / 60))
+        return wait
+
+    def limit(self, scope, account_field=None):
+        """Reject POSTs to the view with 429 once the client address or the
+        submitted ``account_field`` has used up its tokens for ``scope``."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method == 'POST':
+                    account = request.form.get(account_field, '').strip().lower() if account_field else None
+                    wait = self.hit(scope, ip=request.remote_addr, account=account)
+                    if wait:
+                        raise TooManyRequests(retry_after=math.ceil(wait))
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
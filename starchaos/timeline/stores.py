@@ -0,0 +1,168 @@
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from threading import Lock
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class MemoryStore:
+    """In-process LRU of per-user timelines, for development and single-worker deployments.
+
+    Each timeline is an ascending list of ``(date_posted, post_id)`` entries,
+    the order ``paginate_keyset`` pages in, trimmed to ``length``; at most
+    ``max_users`` timelines are kept and the least recently used one is dropped.
+    """
+
+    def __init__(self, length=800, max_users=10000):
+        self.length = length
+        self.max_users = max_users
+        self._timelines = OrderedDict()
+        self._lock = Lock()
+
+    def exists(self, user_id):
+        with self._lock:
+            return user_id in self._timelines
+
+    def replace(self, user_id, entries):
+        with self._lock:
+            self._timelines[user_id] = sorted(entries)[-self.length:]
+            self._timelines.move_to_end(user_id)
+            while len(self._timelines) > self.max_users:
+                self._timelines.popitem(last=False)
+
+    def push(self, user_ids, date_posted, post_id):
+        entry = (date_posted, post_id)
+        with self._lock:
+            for user_id in user_ids:
+                timeline = self._timelines.get(user_id)
+                if timeline is None or entry in timeline:
+                    continue
+                insort(timeline, entry)
+                del timeline[:-self.length]
+
+    def remove(self, user_ids, post_ids):
+        post_ids = set(post_ids)
+        with self._lock:
+            for user_id in user_ids:
+                timeline = self._timelines.get(user_id)
+                if timeline is not None:
+                    timeline[:] = [entry for entry in timeline if entry[1] not in post_ids]
+
+    def range(self, user_id, before=None, limit=10):
+        """Ids of up to ``limit`` posts older than the ``(date_posted, post_id)`` position ``before``, newest first."""
+        with self._lock:
+            timeline = self._timelines.get(user_id, [])
+            if user_id in self._timelines:
+                self._timelines.move_to_end(user_id)
+            end = bisect_left(timeline, tuple(before)) if before is not None else len(timeline)
+            return [post_id for _, post_id in timeline[max(end - limit, 0):end][::-1]]
+
+    def discard(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._timelines.pop(user_id, None)
+
+
+def _score(date_posted):
+    """``date_posted`` in whole microseconds, exact in a Redis score for the next two centuries."""
+    return (date_posted - EPOCH) // timedelta(microseconds=1)
+
+
+def _member(post_id):
+    """Zero-padded, so posts sharing a score sort by id as Redis compares members bytewise."""
+    return f'{post_id:012d}'
+
+
+class RedisStore:
+    """Timelines as Redis sorted sets scored by ``date_posted``, ties broken by post id.
+
+    Works with any client exposing the redis-py API, so tests and local runs can
+    pass a stand-in such as fakeredis. A sentinel member scored 0 marks a
+    timeline as materialized even when it has no posts yet.
+    """
+
+    SENTINEL = 0
+
+    def __init__(self, client, length=800, ttl=7 * 24 * 3600, prefix='timeline:v2:'):
+        self.client = client
+        self.length = length
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, user_id):
+        return f'{self.prefix}{user_id}'
+
+    def exists(self, user_id):
+        return bool(self.client.exists(self._key(user_id)))
+
+    def replace(self, user_id, entries):
+        key = self._key(user_id)
+        members = {self.SENTINEL: 0}
+        members.update({_member(post_id): _score(date_posted)
+                        for date_posted, post_id in sorted(entries)[-self.length:]})
+        pipe = self.client.pipeline()
+        pipe.delete(key)
+        pipe.zadd(key, members)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def push(self, user_ids, date_posted, post_id):
+        keys = [self._key(user_id) for user_id in user_ids]
+        pipe = self.client.pipeline()
+        for key in keys:
+            pipe.exists(key)
+        present = pipe.execute()
+        pipe = self.client.pipeline()
+        for key, exists in zip(keys, present):
+            if exists:
+                pipe.zadd(key, {_member(post_id): _score(date_posted)})
+                pipe.zremrangebyrank(key, 1, -(self.length + 1))
+        pipe.execute()
+
+    def remove(self, user_ids, post_ids):
+        if not post_ids:
+            return
+        pipe = self.client.pipeline()
+        for user_id in user_ids:
+            pipe.zrem(self._key(user_id), *map(_member, post_ids))
+        pipe.execute()
+
+    def range(self, user_id, before=None, limit=10):
+        """Ids of up to ``limit`` posts older than the ``(date_posted, post_id)`` position ``before``, newest first."""
+        key = self._key(user_id)
+        if before is None:
+            members = self.client.zrevrangebyscore(key, '+inf', 1, start=0, num=limit)
+            return [int(member) for member in members]
+        score, post_id = _score(before[0]), before[1]
+        pipe = self.client.pipeline()
+        pipe.zrevrangebyscore(key, score, score)
+        pipe.zrevrangebyscore(key, f'({score}', 1, start=0, num=limit)
+        same, older = pipe.execute()
+        same = [int(member) for member in same if int(member) < post_id]
+        return (same + [int(member) for member in older])[:limit]
+
+    def discard(self, user_ids):
+        keys = [self._key(user_id) for user_id in user_ids]
+        if keys:
+            self.client.delete(*keys)
+
+
+def create_store(url, length, max_users):
+    if url.startswith('memory://'):
+        return MemoryStore(length=length, max_users=max_users)
+    import redis
+    return RedisStore(redis.Redis.from_url(url), length=length)
+
+
+class Timeline:
+    def __init__(self, app=None):
+        self.store = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.store = create_store(app.config['TIMELINE_STORE_URL'],
+                                  app.config['TIMELINE_LENGTH'],
+                                  app.config['TIMELINE_CACHE_USERS'])
+        app.extensions['timeline'] = self
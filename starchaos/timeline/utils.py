@@ -0,0 +1,71 @@
+from flask import current_app
+from sqlalchemy import or_, select
+from sqlalchemy.orm import joinedload
+from starchaos import db, timeline
+from starchaos.friends.models import friend_ids_select
+from starchaos.friends.utils import friend_ids
+from starchaos.pagination import decode_cursor, paginate_keyset
+from starchaos.posts.models import Post
+from starchaos.users.models import User
+
+
+def _is_celebrity(user):
+    return user.friend_count >= current_app.config['TIMELINE_CELEBRITY_THRESHOLD']
+
+
+def _audience(user):
+    """Ids of the timelines a post by ``user`` is pushed to."""
+    if _is_celebrity(user):
+        return [user.id]
+    return [user.id, *friend_ids(user.id)]
+
+
+def _recent_posts(author_ids, limit):
+    """``(date_posted, post_id)`` of the authors' newest posts, the entries timelines hold."""
+    rows = db.session.query(Post.date_posted, Post.id).filter(Post.user_id.in_(author_ids)) \
+        .order_by(Post.date_posted.desc(), Post.id.desc()) \
+        .limit(limit)
+    return [tuple(row) for row in rows]
+
+
+def fan_out_post(author, post):
+    timeline.store.push(_audience(author), post.date_posted, post.id)
+
+
+def remove_post(author, post_id):
+    timeline.store.remove(_audience(author), [post_id])
+
+
+def reset_timelines(*users):
+    timeline.store.discard([user.id for user in users])
+
+
+def prune_friendship(user, other):
+    length = current_app.config['TIMELINE_LENGTH']
+    timeline.store.remove([user.id], [post_id for _, post_id in _recent_posts([other.id], length)])
+    timeline.store.remove([other.id], [post_id for _, post_id in _recent_posts([user.id], length)])
+
+
+def home_feed(user, before=None, per_page=5):
+    """Return a keyset page of the user's own and friends' posts.
+
+    The page is one read of the precomputed id list plus one query that
+    hydrates those ids together with recent posts by celebrity friends, whose
+    posts are pulled on read instead of being fanned out. Once a reader pages
+    past the end of the bounded list the posts table is read directly.
+    """
+    store = timeline.store
+    if not store.exists(user.id):
+        author_ids = [user.id, *friend_ids(user.id)]
+        store.replace(user.id, _recent_posts(author_ids, current_app.config['TIMELINE_LENGTH']))
+
+    position = decode_cursor(before) if before else None
+    post_ids = store.range(user.id, position, per_page + 1)
+    query = Post.query.options(joinedload(Post.author))
+    if len(post_ids) > per_page:
+        celebrities = select(User.id).where(User.id.in_(friend_ids_select(user.id)),
+                                            User.friend_count >= current_app.config['TIMELINE_CELEBRITY_THRESHOLD'])
+        query = query.filter(or_(Post.id.in_(post_ids), Post.user_id.in_(celebrities)))
+    else:
+        query = query.filter(or_(Post.user_id == user.id, Post.user_id.in_(friend_ids_select(user.id))))
+    return paginate_keyset(query, Post, before=before, per_page=per_page)
@@ -0,0 +1,69 @@
+from threading import Event, Lock, Thread
+
+from sqlalchemy import event
+
+
+class AccountDeleter:
+    """Background deletion of accounts marked with ``request_account_deletion``.
+
+    A thread, started by the app's first request, deletes marked accounts in
+    batches of ``ACCOUNT_DELETION_BATCH_SIZE`` rows. It runs once on start,
+    finishing deletions left unfinished by a stopped worker, then wakes when
+    a deletion request commits and every ``ACCOUNT_DELETION_POLL_INTERVAL``
+    seconds. CLI commands never start it. Set ``ACCOUNT_DELETION_WORKER`` off
+    to delete only through ``flask delete-accounts``.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._thread = None
+        self._wake = Event()
+        self._lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from starchaos import db
+
+        self.app = app
+        self.enabled = app.config['ACCOUNT_DELETION_WORKER']
+        self.batch_size = app.config['ACCOUNT_DELETION_BATCH_SIZE']
+        self.interval = app.config['ACCOUNT_DELETION_POLL_INTERVAL']
+        if not event.contains(db.session, 'after_commit', self._committed):
+            event.listen(db.session, 'after_commit', self._committed)
+        app.extensions['account_deleter'] = self
+        if self.enabled:
+            app.before_request(self._start)
+
+    def _start(self):
+        if self._thread is None:
+            self.notify()
+
+    def _committed(self, session):
+        if session.info.pop('accounts_deleted', False):
+            self.notify()
+
+    def notify(self):
+        if not self.enabled:
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = Thread(target=self._run, daemon=True)
+                    self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        from starchaos import db
+        from starchaos.users.deletion import delete_account, pending_deletions
+
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            with self.app.app_context():
+                try:
+                    for user_id in pending_deletions():
+                        delete_account(user_id, self.batch_size)
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception('Deleting accounts failed')
@@ -0,0 +1,155 @@
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import bindparam, delete, select, tuple_, update
+from starchaos import db, timeline
+from starchaos.comments.models import Comment
+from starchaos.friends.models import friendships
+from starchaos.friends.utils import forget_friends
+from starchaos.images.models import Upload
+from starchaos.likes.models import Like
+from starchaos.posts.models import Post
+from starchaos.users.models import User, Message, Conversation, user_cache
+
+
+def request_account_deletion(user, background=True):
+    """Lock the account now; unless ``background`` is off, its data is deleted in the background after the commit."""
+    user.deleted_at = datetime.utcnow()
+    if background:
+        db.session.info['accounts_deleted'] = True
+
+
+def _delete(table, key, condition, batch_size, *returning):
+    """Delete up to ``batch_size`` matching rows; return the ``returning`` columns of those actually removed."""
+    if isinstance(key, tuple):
+        chosen = select(*key).where(condition).limit(batch_size)
+        statement = delete(table).where(tuple_(*key).in_(chosen))
+    else:
+        chosen = select(key).where(condition).limit(batch_size)
+        statement = delete(table).where(key.in_(chosen.scalar_subquery()))
+    return db.session.execute(statement.returning(*returning)).all()
+
+
+def _decrement(column, counts):
+    table = column.table
+    if counts:
+        db.session.execute(
+            update(table).where(table.c.id == bindparam('row_id'))
+            .values({column.key: column - bindparam('amount')}),
+            [{'row_id': row_id, 'amount': amount} for row_id, amount in counts.items()])
+
+
+def _release_images(folder, names):
+    counts = Counter(name for name in names if name)
+    if counts:
+        table = Upload.__table__
+        db.session.execute(
+            update(table).where(table.c.folder == folder, table.c.name == bindparam('image'))
+            .values(ref_count=table.c.ref_count - bindparam('amount')),
+            [{'image': name, 'amount': amount} for name, amount in counts.items()])
+
+
+def _steps(user_id, batch_size):
+    """Each step removes one batch of the user's rows and returns how many it removed."""
+    likes = Like.__table__
+    comments = Comment.__table__
+    posts = Post.__table__
+    messages = Message.__table__
+    conversations = Conversation.__table__
+
+    def likes_given():
+        rows = _delete(likes, likes.c.id, likes.c.user_id == user_id, batch_size, likes.c.post_id)
+        _decrement(posts.c.like_count, Counter(post_id for (post_id,) in rows))
+        return len(rows)
+
+    def comments_written():
+        rows = _delete(comments, comments.c.id, comments.c.user_id == user_id, batch_size, comments.c.post_id)
+        _decrement(posts.c.comment_count, Counter(post_id for (post_id,) in rows))
+        return len(rows)
+
+    def own_posts():
+        # The posts' likes and comments go with them through ON DELETE CASCADE.
+        rows = _delete(posts, posts.c.id, posts.c.user_id == user_id, batch_size, posts.c.image)
+        _release_images('post_images', [image for (image,) in rows])
+        return len(rows)
+
+    def chat():
+        rows = _delete(messages, messages.c.id,
+                       (messages.c.sender_id == user_id) | (messages.c.receiver_id == user_id),
+                       batch_size, messages.c.id)
+        rows += _delete(conversations, conversations.c.id,
+                        (conversations.c.user_a_id == user_id) | (conversations.c.user_b_id == user_id),
+                        batch_size, conversations.c.id)
+        return len(rows)
+
+    def friends():
+        key = (friendships.c.user_a_id, friendships.c.user_b_id)
+        rows = _delete(friendships, key, friendships.c.user_a_id == user_id, batch_size, friendships.c.user_b_id)
+        rows += _delete(friendships, key, friendships.c.user_b_id == user_id, batch_size, friendships.c.user_a_id)
+        friend_ids = [friend_id for (friend_id,) in rows]
+        _decrement(User.__table__.c.friend_count, Counter(friend_ids))
+        user_cache.delete(*friend_ids)
+        forget_friends(user_id, *friend_ids)
+        timeline.store.discard(friend_ids)
+        return len(rows)
+
+    return [likes_given, comments_written, own_posts, chat, friends]
+
+
+def _claim(user_id):
+    """Lock ``user_id``'s row for the rest of the transaction; return False if it is gone or already held.
+
+    Every worker's deleter and ``flask delete-user`` may pick the same account,
+    and two batches running at once would each correct the counters for rows
+    the other removed. Postgres skips a row another deleter has locked rather
+    than waiting for it. SQLite has no row locks, so a no-op write takes the
+    database's write lock instead and deleters take turns batch by batch.
+    """
+    users = User.__table__
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return db.session.execute(update(users).where(users.c.id == user_id)
+                                  .values(deleted_at=users.c.deleted_at)).rowcount > 0
+    return db.session.execute(select(users.c.id).where(users.c.id == user_id)
+                              .with_for_update(skip_locked=True)).first() is not None
+
+
+def delete_account_batch(user_id, batch_size):
+    """Remove one batch of ``user_id``'s data in its own transaction; return False once the user is gone.
+
+    Likes and comments the user left on other posts go first so those posts'
+    counters can be corrected, then the user's posts (and, by cascade, their
+    likes and comments), messages and friendships, and finally the user row.
+    Every batch is bounded, so neither memory nor lock time grows with the
+    size of the account, and an interrupted deletion resumes where it stopped.
+    Each batch first claims the account; while another deleter holds it this
+    returns False too, leaving the rest to that deleter.
+    """
+    if not _claim(user_id):
+        db.session.rollback()
+        return False
+    for step in _steps(user_id, batch_size):
+        if step():
+            db.session.commit()
+            return True
+
+    user = db.session.execute(select(User.profile_image, User.bg_image).where(User.id == user_id)).first()
+    if user is None:
+        db.session.rollback()
+        return False
+    _release_images('profile_images', list(user))
+    db.session.execute(delete(User).where(User.id == user_id))
+    db.session.commit()
+    user_cache.delete(user_id)
+    return False
+
+
+def delete_account(user_id, batch_size):
+    batches = 0
+    while delete_account_batch(user_id, batch_size):
+        batches += 1
+    return batches
+
+
+def pending_deletions():
+    return db.session.execute(select(User.id).where(User.deleted_at.isnot(None)).order_by(User.deleted_at)) \
+        .scalars().all()
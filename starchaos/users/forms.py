@@ -3,7 +3,7 @@ from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed
 from wtforms import StringField, PasswordField, SubmitField, BooleanField
 from wtforms.validators import DataRequired, Length, Email, EqualTo, ValidationError
-from starchaos import bcrypt
+from starchaos import passwords
 from starchaos.users.models import User
 
 
@@ -65,11 +65,6 @@ class RequestResetForm(FlaskForm):
                         render_kw={"placeholder": "john@example.com"})
     submit = SubmitField('Request Password Reset')
 
-    def validate_email(self, email):
-        user = User.query.filter_by(email=email.data).first()
-        if user is None:
-            raise ValidationError('There is no such email address registered. Register first!')
-
 
 class ResetPasswordForm(FlaskForm):
     password = PasswordField('Password', validators=[DataRequired()],
@@ -89,5 +84,5 @@ class ChangePasswordForm(FlaskForm):
     submit = SubmitField('Change Password')
 
     def validate_current_password(self, field):
-        if not bcrypt.check_password_hash(current_user.password, field.data):
+        if not passwords.check(current_user.password, field.data):
             raise ValidationError('The current password is not correct.')
@@ -3,20 +3,53 @@ from datetime import datetime
 from flask import current_app
 from flask_login import UserMixin
 from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
-from starchaos import db, login_manager
+from sqlalchemy import case, event, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from starchaos import db, login_manager, metrics
+from starchaos.cache import TTLCache
+from starchaos.images.models import Upload
 from starchaos.likes.models import Like
 
 
+_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+user_cache = TTLCache(maxsize=10000)
+metrics.watch_cache('users', user_cache)
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    """Return the logged-in user as a ``UserSnapshot``, from ``user_cache`` when possible.
+
+    Socket.IO events and ordinary page views only read a handful of columns,
+    so most of them need no query at all. Entries are dropped as soon as a
+    change to the user commits, but only in the process that committed it;
+    other workers serve their copy until it is ``USER_CACHE_TTL`` seconds
+    old, so that is how long a change - or an account deletion - can take to
+    reach every worker.
+    """
+    user_id = int(user_id)
+    values = user_cache.get(user_id)
+    if values is not None:
+        snapshot = UserSnapshot(values)
+        return None if snapshot.deleted_at is not None else snapshot
+    user = db.session.get(User, user_id)
+    if user is None or user.deleted_at is not None:
+        return None
+    values = UserSnapshot.values_of(user)
+    user_cache.set(user_id, values, ttl=current_app.config['USER_CACHE_TTL'])
+    return UserSnapshot(values, model=user)
 
 
-friends = db.Table(
-    'friends',
-    db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
-    db.Column('friend_id', db.Integer, db.ForeignKey('users.id'), primary_key=True)
-)
+@event.listens_for(db.session, 'before_flush')
+def _collect_changed_users(session, flush_context, instances):
+    changed = session.info.setdefault('changed_user_ids', set())
+    changed.update(obj.id for obj in session.dirty | session.deleted if isinstance(obj, User))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _forget_changed_users(session):
+    user_cache.delete(*session.info.pop('changed_user_ids', ()))
 
 
 class User(db.Model, UserMixin):
@@ -29,44 +62,31 @@ class User(db.Model, UserMixin):
     bg_image = db.Column(db.String(255), nullable=False, default='default_bg_profile.jpg')
     password = db.Column(db.String(60), nullable=False)
     posts = db.relationship('Post', backref='author', lazy=True,
-                            cascade='all, delete-orphan')
-    friends = db.relationship('User', secondary=friends,
-                              primaryjoin=(friends.c.user_id == id),
-                              secondaryjoin=(friends.c.friend_id == id),
-                              backref=db.backref('followers', lazy='dynamic'), lazy='dynamic')
+                            cascade='all, delete-orphan', passive_deletes=True)
+    profile_upload = db.relationship('Upload', viewonly=True, lazy='joined', primaryjoin=(
+        "and_(foreign(User.profile_image) == Upload.name, Upload.folder == 'profile_images')"))
+    bg_upload = db.relationship('Upload', viewonly=True, primaryjoin=(
+        "and_(foreign(User.bg_image) == Upload.name, Upload.folder == 'profile_images')"))
     theme = db.Column(db.String(10), default='light')
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    friend_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    deleted_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.func.now())
 
     def like_post(self, post):
-        if not self.has_liked_post(post):
-            like = Like(user_id=self.id, post_id=post.id)
-            db.session.add(like)
+        if Like.add(self.id, post.id):
+            post.bump_like_count(1)
 
     def unlike_post(self, post):
-        if self.has_liked_post(post):
-            Like.query.filter_by(
-                user_id=self.id,
-                post_id=post.id).delete()
+        if Like.remove(self.id, post.id):
+            post.bump_like_count(-1)
 
     def has_liked_post(self, post):
         return Like.query.filter(
             Like.user_id == self.id,
             Like.post_id == post.id).count() > 0
 
-    def add_friend(self, user):
-        if not self.is_friend(user):
-            self.friends.append(user)
-            user.friends.append(self)
-            db.session.commit()
-
-    def remove_friend(self, user):
-        if self.is_friend(user):
-            self.friends.remove(user)
-            user.friends.remove(self)
-            db.session.commit()
-
-    def is_friend(self, user):
-        return self.friends.filter(friends.c.friend_id == user.id).count() > 0
-
     def get_reset_token(self, expires_sec=1800):
         s = Serializer(current_app.config['SECRET_KEY'], expires_sec)
         return s.dumps({'user_id': self.id}).decode('utf-8')
@@ -84,10 +104,262 @@ class User(db.Model, UserMixin):
         return f"User('{self.full_name}', '{self.email})"
 
 
+class UserSnapshot:
+    """A request's view of the logged-in user, built from cached column values.
+
+    The columns in ``FIELDS`` are read straight from the snapshot. Anything
+    else - relationships, methods, the password hash - and every assignment
+    goes to the ``User`` row, which is loaded on first need and kept for the
+    rest of the request, so existing ``current_user`` code keeps working. A
+    field that has been assigned is read back from the row from then on.
+    """
+    FIELDS = ('id', 'full_name', 'email', 'profile_image', 'bg_image', 'theme',
+              'post_count', 'friend_count', 'profile_upload', 'updated_at', 'deleted_at')
+    __slots__ = FIELDS + ('_model',)
+
+    def __init__(self, values, model=None):
+        for name, value in zip(self.FIELDS, values):
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, '_model', model)
+
+    @staticmethod
+    def values_of(user):
+        """The cacheable state of ``user``; the upload is copied so no session is shared."""
+        upload = user.profile_upload
+        if upload is not None:
+            upload = Upload(id=upload.id, name=upload.name, folder=upload.folder,
+                            status=upload.status, renditions=upload.renditions)
+        return tuple(upload if name == 'profile_upload' else getattr(user, name)
+                     for name in UserSnapshot.FIELDS)
+
+    @property
+    def model(self):
+        """The ``User`` row, loaded on first use."""
+        if self._model is None:
+            object.__setattr__(self, '_model', db.session.get(User, self.id))
+        return self._model
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.model, name, value)
+        if name in self.FIELDS and name != 'id':
+            try:
+                object.__delattr__(self, name)
+            except AttributeError:
+                pass
+
+    is_active = True
+    is_authenticated = True
+    is_anonymous = False
+
+    def get_id(self):
+        return str(self.id)
+
+    def __eq__(self, other):
+        if isinstance(other, (User, UserSnapshot)):
+            return self.id == other.id
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f"UserSnapshot({self.id})"
+
+
 class Message(db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        db.Index('ix_messages_sender_id_receiver_id', 'sender_id', 'receiver_id', 'date_posted', 'id'),
+        db.Index('ix_messages_receiver_id_sender_id', 'receiver_id', 'sender_id', 'date_posted', 'id'),
+        db.UniqueConstraint('sender_id', 'client_id', name='uq_messages_sender_id_client_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    receiver_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    sender_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    receiver_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     content = db.Column(db.Text, nullable=False)
     date_posted = db.Column(db.DateTime, default=datetime.utcnow)
+    client_id = db.Column(db.String(36), nullable=True)
+
+    @staticmethod
+    def insert_many(rows):
+        """Insert message dicts in one statement, skipping client ids already stored.
+
+        Returns the rows that were actually inserted, so a retried batch does
+        not count its messages twice. Messages dated no later than their
+        conversation's ``cleared_at`` are dropped: the chat was deleted while
+        they waited in a write-behind queue.
+        """
+        marks = Conversation.marks(Conversation._side(row['sender_id'], row['receiver_id'])[0] for row in rows)
+        rows = [row for row in rows if not _cleared(marks, row)]
+        if not rows:
+            return []
+        table = Message.__table__
+        insert = _INSERTS[db.session.get_bind().dialect.name]
+        statement = insert(table).values(rows) \
+            .on_conflict_do_nothing(index_elements=['sender_id', 'client_id']) \
+            .returning(table.c.id, table.c.sender_id, table.c.receiver_id, table.c.content, table.c.date_posted)
+        return db.session.execute(statement).all()
+
+    @staticmethod
+    def conversation(user_id, other_id):
+        return Message.query.filter(
+            ((Message.sender_id == user_id) & (Message.receiver_id == other_id)) |
+            ((Message.sender_id == other_id) & (Message.receiver_id == user_id))
+        )
+
+
+def _cleared(marks, row):
+    mark = marks.get(Conversation._side(row['sender_id'], row['receiver_id'])[0])
+    return mark is not None and mark.cleared_at is not None and row.get('date_posted') is not None \
+        and row['date_posted'] <= mark.cleared_at
+
+
+class Conversation(db.Model):
+    """The inbox entry for a pair of users, kept in step with their messages.
+
+    The pair is stored once with ``user_a_id < user_b_id``; each side has an
+    index on its id and ``last_date`` so an inbox is a range read whatever
+    the message history size.
+    """
+    __tablename__ = 'conversations'
+    __table_args__ = (
+        db.UniqueConstraint('user_a_id', 'user_b_id', name='uq_conversations_user_a_id_user_b_id'),
+        db.Index('ix_conversations_user_a_id_last_date', 'user_a_id', 'last_date'),
+        db.Index('ix_conversations_user_b_id_last_date', 'user_b_id', 'last_date'),
+    )
+    PREVIEW_LENGTH = 140
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_a_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    user_b_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    last_message_id = db.Column(db.Integer, nullable=False)
+    last_date = db.Column(db.DateTime, nullable=False)
+    preview = db.Column(db.String(PREVIEW_LENGTH), nullable=False)
+    unread_a = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    unread_b = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    read_a_at = db.Column(db.DateTime, nullable=True)
+    read_b_at = db.Column(db.DateTime, nullable=True)
+    cleared_at = db.Column(db.DateTime, nullable=True)
+    user_a = db.relationship('User', foreign_keys=[user_a_id])
+    user_b = db.relationship('User', foreign_keys=[user_b_id])
+
+    @staticmethod
+    def _side(user_id, other_id):
+        """The pair in stored order and the side (``'a'`` or ``'b'``) belonging to ``user_id``."""
+        if user_id < other_id:
+            return (user_id, other_id), 'a'
+        return (other_id, user_id), 'b'
+
+    @staticmethod
+    def inbox(user_id):
+        return Conversation.query.filter(
+            (Conversation.user_a_id == user_id) | (Conversation.user_b_id == user_id),
+            Conversation.cleared_at.is_(None) | (Conversation.last_date > Conversation.cleared_at),
+        ).order_by(Conversation.last_date.desc())
+
+    @staticmethod
+    def marks(pairs):
+        """The read and cleared times of the stored ``pairs``, their rows locked until the caller commits."""
+        pairs = list(set(pairs))
+        if not pairs:
+            return {}
+        table = Conversation.__table__
+        rows = db.session.execute(
+            select(table.c.user_a_id, table.c.user_b_id, table.c.read_a_at, table.c.read_b_at, table.c.cleared_at)
+            .where(tuple_(table.c.user_a_id, table.c.user_b_id).in_(pairs))
+            .with_for_update())
+        return {(row.user_a_id, row.user_b_id): row for row in rows}
+
+    @staticmethod
+    def record(messages):
+        """Make the newest of ``messages`` each pair's latest and count them unread for the receiver.
+
+        One multi-row upsert in the caller's transaction. A message that commits
+        after a newer one still counts as unread but does not replace the preview,
+        and one dated no later than the receiver's ``read_*_at`` is not counted,
+        since the open chat already showed it. The pairs' rows are locked first,
+        so a read cannot slip in between that check and the commit.
+        """
+        messages = sorted(messages, key=lambda message: message.id)
+        if not messages:
+            return
+        marks = Conversation.marks(Conversation._side(message.sender_id, message.receiver_id)[0]
+                                   for message in messages)
+        pairs = {}
+        for message in messages:
+            pair, side = Conversation._side(message.receiver_id, message.sender_id)
+            values = pairs.setdefault(pair, {'user_a_id': pair[0], 'user_b_id': pair[1],
+                                             'unread_a': 0, 'unread_b': 0})
+            values.update(last_message_id=message.id, last_date=message.date_posted,
+                          preview=message.content[:Conversation.PREVIEW_LENGTH])
+            seen = getattr(marks[pair], f'read_{side}_at') if pair in marks else None
+            if pair[0] != pair[1] and (seen is None or message.date_posted > seen):
+                values[f'unread_{side}'] += 1
+        table = Conversation.__table__
+        insert = _INSERTS[db.session.get_bind().dialect.name]
+        statement = insert(table).values(list(pairs.values()))
+        newer = statement.excluded.last_message_id > table.c.last_message_id
+        latest = {column: case((newer, statement.excluded[column]), else_=table.c[column])
+                  for column in ('last_message_id', 'last_date', 'preview')}
+        unread = {column: table.c[column] + statement.excluded[column] for column in ('unread_a', 'unread_b')}
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=['user_a_id', 'user_b_id'], set_={**latest, **unread},
+        ))
+
+    @staticmethod
+    def mark_read(user_id, other_id, until=None):
+        """Clear ``user_id``'s unread count; return True if anything changed.
+
+        With ``until``, also note that ``user_id`` has seen the chat's messages
+        dated up to then. The open chat acknowledges a message as soon as it is
+        shown, which can be before the write-behind queue stores it, and
+        ``record`` then leaves it out of the count.
+        """
+        (user_a_id, user_b_id), side = Conversation._side(user_id, other_id)
+        unread = getattr(Conversation, f'unread_{side}')
+        condition, values = unread > 0, {unread: 0}
+        if until is not None:
+            read_at = getattr(Conversation, f'read_{side}_at')
+            condition = condition | read_at.is_(None) | (read_at < until)
+            values[read_at] = until
+        return db.session.execute(
+            update(Conversation)
+            .where(Conversation.user_a_id == user_a_id, Conversation.user_b_id == user_b_id, condition)
+            .values(values)
+            .execution_options(synchronize_session=False)
+        ).rowcount > 0
+
+    @staticmethod
+    def clear(user_id, other_id, at):
+        """Delete the pair's messages dated up to ``at`` and take the conversation out of both inboxes.
+
+        The conversation row stays, with ``cleared_at`` set, so that messages
+        still waiting in any worker's write-behind queue are dropped by
+        ``insert_many`` rather than bringing the chat back. A newer message
+        puts the conversation back in the inboxes.
+        """
+        (user_a_id, user_b_id), _ = Conversation._side(user_id, other_id)
+        table = Conversation.__table__
+        insert = _INSERTS[db.session.get_bind().dialect.name]
+        values = {'last_message_id': 0, 'last_date': at, 'preview': '', 'unread_a': 0, 'unread_b': 0,
+                  'cleared_at': at}
+        statement = insert(table).values(user_a_id=user_a_id, user_b_id=user_b_id, **values)
+        db.session.execute(statement.on_conflict_do_update(index_elements=['user_a_id', 'user_b_id'], set_=values))
+        Message.conversation(user_id, other_id).filter(Message.date_posted <= at) \
+            .delete(synchronize_session=False)
+
+    def other(self, user):
+        return self.user_b if user.id == self.user_a_id else self.user_a
+
+    def unread_for(self, user):
+        return self.unread_a if user.id == self.user_a_id else self.unread_b
+
+    def __repr__(self):
+        return f"Conversation({self.user_a_id}, {self.user_b_id})"
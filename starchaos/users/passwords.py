@@ -0,0 +1,61 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
+
+import bcrypt
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(hashed, password):
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+class PasswordHasher:
+    """bcrypt hashing and checking off the request worker.
+
+    bcrypt releases the GIL, so the work runs on a pool of at most
+    ``PASSWORD_HASH_WORKERS`` OS threads and a burst of logins queues there
+    instead of stalling the worker. Under eventlet the pool is eventlet's
+    ``tpool``, because monkey-patched threads would run bcrypt on the event
+    loop and freeze every Socket.IO connection on it. New hashes use
+    ``BCRYPT_LOG_ROUNDS``.
+    """
+
+    def __init__(self, app=None):
+        self.rounds = None
+        self._call = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.rounds = app.config['BCRYPT_LOG_ROUNDS']
+        workers = app.config['PASSWORD_HASH_WORKERS']
+        if app.config['SOCKETIO_ASYNC_MODE'] == 'eventlet':
+            from eventlet import tpool
+            slots = BoundedSemaphore(workers)
+
+            def call(fn, *args):
+                with slots:
+                    return tpool.execute(fn, *args)
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+
+            def call(fn, *args):
+                return executor.submit(fn, *args).result()
+        self._call = call
+        app.extensions['passwords'] = self
+
+    def hash(self, password):
+        return self._call(_hash, password, self.rounds)
+
+    def check(self, hashed, password):
+        return self._call(_check, hashed, password)
+
+    def needs_rehash(self, hashed):
+        """True if ``hashed`` was made with a cost other than the configured one."""
+        try:
+            return int(hashed.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
@@ -1,10 +1,15 @@
+from datetime import datetime
+from uuid import uuid4
 from flask import render_template, url_for, flash, redirect, request, Blueprint
 from flask_login import login_user, current_user, logout_user, login_required
 from flask_socketio import emit, join_room
-from sqlalchemy.orm import aliased
-from sqlalchemy.sql import func
-from starchaos import bcrypt, db, socketio
+from sqlalchemy.orm import joinedload
+from starchaos import db, message_writer, metrics, page_cache, passwords, presence, socketio, throttle
+from starchaos.friends.utils import are_friends, befriend, unfriend
+from starchaos.pagination import paginate_keyset
 from starchaos.posts.models import Post
+from starchaos.posts.utils import load_feed
+from starchaos.timeline.utils import fan_out_post, prune_friendship, reset_timelines
 from starchaos.users.forms import (
     RegistrationForm,
     LoginForm,
@@ -14,8 +19,16 @@ from starchaos.users.forms import (
     ChangePasswordForm
 )
 from starchaos.posts.forms import PostForm
-from starchaos.users.models import User, Message
-from starchaos.users.utils import save_image, send_reset_email, get_random_users_not_friends
+from starchaos.users.models import User, Message, Conversation
+from starchaos.images.utils import release_image, save_image
+from starchaos.users.utils import (
+    send_reset_email,
+    friend_list,
+    suggest_friends,
+    forget_suggestions,
+    user_room,
+    announce_presence
+)
 
 users = Blueprint('users', __name__)
 
@@ -26,7 +39,7 @@ def register():
         return redirect(url_for('main.index'))
     form = RegistrationForm()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+        hashed_password = passwords.hash(form.password.data)
         user = User(full_name=form.full_name.data, email=form.email.data, password=hashed_password)
         db.session.add(user)
         db.session.commit()
@@ -36,13 +49,17 @@ def register():
 
 
 @users.route('/login', methods=['POST', 'GET'])
+@throttle.limit('login', account_field='email')
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('main.index'))
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
-        if user and bcrypt.check_password_hash(user.password, form.password.data):
+        if user and user.deleted_at is None and passwords.check(user.password, form.password.data):
+            if passwords.needs_rehash(user.password):
+                user.password = passwords.hash(form.password.data)
+                db.session.commit()
             login_user(user, remember=form.remember.data)
             next_page = request.args.get('next')
             return redirect(next_page) if next_page else redirect(url_for('main.index'))
@@ -67,25 +84,32 @@ def profile(full_name):
         full_name = current_user.full_name
     post_form = PostForm()
     if post_form.validate_on_submit():
-        post = Post(content=post_form.content.data, author=current_user)
+        post_image = None
         if post_form.picture.data:
-            post_image = save_image(post_form.picture.data, (1500, 1500), 'post_images')
-            post.image = post_image
+            post_image = save_image(post_form.picture.data, 'post_images')
+        post = Post(content=post_form.content.data, image=post_image, author=current_user.model)
         db.session.add(post)
+        current_user.post_count = User.post_count + 1
         db.session.commit()
+        fan_out_post(current_user, post)
 
         flash('Your post has been created!', 'success')
         return redirect(url_for('users.profile', _anchor='iq-top-navbar'))
 
-    page = request.args.get('page', 1, type=int)
+    before = request.args.get('before')
     user = User.query.filter_by(full_name=full_name).first_or_404()
-    friends = user.friends.all()
-    random_users = get_random_users_not_friends(user, num_users=10)
-    posts = Post.query.filter_by(author=user) \
-        .order_by(Post.date_posted.desc()) \
-        .paginate(page=page, per_page=5)
+    posts = paginate_keyset(Post.query.filter_by(author=user).options(joinedload(Post.author)),
+                            Post, before=before, per_page=5)
+    not_modified = page_cache.validate(user.id, user.updated_at, current_user.id, current_user.updated_at,
+                                       [(post.id, post.updated_at) for post in posts.items])
+    if not_modified:
+        return not_modified
+    load_feed(posts.items, current_user)
+    friends = friend_list(user, current_user, after=request.args.get('friends_after'))
+    is_friend = bool(are_friends(current_user, [user.id]))
+    random_users = suggest_friends(user, num_users=10)
     return render_template('profile.html', title='Profile', post_form=post_form, posts=posts, user=user,
-                           friends=friends, random_users=random_users)
+                           friends=friends, is_friend=is_friend, random_users=random_users)
 
 
 @users.route('/update', methods=['POST', 'GET'])
@@ -97,10 +121,12 @@ def update():
     if 'submit' in request.form and request.form['submit'] == 'Update':
         if form.validate_on_submit():
             if form.picture.data:
-                profile_image = save_image(form.picture.data, (500, 500), 'profile_images')
+                profile_image = save_image(form.picture.data, 'profile_images')
+                release_image('profile_images', current_user.profile_image)
                 current_user.profile_image = profile_image
             if form.bg_picture.data:
-                profile_bg_image = save_image(form.bg_picture.data, (1500, 1500), 'profile_images')
+                profile_bg_image = save_image(form.bg_picture.data, 'profile_images')
+                release_image('profile_images', current_user.bg_image)
                 current_user.bg_image = profile_bg_image
             current_user.full_name = form.full_name.data
             current_user.email = form.email.data
@@ -110,8 +136,7 @@ def update():
     if 'submit' in request.form and request.form['submit'] == 'Change Password':
         _pass = False
         if password_form.validate_on_submit():
-            hashed_password = bcrypt.generate_password_hash(password_form.new_password.data).decode('utf-8')
-            current_user.password = hashed_password
+            current_user.password = passwords.hash(password_form.new_password.data)
             db.session.commit()
             flash('Your password has been updated!', 'success')
             return redirect(url_for('users.profile'))
@@ -124,13 +149,15 @@ def update():
 
 
 @users.route("/reset_password", methods=['GET', 'POST'])
+@throttle.limit('reset_request', account_field='email')
 def reset_request():
     if current_user.is_authenticated:
         return redirect(url_for('main.index'))
     form = RequestResetForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
-        send_reset_email(user)
+        send_reset_email(user, form.email.data)
+        db.session.commit()
         return render_template('mail_confirm.html', email=form.email.data)
     return render_template('reset_request.html', title='Reset Password', form=form)
 
@@ -145,8 +172,7 @@ def reset_token(token):
         return redirect(url_for('users.reset_request'))
     form = ResetPasswordForm()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
-        user.password = hashed_password
+        user.password = passwords.hash(form.password.data)
         db.session.commit()
         flash('Your password has been updated! You are now able to log in', 'success')
         return redirect(url_for('users.login'))
@@ -158,7 +184,10 @@ def reset_token(token):
 def add_friend(user_id):
     user = User.query.get(user_id)
     if user:
-        current_user.add_friend(user)
+        if befriend(current_user, user):
+            db.session.commit()
+        reset_timelines(current_user, user)
+        forget_suggestions(current_user, user)
         flash(f"You are now friends with {user.full_name}!", "success")
     return redirect(request.referrer)
 
@@ -168,7 +197,10 @@ def add_friend(user_id):
 def remove_friend(user_id):
     user = User.query.get(user_id)
     if user:
-        current_user.remove_friend(user)
+        if unfriend(current_user, user):
+            db.session.commit()
+        prune_friendship(current_user, user)
+        forget_suggestions(current_user, user)
         flash(f"You are no longer friends with {user.full_name}.", "info")
     return redirect(request.referrer)
 
@@ -177,22 +209,22 @@ def remove_friend(user_id):
 @login_required
 def chat(receiver_id):
     sender = current_user
-    receiver = User.query.get(receiver_id)
-    messages = Message.query.filter(
-        ((Message.sender_id == sender.id) & (Message.receiver_id == receiver_id)) |
-        ((Message.sender_id == receiver_id) & (Message.receiver_id == sender.id))
-    ).all()
-    return render_template('chat.html', sender=sender, receiver=receiver, messages=messages)
+    receiver = User.query.get_or_404(receiver_id)
+    before = request.args.get('before')
+    messages = paginate_keyset(Message.conversation(sender.id, receiver_id), Message,
+                               before=before, per_page=50)
+    messages.items.reverse()
+    if Conversation.mark_read(sender.id, receiver.id):
+        db.session.commit()
+    online = receiver.id in presence.store.online([receiver.id])
+    return render_template('chat.html', sender=sender, receiver=receiver, messages=messages, online=online)
 
 
 @users.route("/delete_messages/<int:receiver_id>", methods=['POST'])
 @login_required
 def delete_messages(receiver_id):
-    sender_id = current_user.id
-    Message.query.filter(
-        ((Message.sender_id == sender_id) & (Message.receiver_id == receiver_id)) |
-        ((Message.sender_id == receiver_id) & (Message.receiver_id == sender_id))
-    ).delete()
+    receiver = User.query.get_or_404(receiver_id)
+    Conversation.clear(current_user.id, receiver.id, datetime.utcnow())
     db.session.commit()
     return redirect(url_for('users.chats'))
 
@@ -200,48 +232,72 @@ def delete_messages(receiver_id):
 @users.route("/chats")
 @login_required
 def chats():
-    u = aliased(User)
-    m = aliased(Message)
+    conversations = Conversation.inbox(current_user.id) \
+        .options(joinedload(Conversation.user_a), joinedload(Conversation.user_b)).all()
+    online_ids = presence.store.online([conversation.other(current_user).id for conversation in conversations])
+    return render_template('chats.html', conversations=conversations, online_ids=online_ids)
 
-    subquery = (
-        db.session.query(u.id.label('user_id'), func.max(m.date_posted).label('max_date'))
-        .join(m, (u.id == m.sender_id) | (u.id == m.receiver_id))
-        .filter((m.sender_id == current_user.id) | (m.receiver_id == current_user.id))
-        .filter(u.id != current_user.id)
-        .group_by(u.id)
-        .distinct(u.id)
-        .subquery()
-    )
 
-    users_with_messages = (
-        db.session.query(u)
-        .join(subquery, u.id == subquery.c.user_id)
-        .order_by(subquery.c.max_date.desc())
-        .all()
-    )
+@socketio.on('connect')
+@metrics.timed_event
+def handle_connect(auth=None):
+    if not current_user.is_authenticated:
+        return False
+    join_room(user_room(current_user.id))
+    if presence.store.connect(current_user.id, request.sid):
+        announce_presence(current_user, True)
 
-    return render_template('chats.html', messaged_users=users_with_messages)
 
+@socketio.on('disconnect')
+@metrics.timed_event
+def handle_disconnect():
+    if current_user.is_authenticated and presence.store.disconnect(current_user.id, request.sid):
+        announce_presence(current_user, False)
 
-@socketio.on('private_message')
-@login_required
-def handle_private_message(data):
-    sender_id = data['sender_id']
-    receiver_id = data['receiver_id']
-    content = data['content']
 
-    message = Message(sender_id=sender_id, receiver_id=receiver_id, content=content)
-    db.session.add(message)
-    db.session.commit()
-
-    emit('response', {'sender_id': sender_id, 'content': content,
-                      'date': message.date_posted.strftime('%Y-%m-%d %H:%M')}, room=sender_id)
-    emit('response', {'sender_id': sender_id, 'content': content,
-                      'date': message.date_posted.strftime('%Y-%m-%d %H:%M')}, room=receiver_id)
+@socketio.on('heartbeat')
+@metrics.timed_event
+@login_required
+def handle_heartbeat():
+    presence.store.touch(current_user.id, request.sid)
 
 
-@socketio.on('join')
+@socketio.on('private_message')
+@metrics.timed_event
 @login_required
-def handle_join(data):
-    room = data['room']
-    join_room(room)
+def handle_private_message(data):
+    try:
+        receiver_id = int(data['receiver_id'])
+        content = str(data['content']).strip()
+    except (KeyError, TypeError, ValueError):
+        return
+    if not content:
+        return
+    client_id = data.get('client_id')
+    if not isinstance(client_id, str) or not 0 < len(client_id) <= 36:
+        client_id = uuid4().hex
+
+    if db.session.query(User.id).filter_by(id=receiver_id, deleted_at=None).first() is None:
+        return
+
+    date_posted = datetime.utcnow()
+    if not message_writer.save({'sender_id': current_user.id, 'receiver_id': receiver_id, 'content': content,
+                                'date_posted': date_posted, 'client_id': client_id}):
+        return {'client_id': client_id, 'error': 'Message not sent, try again.'}
+
+    emit('response', {'sender_id': current_user.id, 'receiver_id': receiver_id, 'content': content,
+                      'client_id': client_id, 'date': date_posted.strftime('%Y-%m-%d %H:%M')},
+         to=list({user_room(current_user.id), user_room(receiver_id)}))
+    return {'client_id': client_id}
+
+
+@socketio.on('read')
+@metrics.timed_event
+@login_required
+def handle_read(data):
+    try:
+        other_id = int(data['user_id'])
+    except (KeyError, TypeError, ValueError):
+        return
+    if Conversation.mark_read(current_user.id, other_id, until=datetime.utcnow()):
+        db.session.commit()
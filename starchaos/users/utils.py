@@ -1,10 +1,12 @@
-import secrets
-import os
-from random import sample
-from PIL import Image
-from flask import url_for, current_app
-from starchaos import mail, db
-from flask_mail import Message
+from random import randint
+from flask import render_template, url_for, current_app
+from sqlalchemy import select, union_all
+from sqlalchemy.sql import func
+from starchaos import db, metrics, page_cache, socketio
+from starchaos.cache import TTLCache
+from starchaos.friends.models import edges, friend_ids_select
+from starchaos.friends.utils import are_friends, friend_ids, friends_page, mutual_friend_counts
+from starchaos.outbox.utils import queue_email
 from starchaos.users.models import User
 
 MESSAGE_TEXT = '''To reset your password, visit the following link:
@@ -13,37 +15,111 @@ MESSAGE_TEXT = '''To reset your password, visit the following link:
 If you did not make this request then simply ignore this email and no changes will be made.
 '''
 
+suggestion_cache = TTLCache(maxsize=10000)
+metrics.watch_cache('suggestions', suggestion_cache)
 
-def get_random_users_not_friends(user, num_users=10):
-    friends_ids = [friend.id for friend in user.friends]
-    users_not_friends_ids = db.session.query(User.id).filter(~User.id.in_(friends_ids)).filter(
-        User.id != user.id)
-    total_users_not_friends = users_not_friends_ids.count()
-    num_users = min(num_users, total_users_not_friends)
-    random_user_ids = sample([id for (id,) in users_not_friends_ids.all()], num_users)
-    random_users = User.query.filter(User.id.in_(random_user_ids)).all()
-    return random_users
 
+def _mutual_friend_candidates(user_id, limit):
+    """Friends of friends, ranked by how many friends they share with the user."""
+    theirs = edges(friend_ids_select(user_id))
+    mutual = func.count().label('mutual')
+    rows = db.session.query(theirs.c.friend_id, mutual) \
+        .filter(theirs.c.friend_id != user_id,
+                ~theirs.c.friend_id.in_(friend_ids_select(user_id))) \
+        .group_by(theirs.c.friend_id) \
+        .order_by(mutual.desc(), theirs.c.friend_id) \
+        .limit(limit)
+    return [candidate_id for candidate_id, _ in rows]
 
-def save_image(form_picture, size, folder_name):
-    random_hex = secrets.token_hex(8)
-    _, f_ext = os.path.splitext(form_picture.filename)
-    picture_fn = random_hex + f_ext
-    picture_path = os.path.join(current_app.root_path, f'static/images/{folder_name}', picture_fn)
 
-    output_size = size
-    img = Image.open(form_picture)
-    img.thumbnail(output_size)
-    img.save(picture_path)
+def _random_candidates(user_id, exclude, limit):
+    """Sample users by probing random primary keys, all probes in one statement.
 
-    return picture_fn
+    Each probe takes the first eligible id at or after a random point of the id
+    range, so it is an index seek whatever the table size and tolerates gaps
+    left by deleted accounts.
+    """
+    low, high = db.session.query(func.min(User.id), func.max(User.id)).one()
+    if low is None:
+        return []
+    excluded = [user_id, *exclude]
+    probes = [
+        select(func.min(User.id)).where(User.id >= randint(low, high),
+                                        User.id.not_in(excluded),
+                                        User.id.not_in(friend_ids_select(user_id)))
+        for _ in range(limit * 2)
+    ]
+    found = db.session.execute(union_all(*probes)).scalars()
+    candidate_ids = list(dict.fromkeys(candidate_id for candidate_id in found if candidate_id is not None))
+    if len(candidate_ids) < limit:
+        # Probes collide on small or mostly-befriended tables; top up in id order.
+        rows = db.session.query(User.id) \
+            .filter(User.id.not_in(excluded + candidate_ids), User.id.not_in(friend_ids_select(user_id))) \
+            .order_by(User.id).limit(limit - len(candidate_ids))
+        candidate_ids += [candidate_id for (candidate_id,) in rows]
+    return candidate_ids[:limit]
 
 
-def send_reset_email(user):
+def suggest_friends(user, num_users=10):
+    """Return up to ``num_users`` people the user may know.
+
+    Friends of friends come first, ranked by mutual friend count; the rest of
+    the list is a random sample. Ids are cached per user for
+    ``SUGGESTIONS_TTL`` seconds and dropped when a friendship changes.
+    """
+    candidate_ids = suggestion_cache.get(user.id)
+    if candidate_ids is None:
+        candidate_ids = _mutual_friend_candidates(user.id, num_users)
+        if len(candidate_ids) < num_users:
+            candidate_ids += _random_candidates(user.id, candidate_ids, num_users - len(candidate_ids))
+        suggestion_cache.set(user.id, candidate_ids, ttl=current_app.config['SUGGESTIONS_TTL'])
+    if not candidate_ids:
+        return []
+    users_by_id = {u.id: u for u in User.query.filter(User.id.in_(candidate_ids))}
+    return [users_by_id[candidate_id] for candidate_id in candidate_ids if candidate_id in users_by_id]
+
+
+def friend_list(user, viewer, after=None):
+    """The rendered page of ``user``'s friends after the ``after`` cursor, as ``viewer`` sees it.
+
+    Cached per version of both users, so a repeat view costs none of its
+    queries; a friend's own changes show within ``PAGE_CACHE_TTL`` seconds.
+    """
+    def render():
+        friends = friends_page(user, after=after)
+        ids = [friend.id for friend in friends.items]
+        mutual_counts = mutual_friend_counts(viewer, ids) if user != viewer else {}
+        return render_template('includes/friend_list.html', user=user, friends=friends,
+                               my_friend_ids=are_friends(viewer, ids), mutual_counts=mutual_counts)
+
+    return page_cache.cached('friend-list', (user.id, user.updated_at, after, viewer.id, viewer.updated_at), render)
+
+
+def forget_suggestions(*users):
+    suggestion_cache.delete(*(user.id for user in users))
+
+
+def user_room(user_id):
+    """The Socket.IO room every connection of ``user_id`` joins on connect."""
+    return f'user:{user_id}'
+
+
+def announce_presence(user, online):
+    """Tell the user's friends, on whichever worker they are connected to, that they came or went."""
+    rooms = [user_room(friend_id) for friend_id in friend_ids(user.id)]
+    if rooms:
+        socketio.emit('presence', {'user_id': user.id, 'online': online}, to=rooms)
+
+
+def send_reset_email(user, email):
+    """Queue the reset link for ``user``, who is None if ``email`` is not registered.
+
+    An unregistered address still gets an outbox row, marked discarded, so the
+    request does the same work and takes as long either way.
+    """
+    if user is None:
+        queue_email(email, 'Password Reset Request', '', status='discarded')
+        return
     token = user.get_reset_token()
-    msg = Message('Password Reset Request',
-                  sender=current_app.config['MAIL_SENDER'],
-                  recipients=[user.email])
     url = url_for('users.reset_token', token=token, _external=True)
-    msg.body = MESSAGE_TEXT.format(url)
-    mail.send(msg)
+    queue_email(user.email, 'Password Reset Request', MESSAGE_TEXT.format(url))
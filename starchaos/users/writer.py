@@ -0,0 +1,120 @@
+import atexit
+import queue
+import time
+from threading import Lock, Thread
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+# Errors about the rows themselves, which no retry can fix.
+REJECTED = (DataError, IntegrityError)
+
+
+class MessageWriter:
+    """Write-behind persistence for chat messages.
+
+    ``save`` hands a message to a bounded queue and returns at once; a
+    background thread drains the queue in batches of up to
+    ``CHAT_BATCH_SIZE`` or whatever arrived within ``CHAT_FLUSH_INTERVAL``
+    seconds and stores each batch with one multi-row INSERT. A batch is only
+    dropped after its transaction commits, and batches that fail for
+    transient reasons are retried, so delivery is at-least-once; the
+    ``(sender_id, client_id)`` key turns the retries and client resends into
+    no-ops. A batch the database rejects is written again one row at a time,
+    and rows it still rejects are logged and dropped, so one bad message
+    cannot stall the queue. A full queue makes senders wait up to
+    ``CHAT_QUEUE_TIMEOUT`` seconds, after which ``save`` refuses the message
+    instead of the queue growing without bound, and anything still queued is
+    written at interpreter exit.
+
+    With ``CHAT_WRITE_BEHIND`` off, ``save`` writes and commits inline.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._queue = None
+        self._thread = None
+        self._lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config['CHAT_WRITE_BEHIND']
+        self.batch_size = app.config['CHAT_BATCH_SIZE']
+        self.interval = app.config['CHAT_FLUSH_INTERVAL']
+        self.timeout = app.config['CHAT_QUEUE_TIMEOUT']
+        self._queue = queue.Queue(maxsize=app.config['CHAT_QUEUE_SIZE'])
+        app.extensions['message_writer'] = self
+
+    def save(self, row):
+        """Store ``row``, or queue it; return False if the queue stayed full for ``CHAT_QUEUE_TIMEOUT``."""
+        if not self.enabled:
+            self._write([row])
+            return True
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = Thread(target=self._run, daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush)
+        try:
+            self._queue.put(row, timeout=self.timeout)
+        except queue.Full:
+            self.app.logger.error('Chat message queue full, refusing a message from user %s', row['sender_id'])
+            return False
+        return True
+
+    def _take(self):
+        """Wait for one row, then keep collecting until the size or time limit."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            self._store(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _store(self, rows):
+        """Write ``rows``, retrying transient failures with backoff until they commit."""
+        delay = self.interval
+        while True:
+            try:
+                self._write(rows)
+                return
+            except REJECTED:
+                if len(rows) == 1:
+                    self.app.logger.exception('Dropping a chat message the database rejects: %r', rows[0])
+                    return
+                self.app.logger.warning('Writing %d chat messages was rejected, retrying one by one', len(rows))
+                for row in rows:
+                    self._store([row])
+                return
+            except Exception:
+                self.app.logger.exception('Writing %d chat messages failed, retrying', len(rows))
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    def _write(self, rows):
+        from starchaos import db
+        from starchaos.users.models import Message, Conversation
+
+        with self.app.app_context():
+            try:
+                Conversation.record(Message.insert_many(rows))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def flush(self):
+        """Block until every message queued so far has been committed."""
+        if self._thread is not None:
+            self._queue.join()
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+from starchaos import create_app, db
+from starchaos.config import Config
+from starchaos.friends.utils import friend_cache
+from starchaos.search.utils import typeahead_cache
+from starchaos.users.models import user_cache
+from starchaos.users.utils import suggestion_cache
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Build an app on a fresh database, with ``settings`` overriding the test config.
+
+    Each app gets its own SQLite file unless ``TEST_DATABASE_URI`` names a
+    database to run against instead, e.g. Postgres for its row locking;
+    its tables are dropped after every test.
+    """
+    apps = []
+
+    def make_app(**settings):
+        class TestConfig(Config):
+            TESTING = True
+            SECRET_KEY = 'test'
+            SQLALCHEMY_DATABASE_URI = os.getenv('TEST_DATABASE_URI') or \
+                f'sqlite:///{os.path.join(tmp_path, f"test{len(apps)}.db")}'
+            MAIL_QUEUE_WORKER = False
+            ACCOUNT_DELETION_WORKER = False
+            PAGE_CACHE_ENABLED = False
+
+        for name, value in settings.items():
+            setattr(TestConfig, name, value)
+        app = create_app(TestConfig)
+        with app.app_context():
+            db.create_all(bind_key=None)
+        apps.append(app)
+        return app
+
+    # The module-level caches outlive an app, and ids repeat between test databases.
+    for cache in (user_cache, friend_cache, suggestion_cache, typeahead_cache):
+        cache.clear()
+    yield make_app
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            db.drop_all(bind_key=None)
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
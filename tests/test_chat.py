@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+from starchaos import db
+from starchaos.seed import seed
+from starchaos.users.models import Conversation, Message
+
+
+def _store(*rows):
+    Conversation.record(Message.insert_many(list(rows)))
+    db.session.commit()
+
+
+def _message(sender_id, receiver_id, date_posted, content='hi'):
+    return {'sender_id': sender_id, 'receiver_id': receiver_id, 'content': content, 'date_posted': date_posted}
+
+
+def _unread(user_id, other_id):
+    (user_a_id, user_b_id), side = Conversation._side(user_id, other_id)
+    conversation = db.session.execute(
+        db.select(Conversation).filter_by(user_a_id=user_a_id, user_b_id=user_b_id)).scalar_one()
+    db.session.refresh(conversation)
+    return getattr(conversation, f'unread_{side}')
+
+
+def test_messages_read_before_they_are_stored_stay_read(app):
+    with app.app_context():
+        seed(users=2, posts=0, threads=0)
+        now = datetime.utcnow()
+        _store(_message(1, 2, now))
+        assert _unread(2, 1) == 1
+
+        # The open chat acknowledges each message on arrival, before the writer commits it.
+        for second in range(1, 4):
+            sent = now + timedelta(seconds=second)
+            Conversation.mark_read(2, 1, until=sent)
+            db.session.commit()
+            _store(_message(1, 2, sent))
+        assert _unread(2, 1) == 0
+
+        _store(_message(1, 2, now + timedelta(seconds=5)), _message(2, 1, now + timedelta(seconds=6)))
+        assert _unread(2, 1) == 1
+        assert _unread(1, 2) == 1
+
+        assert Conversation.mark_read(2, 1)
+        db.session.commit()
+        assert _unread(2, 1) == 0
+
+
+def _inbox(user_id):
+    return [(conversation.user_a_id, conversation.user_b_id) for conversation in Conversation.inbox(user_id)]
+
+
+def test_deleted_chat_stays_deleted_when_queued_messages_are_stored(app):
+    with app.app_context():
+        seed(users=2, posts=0, threads=0)
+        now = datetime.utcnow()
+        _store(_message(1, 2, now - timedelta(seconds=2)))
+        queued = _message(2, 1, now - timedelta(seconds=1))
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+    assert client.post('/delete_messages/2').status_code == 302
+
+    with app.app_context():
+        # Stored by another worker's write-behind queue after the chat was deleted.
+        _store(queued)
+        assert Message.conversation(1, 2).count() == 0
+        assert _inbox(1) == _inbox(2) == []
+
+        _store(_message(2, 1, datetime.utcnow() + timedelta(seconds=1)))
+        assert Message.conversation(1, 2).count() == 1
+        assert _inbox(1) == [(1, 2)]
+        assert _unread(1, 2) == 1
@@ -0,0 +1,81 @@
+from threading import Barrier, BrokenBarrierError, Thread
+
+from sqlalchemy import select, update
+from starchaos import db
+from starchaos.images.models import Upload
+from starchaos.seed import seed
+from starchaos.users import deletion
+from starchaos.users.deletion import delete_account, request_account_deletion
+from starchaos.users.models import User
+
+
+def _share_profile_image(user_ids):
+    db.session.add(Upload(name='shared.png', folder='profile_images', status='ready', ref_count=len(user_ids)))
+    db.session.execute(update(User).where(User.id.in_(user_ids)).values(profile_image='shared.png'))
+    db.session.commit()
+
+
+def test_deletion_removes_the_account_in_bounded_batches(app):
+    with app.app_context():
+        seed(users=30, posts=300, threads=20)
+        user = db.session.execute(select(User).order_by(User.post_count.desc())).scalars().first()
+        user_id, post_count = user.id, user.post_count
+        request_account_deletion(user, background=False)
+        db.session.commit()
+
+        batches = delete_account(user_id, batch_size=10)
+
+        assert batches > post_count // 10
+        assert db.session.get(User, user_id) is None
+        result = app.test_cli_runner().invoke(args=['recount'])
+        assert result.output.count(': 0 rows repaired') == result.output.count('\n') == 5
+
+
+def test_concurrent_deleters_do_not_double_count(app, monkeypatch):
+    # Hold each deleter just before it releases the account's images, so two
+    # deleters working on the account at once would both get there and
+    # release them twice. The claim lets only one through and the wait times
+    # out. The race needs row locks to show: run with TEST_DATABASE_URI set
+    # to a Postgres database.
+    meet = Barrier(2, timeout=2)
+    release_images = deletion._release_images
+
+    def release_together(folder, names):
+        if folder == 'profile_images':
+            try:
+                meet.wait()
+            except BrokenBarrierError:
+                pass
+        release_images(folder, names)
+
+    monkeypatch.setattr(deletion, '_release_images', release_together)
+    with app.app_context():
+        seed(users=30, posts=300, threads=20)
+        user_ids = db.session.execute(select(User.id).order_by(User.post_count.desc()).limit(2)).scalars().all()
+        _share_profile_image(user_ids)
+        request_account_deletion(db.session.get(User, user_ids[0]), background=False)
+        db.session.commit()
+
+    start = Barrier(2)
+    errors = []
+
+    def deleter():
+        with app.app_context():
+            start.wait()
+            try:
+                delete_account(user_ids[0], batch_size=5)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [Thread(target=deleter) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with app.app_context():
+        assert db.session.get(User, user_ids[0]) is None
+        assert db.session.execute(select(Upload.ref_count).filter_by(name='shared.png')).scalar() == 1
+        result = app.test_cli_runner().invoke(args=['recount'])
+        assert result.output.count(': 0 rows repaired') == 5, result.output
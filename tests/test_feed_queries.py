@@ -0,0 +1,36 @@
+from flask import render_template
+from flask_login import login_user
+from sqlalchemy import event, select
+from starchaos import db
+from starchaos.posts.utils import load_feed
+from starchaos.seed import seed
+from starchaos.timeline.utils import home_feed
+from starchaos.users.models import User
+
+
+def _feed_queries(app, user_id, per_page):
+    """SQL statements issued to build and render a home feed page of ``per_page`` posts."""
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.test_request_context('/'):
+        login_user(db.session.get(User, user_id))
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            posts = home_feed(db.session.get(User, user_id), per_page=per_page)
+            load_feed(posts.items, db.session.get(User, user_id))
+            render_template('index.html', posts=posts)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+    assert len(posts.items) == per_page
+    return len(statements)
+
+
+def test_feed_queries_do_not_grow_with_page_size(app):
+    with app.app_context():
+        seed(users=50, posts=500, threads=0)
+        user_id = db.session.execute(select(User.id).order_by(User.friend_count.desc())).scalars().first()
+    _feed_queries(app, user_id, 5)  # fills the timeline store and caches
+    assert _feed_queries(app, user_id, 5) == _feed_queries(app, user_id, 20)
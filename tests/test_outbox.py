@@ -0,0 +1,53 @@
+import time
+from datetime import datetime, timedelta
+from threading import Thread
+
+import pytest
+from starchaos import db
+from starchaos.outbox.models import OutboundEmail
+from starchaos.outbox.sink import DebuggingSMTPServer
+from starchaos.outbox.utils import purge_outbox
+
+
+@pytest.fixture
+def sink():
+    server = DebuggingSMTPServer(('127.0.0.1', 0))
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_worker_sends_mail_left_behind_once_the_app_serves_a_request(make_app, sink):
+    # A long poll interval, so the thread does not wake again after this test.
+    app = make_app(MAIL_QUEUE_WORKER=True, MAIL_QUEUE_POLL_INTERVAL=3600, MAIL_SERVER='127.0.0.1',
+                   MAIL_PORT=sink.server_address[1], MAIL_USE_TLS=False, MAIL_SENDER='noreply@example.com')
+    with app.app_context():
+        # Queued by a worker that stopped before sending it; nothing here is notified.
+        db.session.execute(OutboundEmail.__table__.insert(),
+                           [{'recipient': 'someone@example.com', 'subject': 'Hello', 'body': 'Hi',
+                             'status': 'pending', 'next_attempt_at': datetime.utcnow()}])
+        db.session.commit()
+
+    app.test_client().get('/login')
+    deadline = time.monotonic() + 5
+    while not sink.messages and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert [message['To'] for message in sink.messages] == ['someone@example.com']
+
+
+def test_purge_keeps_pending_and_recent_mail(app):
+    old = datetime.utcnow() - timedelta(days=31)
+    with app.app_context():
+        for status in ('pending', 'sent', 'discarded', 'failed'):
+            db.session.add(OutboundEmail(recipient='old@example.com', subject=status, body='', status=status,
+                                         date_created=old))
+            db.session.add(OutboundEmail(recipient='new@example.com', subject=status, body='', status=status))
+        db.session.commit()
+
+        assert purge_outbox(30, batch_size=2) == 3
+        left = db.session.execute(db.select(OutboundEmail.recipient, OutboundEmail.status)).all()
+        assert sorted(left) == sorted([('old@example.com', 'pending')] +
+                                      [('new@example.com', status)
+                                       for status in ('pending', 'sent', 'discarded', 'failed')])
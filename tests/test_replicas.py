@@ -0,0 +1,86 @@
+import os
+import shutil
+import time
+
+import pytest
+from sqlalchemy import select
+from starchaos import db, replicas
+from starchaos.posts.models import Post
+from starchaos.replicas import STICKY_KEY
+from starchaos.seed import seed
+from starchaos.users.models import User
+
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    """An app whose replica is a copy of the primary taken before one more post was written."""
+    primary, replica = os.path.join(tmp_path, 'primary.db'), os.path.join(tmp_path, 'replica.db')
+    app = make_app(SQLALCHEMY_DATABASE_URI=f'sqlite:///{primary}')
+    with app.app_context():
+        seed(users=3, posts=3, threads=0)
+    shutil.copy(primary, replica)
+    app = make_app(SQLALCHEMY_DATABASE_URI=f'sqlite:///{primary}', SQLALCHEMY_REPLICA_URIS=[f'sqlite:///{replica}'],
+                   REPLICA_LAG_CHECK_INTERVAL=0, REPLICA_STICKY_SECONDS=0.5)
+    with app.app_context():
+        db.session.add(Post(content='only on the primary', user_id=1))
+        db.session.commit()
+    return app
+
+
+def _client(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+    return client
+
+
+def _latest_post(app, method='GET'):
+    with app.test_request_context('/', method=method):
+        app.preprocess_request()
+        return db.session.execute(select(Post.content).order_by(Post.id.desc())).scalar()
+
+
+def test_get_requests_read_from_the_replica(app):
+    assert _latest_post(app) != 'only on the primary'
+    assert _latest_post(app, method='POST') == 'only on the primary'
+    with app.app_context():
+        assert db.session.execute(select(Post.content).order_by(Post.id.desc())).scalar() == 'only on the primary'
+
+
+def test_a_request_that_writes_reads_the_primary_from_then_on(app):
+    with app.test_request_context('/'):
+        app.preprocess_request()
+        assert db.session.info['replica'] == 'replica_0'
+        db.session.get(User, 1).theme = 'dark'
+        db.session.flush()
+        assert db.session.info['replica'] is None
+        assert db.session.execute(select(Post.content).order_by(Post.id.desc())).scalar() == 'only on the primary'
+        db.session.rollback()
+
+
+def test_locking_reads_go_to_the_primary(app):
+    with app.test_request_context('/'):
+        app.preprocess_request()
+        statement = select(Post.content).order_by(Post.id.desc())
+        assert db.session.execute(statement.with_for_update()).scalar() == 'only on the primary'
+
+
+def test_a_write_keeps_the_browser_on_the_primary_for_a_while(app):
+    with app.app_context():
+        profile = f'/profile/{db.session.get(User, 1).full_name}'
+    client = _client(app)
+    assert 'only on the primary' not in client.get(profile).text
+
+    assert client.get('/theme/dark', headers={'Referer': '/'}).status_code == 302
+    with client.session_transaction() as session:
+        assert session[STICKY_KEY] > time.time()
+    assert 'only on the primary' in client.get(profile).text
+
+    time.sleep(0.6)
+    assert 'only on the primary' not in client.get(profile).text
+
+
+def test_a_lagging_replica_is_skipped(app, monkeypatch):
+    monkeypatch.setattr(replicas, '_measure', lambda key: app.config['REPLICA_MAX_LAG'] + 1)
+    assert _latest_post(app) == 'only on the primary'
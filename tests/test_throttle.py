@@ -0,0 +1,61 @@
+import pytest
+from starchaos.throttle import MemoryBuckets
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_bucket_allows_a_burst_then_refills_at_the_rate(clock):
+    buckets = MemoryBuckets(clock=clock)
+
+    assert [buckets.take('k', 3, 0.5) for _ in range(3)] == [0, 0, 0]
+    assert buckets.take('k', 3, 0.5) == pytest.approx(2)
+
+    clock.now += 1
+    assert buckets.take('k', 3, 0.5) == pytest.approx(1)
+    clock.now += 1
+    assert buckets.take('k', 3, 0.5) == 0
+    assert buckets.take('k', 3, 0.5) == pytest.approx(2)
+
+    clock.now += 60
+    assert [buckets.take('k', 3, 0.5) for _ in range(4)][-1] == pytest.approx(2)
+
+
+def test_buckets_are_independent_per_key(clock):
+    buckets = MemoryBuckets(clock=clock)
+    buckets.take('a', 1, 1)
+
+    assert buckets.take('a', 1, 1) == pytest.approx(1)
+    assert buckets.take('b', 1, 1) == 0
+
+
+def test_only_refilled_buckets_are_dropped_past_max_keys(clock):
+    buckets = MemoryBuckets(max_keys=2, clock=clock)
+    buckets.take('busy', 1, 0.1)
+    buckets.take('idle', 1, 1)
+    clock.now += 2
+    buckets.take('new', 1, 1)
+
+    assert set(buckets._buckets) == {'busy', 'new'}
+    assert buckets.take('busy', 1, 0.1) == pytest.approx(8)
+
+
+def test_login_is_refused_once_the_account_runs_out(make_app):
+    app = make_app(THROTTLE_LIMITS={'login': {'ip': (100, 60), 'account': (2, 1)}})
+    client = app.test_client()
+    form = {'email': 'Someone@Example.com', 'password': 'wrong'}
+
+    assert [client.post('/login', data=form).status_code for _ in range(2)] == [200, 200]
+    response = client.post('/login', data={**form, 'email': 'someone@example.com '})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) == 60
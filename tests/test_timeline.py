@@ -0,0 +1,61 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import bindparam, or_, select, update
+from starchaos import db, timeline
+from starchaos.friends.models import friend_ids_select
+from starchaos.posts.models import Post
+from starchaos.seed import seed
+from starchaos.timeline.stores import MemoryStore, RedisStore
+from starchaos.timeline.utils import home_feed
+from starchaos.users.models import User
+
+
+def _memory_store():
+    return MemoryStore(length=40)
+
+
+def _redis_store():
+    fakeredis = pytest.importorskip('fakeredis')
+    return RedisStore(fakeredis.FakeRedis(), length=40)
+
+
+@pytest.fixture(params=[_memory_store, _redis_store], ids=['memory', 'redis'])
+def feed_app(request, make_app):
+    # A short timeline and a low celebrity threshold, so paging crosses the end
+    # of the stored list and merges in posts pulled on read.
+    app = make_app(TIMELINE_LENGTH=40, TIMELINE_CELEBRITY_THRESHOLD=15)
+    with app.app_context():
+        seed(users=200, posts=3000, threads=0)
+        # Dates unrelated to ids, with some shared to the second, as imported or backdated posts have.
+        rng = random.Random(7)
+        now = datetime.utcnow().replace(microsecond=0)
+        post_ids = db.session.execute(select(Post.id)).scalars().all()
+        db.session.execute(update(Post.__table__).where(Post.__table__.c.id == bindparam('post_id'))
+                           .values(date_posted=bindparam('date_posted')),
+                           [{'post_id': post_id, 'date_posted': now - timedelta(minutes=rng.randint(0, 2000))}
+                            for post_id in post_ids])
+        db.session.commit()
+    timeline.store = request.param()
+    return app
+
+
+def test_home_feed_pages_match_the_posts_query(feed_app):
+    with feed_app.app_context():
+        user = db.session.execute(select(User).order_by(User.friend_count.desc())).scalars().first()
+        expected = db.session.execute(
+            select(Post.id).where(or_(Post.user_id == user.id, Post.user_id.in_(friend_ids_select(user.id))))
+            .order_by(Post.date_posted.desc(), Post.id.desc())).scalars().all()
+
+        seen, before = [], None
+        while True:
+            page = home_feed(user, before=before, per_page=5)
+            seen.extend(post.id for post in page.items)
+            if not page.has_next:
+                break
+            before = page.next_cursor
+            db.session.expunge_all()
+
+    assert len(expected) > 40
+    assert seen == expected
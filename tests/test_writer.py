@@ -0,0 +1,77 @@
+from datetime import datetime
+from threading import Event
+
+from sqlalchemy.exc import OperationalError
+from starchaos import db
+from starchaos.seed import seed
+from starchaos.users.models import Message
+from starchaos.users.writer import MessageWriter
+
+
+def _writer(make_app, **settings):
+    # A writer of its own: the app's shared one keeps its thread on the first app's queue.
+    app = make_app(CHAT_WRITE_BEHIND=True, CHAT_FLUSH_INTERVAL=0.01, **settings)
+    with app.app_context():
+        seed(users=2, posts=0, threads=0)
+    return app, MessageWriter(app)
+
+
+def _row(n, receiver_id=2):
+    return {'sender_id': 1, 'receiver_id': receiver_id, 'content': f'message {n}',
+            'date_posted': datetime.utcnow(), 'client_id': f'client-{n}'}
+
+
+def _stored(app):
+    with app.app_context():
+        return sorted(db.session.execute(db.select(Message.client_id)).scalars())
+
+
+def test_a_rejected_message_is_dropped_and_the_rest_of_its_batch_stored(make_app):
+    app, writer = _writer(make_app, CHAT_BATCH_SIZE=10)
+    rows = [_row(n, receiver_id=999 if n == 2 else 2) for n in range(5)]
+
+    assert all(writer.save(row) for row in rows)
+    writer.flush()
+
+    assert _stored(app) == ['client-0', 'client-1', 'client-3', 'client-4']
+
+
+def test_transient_failures_are_retried_and_resends_stored_once(make_app, monkeypatch):
+    app, writer = _writer(make_app)
+    write = writer._write
+    failures = [OperationalError('INSERT', {}, Exception('database is locked'))] * 2
+
+    def flaky(rows):
+        if failures:
+            raise failures.pop()
+        write(rows)
+
+    monkeypatch.setattr(writer, '_write', flaky)
+    row = _row(0)
+    writer.save(row)
+    writer.save(dict(row))
+    writer.flush()
+
+    assert failures == []
+    assert _stored(app) == ['client-0']
+
+
+def test_save_refuses_once_the_queue_stays_full(make_app, monkeypatch):
+    app, writer = _writer(make_app, CHAT_QUEUE_SIZE=1, CHAT_QUEUE_TIMEOUT=0.1, CHAT_BATCH_SIZE=1)
+    write = writer._write
+    stalled, taken = Event(), Event()
+
+    def stuck(rows):
+        taken.set()
+        stalled.wait(5)
+        write(rows)
+
+    monkeypatch.setattr(writer, '_write', stuck)
+    assert writer.save(_row(0))
+    taken.wait(5)
+    assert writer.save(_row(1))
+    assert not writer.save(_row(2))
+
+    stalled.set()
+    writer.flush()
+    assert _stored(app) == ['client-0', 'client-1']